@@ -1,15 +1,10 @@
-import urllib.error
-import urllib.parse
-import urllib.request
-
-import requests
-from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.http import Http404
 from issuer.models import BadgeInstance
+from mainsite.introspection import introspect_token
 
 
 class BadgeConnectView(APIView):
@@ -23,17 +18,10 @@ class BadgeConnectView(APIView):
         if not bearer_token:
             raise PermissionDenied()
 
-        payload = {'token': bearer_token}
-        headers = {'Accept': 'application/json', 'Content-Type': 'application/x-www-form-urlencoded'}
-        url = f"{settings.EDUID_PROVIDER_URL}/introspect"
-        response = requests.post(url,
-                                 data=urllib.parse.urlencode(payload),
-                                 auth=(settings.OIDC_RS_ENTITY_ID, settings.OIDC_RS_SECRET),
-                                 headers=headers)
-        if response.status_code != 200:
+        introspect_json = introspect_token(bearer_token)
+        if introspect_json is None:
             raise PermissionDenied()
 
-        introspect_json = response.json()
         if not introspect_json['active']:
             raise PermissionDenied()
         email = introspect_json['email']
@@ -4,6 +4,7 @@ import re
 from itertools import chain
 
 from allauth.account.models import EmailAddress, EmailConfirmation
+from django.apps import apps
 from auditlog.registry import auditlog
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
@@ -31,9 +32,11 @@ from issuer.models import BadgeInstance
 from lti_edu.models import StudentsEnrolled
 from mainsite.exceptions import BadgrApiException400, BadgrValidationError
 from mainsite.models import ApplicationInfo, EmailBlacklist, BaseAuditedModel, BadgrApp
+from mainsite.snapshots import CatalogMixin
 from mainsite.utils import send_mail, EmailMessageMaker
 from signing.models import AssertionTimeStamp
-from staff.models import InstitutionStaff, FacultyStaff, IssuerStaff, BadgeClassStaff
+from staff.closure import PERMISSION_TREE_LEVELS
+from staff.models import InstitutionStaff, FacultyStaff, IssuerStaff, BadgeClassStaff, EffectivePermission
 
 
 class UserProvisionment(BaseAuditedModel, BaseVersionedEntity, CacheModel):
@@ -202,14 +205,14 @@ class CachedEmailAddress(EmailAddress, CacheModel):
     def publish(self):
         super(CachedEmailAddress, self).publish()
         self.publish_by('email')
-        self.user.publish()
+        self.user.republish()
 
     def delete(self, *args, **kwargs):
         user = self.user
         self.publish_delete('email')
         self.publish_delete('pk')
         super(CachedEmailAddress, self).delete(*args, **kwargs)
-        user.publish()
+        user.republish()
 
     def set_as_primary(self, conditional=False):
         # shadow parent function, but use CachedEmailAddress manager to ensure cache gets updated
@@ -292,31 +295,20 @@ class UserCachedObjectGetterMixin(object):
         """
         :param permission: list of strings representing permissions
         :param type: string that represent class.__name__ ('Institution', 'Faculty', 'Issuer', 'BadgeClass' or None)
-        :return: list of objects for which this user has the given permissions for.
+        :return: list of objects for which this user has the given permissions for, top down through the tree.
         """
-        permissioned_objects = []
-
-        def object_tree_walker(obj, permissions, looking_for=type, override_permissions=False):
-            """
-            Recursively walks the object tree to find objects of which the user has all the given permissions for.
-            """
-            if obj.check_local_permissions(self, permissions) or override_permissions:
-                if looking_for:
-                    if obj.__class__.__name__ == looking_for:
-                        permissioned_objects.append(obj)
-                else:
-                    permissioned_objects.append(obj)
-                override_permissions = True
-            try:
-                for child in obj.children:
-                    object_tree_walker(child, permissions, looking_for, override_permissions)
-            except AttributeError:  # no more kids
-                pass
-
         if not self.is_teacher:
             raise ValueError('User must be teacher to walk the permission tree')
-        tree_root = self.institution
-        object_tree_walker(tree_root, permissions)
+        effective_permissions = EffectivePermission.objects.filter(
+            user=self, **{permission: True for permission in permissions}
+        )
+        permissioned_objects = []
+        for level in PERMISSION_TREE_LEVELS:
+            node_type, model = level[0], apps.get_model(level[1])
+            if type and model.__name__ != type:
+                continue
+            node_ids = effective_permissions.filter(node_type=node_type).values('node_id')
+            permissioned_objects += list(model.objects.filter(pk__in=node_ids))
         return permissioned_objects
 
     def get_all_objects_with_permissions(self, permissions):
@@ -325,11 +317,11 @@ class UserCachedObjectGetterMixin(object):
     def get_all_badgeclasses_with_permissions(self, permissions):
         return self._get_objects_with_permissions(permissions, 'BadgeClass')
 
-    @cached_method(auto_publish=True)
+    @cached_method(auto_publish=True, compact=True)
     def cached_badgeinstances(self):
         return BadgeInstance.objects.filter(user=self)
 
-    @cached_method()
+    @cached_method(compact=True)
     def cached_pending_enrollments(self):
         return StudentsEnrolled.objects.filter(user=self, badge_instance=None)
 
@@ -398,12 +390,9 @@ class UserPermissionsMixin(object):
         """
         See if staff membership is in this user's scope. This is used when editing or removing staff membership objects.
         """
-        all_administrable_objects = self.get_all_objects_with_permissions(['may_administrate_users'])
-        for obj in all_administrable_objects:
-            for staff in obj.staff_items:
-                if staff == staff_membership:
-                    return True  # staff membership is administrable
-        return False
+        if not self.is_teacher:
+            raise ValueError('User must be teacher to walk the permission tree')
+        return EffectivePermission.objects.permissions_for(self, staff_membership.object)['may_administrate_users']
 
     def get_permissions(self, obj):
         """
@@ -815,7 +804,7 @@ class BadgrAccessToken(AccessToken, CacheModel):
             return ApplicationInfo()
 
 
-class TermsUrl(CacheModel):
+class TermsUrl(CatalogMixin, CacheModel):
     terms = models.ForeignKey('badgeuser.Terms', on_delete=models.CASCADE, related_name='terms_urls')
     url = models.URLField(max_length=200, null=True)
     LANGUAGE_ENGLISH = 'en'
@@ -827,7 +816,7 @@ class TermsUrl(CacheModel):
     excerpt = models.BooleanField(default=False)
 
 
-class Terms(BaseAuditedModel, BaseVersionedEntity, CacheModel):
+class Terms(CatalogMixin, BaseAuditedModel, BaseVersionedEntity, CacheModel):
     version = models.PositiveIntegerField(default=1)
     institution = models.ForeignKey(
         'institution.Institution', on_delete=models.CASCADE, related_name='terms', null=True, blank=True
@@ -0,0 +1,48 @@
+from collections import namedtuple
+
+from django.apps import apps
+
+# The cached payload of a @cached_method(compact=True): the model label and the primary keys of the result, in order
+CompactList = namedtuple('CompactList', ['model', 'pks'])
+
+
+def compact_result(result):
+    """
+    Evaluates the QuerySet or list of model instances returned by a compact cached_method.
+    :return: (payload, instances) where payload is the CompactList to store in the cache
+    """
+    instances = list(result)
+    if not instances:
+        return CompactList(None, []), instances
+    model = instances[0].__class__
+    if any(instance.__class__ is not model for instance in instances):
+        raise ValueError('A compact cached_method must return instances of a single model, got %s' % model.__name__)
+    return CompactList(model._meta.label_lower, [instance.pk for instance in instances]), instances
+
+
+def hydrate_many(payloads):
+    """
+    Turns CompactLists back into lists of model instances, fetching the instances of every model
+    with a single bulk lookup. Instances that no longer exist are left out.
+    """
+    pks_per_model = {}
+    for payload in payloads:
+        if payload.pks:
+            pks_per_model.setdefault(payload.model, set()).update(payload.pks)
+    objects_per_model = {}
+    for label, pks in pks_per_model.items():
+        model = apps.get_model(label)
+        manager = getattr(model, 'cached', None)
+        if hasattr(manager, 'cached_in_bulk'):
+            objects_per_model[label] = manager.cached_in_bulk(pks)
+        else:
+            objects_per_model[label] = model._default_manager.in_bulk(pks)
+    results = []
+    for payload in payloads:
+        objects = objects_per_model.get(payload.model, {})
+        results.append([objects[pk] for pk in payload.pks if pk in objects])
+    return results
+
+
+def hydrate(payload):
+    return hydrate_many([payload])[0]
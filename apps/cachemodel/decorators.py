@@ -1,23 +1,65 @@
-from django.core.cache import cache
+from collections import OrderedDict
 from functools import wraps
 
-from cachemodel import CACHE_FOREVER_TIMEOUT
+from cachemodel.compact import compact_result, hydrate, hydrate_many
+from cachemodel.lease import acquire_lease, acquire_leases, record_stale_served, release_lease, release_leases, \
+    wait_for
+from cachemodel.tags import get_many_tagged, get_tagged, set_many_tagged, set_tagged
 from cachemodel.utils import generate_cache_key
 
-def cached_method(auto_publish=False):
-    """A decorator for CacheModel methods."""
+def cached_method(auto_publish=False, compact=False):
+    """A decorator for CacheModel methods.
+
+    The cached value carries the cache tags of the instance (see CacheModel.get_cache_tags), so it is
+    invalidated whenever one of those tags is bumped.
+
+    With compact=True the method must return a QuerySet or a list of instances of one model. Only the primary
+    keys are cached and the method returns a list that is hydrated from the objects published by pk
+    (see CacheModelManager.cached_in_bulk), instead of pickling every row into the entry.
+
+    A bulk loader used by cached_method_many() for the cache misses can be registered with @<method>.many,
+    it receives a list of instances and returns a dictionary of pk -> result.
+    """
     def decorator(target):
         @wraps(target)
         def wrapper(self, *args, **kwargs):
             key = generate_cache_key([self.__class__.__name__, target.__name__, self.pk], *args, **kwargs)
-            data = cache.get(key)
-            if data is None:
-                data = target(self, *args, **kwargs)
-                cache.set(key, data, CACHE_FOREVER_TIMEOUT)
-            return data
+            tags = self.get_cache_tags()
+            stale = {}
+            entry, versions = get_tagged(key, tags, stale)
+            if entry is None:
+                # single-flight: while another worker recomputes serve the stale entry, or wait for the fresh one
+                lease = acquire_lease(key)
+                if lease is None:
+                    entry = stale.get(key)
+                    if entry is not None:
+                        record_stale_served(key)
+                    else:
+                        entry = wait_for(key, lambda: get_tagged(key, tags)[0])
+            if entry is None:
+                try:
+                    result = target(self, *args, **kwargs)
+                    if compact:
+                        payload, result = compact_result(result)
+                        set_tagged(key, payload, tags, versions)
+                        return result
+                    return set_tagged(key, result, tags, versions)
+                finally:
+                    release_lease(key, lease)
+            if compact:
+                return hydrate(entry.data)
+            return entry.data
+
+        def many(loader):
+            wrapper._cached_method_many = loader
+            return wrapper
+
         wrapper._cached_method = True
         wrapper._cached_method_auto_publish = auto_publish
         wrapper._cached_method_target = target
+        wrapper._cached_method_compact = compact
+        wrapper._cached_method_many = None
+        wrapper.many = many
         return wrapper
 
     if callable(auto_publish):
@@ -29,6 +71,57 @@ def cached_method(auto_publish=False):
         return decorator
 
 
+def cached_method_many(instances, method_name):
+    """
+    Resolves the @cached_method method_name of all instances with a single cache.get_many round-trip.
+    The misses are loaded with the bulk loader of the method in one query (or one by one if it has none)
+    and stored with a single set_many. Stale entries being refreshed by another worker are served as they are.
+    :return: list with the result of each instance, in the order of instances
+    """
+    instances = list(instances)
+    if not instances:
+        return []
+    method = getattr(instances[0].__class__, method_name)
+    if not getattr(method, '_cached_method', False):
+        raise AttributeError("method '%s' is not a cached_method." % method_name)
+    target = method._cached_method_target
+    keys_tags = OrderedDict()
+    instance_keys = []
+    for instance in instances:
+        key = generate_cache_key([instance.__class__.__name__, target.__name__, instance.pk])
+        keys_tags[key] = instance.get_cache_tags()
+        instance_keys.append(key)
+    stale = {}
+    entries, versions = get_many_tagged(keys_tags, stale)
+    leases = acquire_leases([key for key in keys_tags if key not in entries])
+    for key, lease in leases.items():
+        if lease is None and key in stale:
+            record_stale_served(key)
+            entries[key] = stale[key]
+    if method._cached_method_compact:
+        results = dict(zip(entries, hydrate_many([entry.data for entry in entries.values()])))
+    else:
+        results = {key: entry.data for key, entry in entries.items()}
+    misses = OrderedDict((key, instance) for key, instance in zip(instance_keys, instances) if key not in results)
+    try:
+        if misses:
+            if method._cached_method_many is not None:
+                loaded = method._cached_method_many(list(misses.values()))
+                computed = {key: loaded[instance.pk] for key, instance in misses.items()}
+            else:
+                computed = {key: target(instance) for key, instance in misses.items()}
+            payloads = computed
+            if method._cached_method_compact:
+                payloads = {}
+                for key, data in list(computed.items()):
+                    payloads[key], computed[key] = compact_result(data)
+            set_many_tagged({key: (data, keys_tags[key]) for key, data in payloads.items()}, versions)
+            results.update(computed)
+    finally:
+        release_leases(leases)
+    return [results[key] for key in instance_keys]
+
+
 def denormalized_field(field_name):
     """A decorator for CacheModel methods.
 
@@ -52,10 +145,32 @@ def denormalized_field(field_name):
         
     return decorator
 
+# the marker properties set by the decorators in this module
+DECORATOR_PROPERTIES = ('_cached_method', '_denormalized_field')
+
+
+def scan_fields_decorated_with(cls, property_name):
+    """finds all methods of cls decorated with property_name by inspecting every attribute of the class"""
+    methods = []
+    for name in sorted(dir(cls)):
+        attribute = getattr(cls, name, None)
+        if hasattr(attribute, property_name):
+            methods.append(attribute)
+    return tuple(methods)
+
+
+def register_decorated_methods(cls):
+    """builds the registry of decorated methods of a model class, once when the class is prepared"""
+    cls._cachemodel_registry = {
+        property_name: scan_fields_decorated_with(cls, property_name) for property_name in DECORATOR_PROPERTIES
+    }
+
+
 def find_fields_decorated_with(instance, property_name):
-    """helper function that finds all methods decorated with property_name"""
-    non_field_attributes = set(dir(instance.__class__)) - set(instance._meta.get_fields())
-    for m in non_field_attributes:
-        if hasattr(getattr(instance.__class__, m), property_name):
-            yield getattr(instance.__class__, m)
+    """helper function that finds all methods decorated with property_name, from the registry of the class"""
+    cls = instance.__class__
+    # not inherited, every subclass has its own registry
+    if '_cachemodel_registry' not in cls.__dict__:
+        register_decorated_methods(cls)
+    return cls._cachemodel_registry[property_name]
 
@@ -0,0 +1,94 @@
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.db import transaction
+
+logger = logging.getLogger('Badgr.Debug')
+
+_state = threading.local()
+
+
+class PublishQueue(object):
+    """The objects whose auto_publish cached methods must be recomputed, once per object"""
+
+    def __init__(self):
+        self.instances = OrderedDict()
+
+    def add(self, instance):
+        # the latest in-memory version of an object wins
+        self.instances[(instance.__class__, instance.pk)] = instance
+
+    def __contains__(self, instance):
+        return (instance.__class__, instance.pk) in self.instances
+
+    def flush(self):
+        if getattr(_state, 'transaction_queue', None) is self:
+            _state.transaction_queue = None
+        instances, self.instances = self.instances, OrderedDict()
+        for instance in instances.values():
+            try:
+                instance.publish_methods()
+            except Exception:
+                # the cache tags were invalidated already, the entries will be computed on first use instead
+                logger.exception('Failed to publish the cached methods of {} {}'.format(
+                    instance.__class__.__name__, instance.pk))
+
+
+def _current_queue(create=False):
+    """
+    The queue of the innermost coalesce_publishes() block, or else the one flushed when the current transaction
+    commits. None outside of both, or when the transaction has no queue yet and create is False.
+    """
+    queues = getattr(_state, 'queues', None)
+    if queues:
+        return queues[-1]
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return None
+    queue = getattr(_state, 'transaction_queue', None)
+    # a rollback discards the on_commit callbacks, and with them the queue
+    if queue is None or not any(callback[1] == queue.flush for callback in connection.run_on_commit):
+        if not create:
+            return None
+        queue = _state.transaction_queue = PublishQueue()
+        transaction.on_commit(queue.flush)
+    return queue
+
+
+def publish_methods_deferred(instance):
+    """
+    Recomputes the auto_publish cached methods of instance at the end of the enclosing coalesce_publishes() block
+    or when the current transaction commits, once per object however often it is published. Immediately otherwise.
+    """
+    queue = _current_queue(create=True)
+    if queue is None:
+        instance.publish_methods()
+    else:
+        queue.add(instance)
+
+
+def is_publish_pending(instance):
+    """whether the cached methods of instance are already queued to be recomputed"""
+    queue = _current_queue()
+    return queue is not None and instance in queue
+
+
+@contextmanager
+def coalesce_publishes():
+    """
+    Defers the publishes in the block to its end, for bulk operations that do not run in a single transaction.
+    Issuing many assertions then republishes their badgeclass once instead of once per assertion.
+    """
+    if getattr(_state, 'queues', None) is None:
+        _state.queues = []
+    queue = PublishQueue()
+    _state.queues.append(queue)
+    try:
+        yield queue
+    finally:
+        _state.queues.pop()
+        # hand over to the enclosing block or transaction, if any
+        for instance in queue.instances.values():
+            publish_methods_deferred(instance)
@@ -0,0 +1,107 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from prometheus_client import Counter, Histogram
+
+from cachemodel.utils import model_name_from_key
+
+lease_acquisitions = Counter(
+    'cachemodel_lease_total',
+    'Outcome of taking the lease to recompute a missing or stale cache entry',
+    ['model', 'result'],
+)
+lease_wait_seconds = Histogram(
+    'cachemodel_lease_wait_seconds',
+    'Time spent waiting for another worker to recompute a cache entry',
+    ['model'],
+)
+
+_POLL_INTERVAL = 0.05
+
+
+def lease_key(key):
+    return 'cachemodel_lease__{}'.format(key)
+
+
+def lease_timeout():
+    return getattr(settings, 'CACHEMODEL_LEASE_TIMEOUT', 30)
+
+
+class Lease(object):
+    """A lease held by this worker, until it is released or its timeout has passed"""
+
+    def __init__(self):
+        self.token = uuid.uuid4().hex
+        # before the cache.add that takes it, and a second short because memcached counts expiry in whole seconds
+        self.expires = time.monotonic() + lease_timeout() - 1
+
+    @property
+    def held(self):
+        # leases are only taken with cache.add, which fails while the key exists, so until the lease expires in
+        # the cache nobody else can hold it and releasing it does not need to check its token first
+        return time.monotonic() < self.expires
+
+
+def acquire_lease(key):
+    """
+    Takes the lease to recompute the entry stored under key, so that only one worker does the work after a miss.
+    :return: the Lease needed to release it, or None when another worker holds it
+    """
+    lease = Lease()
+    if cache.add(lease_key(key), lease.token, lease_timeout()):
+        lease_acquisitions.labels(model=model_name_from_key(key), result='acquired').inc()
+        return lease
+    return None
+
+
+def acquire_leases(keys):
+    """
+    Bulk acquire_lease(): one get_many skips the leases other workers hold, the free ones are taken with an add each,
+    as only an add is atomic against another worker taking the same lease.
+    :return: dictionary of key -> Lease, or None for the keys whose lease another worker holds
+    """
+    lease_keys = {lease_key(key): key for key in keys}
+    if not lease_keys:
+        return {}
+    held = cache.get_many(list(lease_keys))
+    leases = {}
+    for key, cache_key in lease_keys.items():
+        leases[cache_key] = acquire_lease(cache_key) if key not in held else None
+    return leases
+
+
+def release_lease(key, lease):
+    """Releases the lease unless it expired, and may have been taken by another worker since. None is a no-op."""
+    if lease is not None and lease.held:
+        cache.delete(lease_key(key))
+
+
+def release_leases(leases):
+    """Bulk release_lease() for a dictionary of key -> Lease, in one round-trip"""
+    keys = [lease_key(key) for key, lease in leases.items() if lease is not None and lease.held]
+    if keys:
+        cache.delete_many(keys)
+
+
+def record_stale_served(key):
+    lease_acquisitions.labels(model=model_name_from_key(key), result='stale').inc()
+
+
+def wait_for(key, load):
+    """
+    Polls load() while another worker holds the lease for key, for at most CACHEMODEL_LEASE_WAIT seconds.
+    :param load: callable returning the cached value, or None while it is missing
+    :return: the value, or None when waiting timed out and the caller must compute it itself
+    """
+    model = model_name_from_key(key)
+    start = time.monotonic()
+    deadline = start + getattr(settings, 'CACHEMODEL_LEASE_WAIT', 1.0)
+    value = None
+    while value is None and time.monotonic() < deadline:
+        time.sleep(_POLL_INTERVAL)
+        value = load()
+    lease_wait_seconds.labels(model=model).observe(time.monotonic() - start)
+    lease_acquisitions.labels(model=model, result='waited' if value is not None else 'timeout').inc()
+    return value
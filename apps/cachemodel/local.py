@@ -0,0 +1,89 @@
+import copy
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import models
+from prometheus_client import Counter
+
+from cachemodel.utils import model_name_from_key
+
+local_cache_lookups = Counter(
+    'cachemodel_local_cache_lookups_total',
+    'Lookups in the request scoped in-process cache in front of memcached',
+    ['model', 'result'],
+)
+
+_state = threading.local()
+
+
+def detach(data):
+    """
+    A copy of the model instances in data, alone or in a list or tuple, so a caller modifying the instance it got
+    does not change what the other lookups of the request get, just like an object unpickled from memcached
+    """
+    if isinstance(data, models.Model):
+        return copy.copy(data)
+    if type(data) in (list, tuple):
+        return type(data)(detach(item) for item in data)
+    return data
+
+
+class LocalCache(object):
+    """
+    A bounded LRU that sits in front of memcached for the duration of a single request.
+    Entries are stamped with the generation of their cache tags; bumping a tag in this process makes them stale.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.tag_versions = {}
+        # tags bumped during this request, entries carrying them are never served stale to it
+        self.invalidated_tags = set()
+
+    def get(self, key):
+        """returns the (versions, data) tuple stored under key, or None. The model instances in data are copies"""
+        entry = self.entries.get(key)
+        if entry is not None and any(self.tag_versions.get(tag) != version for tag, version in entry[0].items()):
+            del self.entries[key]
+            entry = None
+        if entry is None:
+            local_cache_lookups.labels(model=model_name_from_key(key), result='miss').inc()
+            return None
+        self.entries.move_to_end(key)
+        local_cache_lookups.labels(model=model_name_from_key(key), result='hit').inc()
+        return entry[0], detach(entry[1])
+
+    def set(self, key, data, versions=None):
+        versions = versions or {}
+        for tag, version in versions.items():
+            # never roll back a generation this request already knows about, the entry is stale then
+            self.tag_versions.setdefault(tag, version)
+        self.entries[key] = (versions, detach(data))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def delete(self, key):
+        self.entries.pop(key, None)
+
+    def update_tag_versions(self, versions):
+        self.tag_versions.update(versions)
+
+    def invalidate_tags(self, versions):
+        self.update_tag_versions(versions)
+        self.invalidated_tags.update(versions)
+
+
+def get_local_cache():
+    """the LocalCache of the current request, or None outside of a request"""
+    return getattr(_state, 'cache', None)
+
+
+def activate():
+    _state.cache = LocalCache(getattr(settings, 'CACHEMODEL_LOCAL_CACHE_SIZE', 1000))
+
+
+def deactivate():
+    _state.cache = None
@@ -1,20 +1,77 @@
 from django.core.cache import cache
 from django.db import models
 from cachemodel import CACHE_FOREVER_TIMEOUT
+from cachemodel.lease import acquire_lease, release_lease, wait_for
+from cachemodel.local import get_local_cache
 from cachemodel.utils import generate_cache_key
 
 
 class CacheModelManager(models.Manager):
     def get(self, **kwargs):
         key = generate_cache_key([self.model.__name__, "get"], **kwargs)
+        local = get_local_cache()
+        if local is not None:
+            entry = local.get(key)
+            if entry is not None:
+                return entry[1]
         obj = cache.get(key)
         if obj is None:
-            obj = super(CacheModelManager, self).get(**kwargs)
-            cache.set(key, obj, CACHE_FOREVER_TIMEOUT)
+            # single-flight: objects are published in place on save, so there is no stale copy to serve meanwhile
+            lease = acquire_lease(key)
+            if lease is None:
+                obj = wait_for(key, lambda: cache.get(key))
+            if obj is None:
+                try:
+                    obj = super(CacheModelManager, self).get(**kwargs)
+                    cache.set(key, obj, CACHE_FOREVER_TIMEOUT)
+                finally:
+                    release_lease(key, lease)
 
             # update cache_key_index with obj.pk <- key
+        if local is not None:
+            local.set(key, obj)
         return obj
 
+    def cached_in_bulk(self, pks):
+        """
+        Like in_bulk(), but served from the objects published by pk with a single get_many.
+        Only the objects missing from the cache are fetched from the database, and published.
+        :return: dictionary of pk -> obj
+        """
+        keys = {pk: generate_cache_key([self.model.__name__, "get"], pk=pk) for pk in pks}
+        local = get_local_cache()
+        objects = {}
+        if local is not None:
+            for pk, key in keys.items():
+                entry = local.get(key)
+                if entry is not None:
+                    objects[pk] = entry[1]
+        remaining = {key: pk for pk, key in keys.items() if pk not in objects}
+        if remaining:
+            for key, obj in cache.get_many(list(remaining)).items():
+                objects[remaining.pop(key)] = obj
+        if remaining:
+            fetched = super(CacheModelManager, self).in_bulk(list(remaining.values()))
+            cache.set_many({keys[pk]: obj for pk, obj in fetched.items()}, CACHE_FOREVER_TIMEOUT)
+            objects.update(fetched)
+        if local is not None:
+            for pk, obj in objects.items():
+                local.set(keys[pk], obj)
+        return objects
+
+    def unpublish_in_bulk(self, pks):
+        """
+        Drops the objects published by pk, after a queryset update() changed their rows without saving them.
+        The next cached_in_bulk() or cached.get(pk=) fetches them from the database again.
+        """
+        keys = [generate_cache_key([self.model.__name__, "get"], pk=pk) for pk in pks]
+        if keys:
+            cache.delete_many(keys)
+        local = get_local_cache()
+        if local is not None:
+            for key in keys:
+                local.delete(key)
+
     def get_or_create(self, **kwargs):
         key = generate_cache_key([self.model.__name__, "get"], **kwargs)
         obj = cache.get(key)
@@ -0,0 +1,15 @@
+from cachemodel.local import activate, deactivate
+
+
+class LocalCacheMiddleware(object):
+    """Scopes the in-process cachemodel cache to a single request, so repeated lookups only hit memcached once"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        activate()
+        try:
+            return self.get_response(request)
+        finally:
+            deactivate()
@@ -14,11 +14,16 @@
 
 from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import class_prepared
 
 
 from cachemodel import CACHE_FOREVER_TIMEOUT
+from cachemodel.compact import compact_result
+from cachemodel.deferred import is_publish_pending, publish_methods_deferred
 from cachemodel.managers import CacheModelManager, CachedTableManager
-from cachemodel.decorators import find_fields_decorated_with
+from cachemodel.decorators import find_fields_decorated_with, register_decorated_methods
+from cachemodel.local import get_local_cache
+from cachemodel.tags import invalidate_tags, set_tagged
 from cachemodel.utils import generate_cache_key
 
 
@@ -38,17 +43,63 @@ class CacheModel(models.Model):
         # save ourselves to the database
         super(CacheModel, self).save(*args, **kwargs)
 
-        # trigger cache publish
+        # invalidate everything that depends on us, then trigger cache publish
+        invalidate_tags(self.get_changed_cache_tags())
         self.publish()
 
     def delete(self, *args, **kwargs):
         self.publish_delete("pk")
+        # collect the tags while we still have a pk
+        changed_tags = self.get_changed_cache_tags()
         super(CacheModel, self).delete(*args, **kwargs)
+        invalidate_tags(changed_tags)
+
+    @classmethod
+    def cache_tag_for(cls, pk):
+        return "{}:{}".format(cls._meta.model_name, pk)
+
+    @property
+    def cache_tag(self):
+        return self.cache_tag_for(self.pk)
+
+    def get_cache_tags(self):
+        """The tags carried by every @cached_method entry of this instance."""
+        return [self.cache_tag]
+
+    def get_dependent_cache_tags(self):
+        """
+        The tags of all cache entries that may contain data of this instance and must be invalidated when it changes.
+        Override to add the tags of the objects that cache collections this instance is part of.
+        """
+        return [self.cache_tag]
+
+    def get_changed_cache_tags(self):
+        """
+        The tags invalidated when this instance itself is saved or deleted. Override to add the tags of entries that
+        only change with this instance, and not with every object depending on it.
+        """
+        return self.get_dependent_cache_tags()
+
+    def invalidate_cached_data(self):
+        """Invalidates all cached_method entries depending on this instance in one round-trip."""
+        invalidate_tags(self.get_dependent_cache_tags())
 
     def publish(self):
         # cache ourselves so that we're ready for .cached.get(pk=)
         self.publish_by('pk')
 
+        # recompute the @cached_methods with auto_publish=True once per object, when the transaction commits
+        publish_methods_deferred(self)
+
+    def republish(self):
+        """
+        publish() for an object whose cached collections contain a changed related object.
+        Skipped when the object is already queued for publishing, so that a bulk change republishes it only once.
+        """
+        if not is_publish_pending(self):
+            self.publish()
+
+    def publish_methods(self):
         # find any @cached_methods with auto_publish=True
         for method in find_fields_decorated_with(self, '_cached_method'):
             if not getattr(method, '_cached_method_auto_publish', False):
@@ -70,9 +121,16 @@ class CacheModel(models.Model):
         # cache ourselves, keyed by the fields given
         key = self.publish_key(*args)
         cache.set(key, self, CACHE_FOREVER_TIMEOUT)
+        local = get_local_cache()
+        if local is not None:
+            local.delete(key)
 
     def publish_delete(self, *args):
-        cache.delete(self.publish_key(*args))
+        key = self.publish_key(*args)
+        cache.delete(key)
+        local = get_local_cache()
+        if local is not None:
+            local.delete(key)
 
     def denormalize(self):
         for method in find_fields_decorated_with(self, '_denormalized_field'):
@@ -87,7 +145,18 @@ class CacheModel(models.Model):
         if callable(target):
             key = generate_cache_key([self.__class__.__name__, target.__name__, self.pk], *args, **kwargs)
             data = target(self, *args, **kwargs)
-            cache.set(key, data, CACHE_FOREVER_TIMEOUT)
+            if getattr(method, '_cached_method_compact', False):
+                data = compact_result(data)[0]
+            set_tagged(key, data, self.get_cache_tags())
+
+
+def build_decorator_registry(sender, **kwargs):
+    """scan the attributes of every CacheModel once, instead of on every save"""
+    if issubclass(sender, CacheModel):
+        register_decorated_methods(sender)
+
+
+class_prepared.connect(build_decorator_registry)
 
 
 class CachedTable(models.Model):
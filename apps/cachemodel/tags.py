@@ -0,0 +1,112 @@
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from cachemodel import CACHE_FOREVER_TIMEOUT
+from cachemodel.local import get_local_cache
+
+# A cached value together with the generation of every tag it was computed under
+TaggedEntry = namedtuple('TaggedEntry', ['versions', 'data'])
+
+
+def tag_version_key(tag):
+    return 'cachemodel_tag__{}'.format(tag)
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def get_many_tagged(keys_tags, stale=None):
+    """
+    Fetches cache entries together with the current generation of all their tags in a single round-trip.
+    Entries already in the request scoped local cache are served from there.
+    :param keys_tags: dictionary of cache key -> the tags of that entry
+    :param stale: optional dictionary that collects the outdated entries that may be served while another worker
+    refreshes them. Only inside a request, and only when the request did not invalidate their tags itself.
+    :return: (entries, versions) where entries only holds the valid entries by key and versions maps every tag
+    of the entries that must be fetched to its current generation (None if it has never been set)
+    """
+    entries = {}
+    local = get_local_cache()
+    if local is not None:
+        for key in keys_tags:
+            local_entry = local.get(key)
+            if local_entry is not None:
+                entries[key] = TaggedEntry(*local_entry)
+    remaining = {key: tags for key, tags in keys_tags.items() if key not in entries}
+    if not remaining:
+        return entries, {}
+    tag_keys = {tag: tag_version_key(tag) for tags in remaining.values() for tag in tags}
+    values = cache.get_many(list(remaining) + list(tag_keys.values()))
+    versions = {tag: values.get(tag_key) for tag, tag_key in tag_keys.items()}
+    if local is not None:
+        local.update_tag_versions({tag: version for tag, version in versions.items() if version is not None})
+    for key, tags in remaining.items():
+        entry = values.get(key)
+        if not isinstance(entry, TaggedEntry):
+            continue
+        if entry.versions == {tag: versions[tag] for tag in tags} and None not in entry.versions.values():
+            entries[key] = entry
+            if local is not None:
+                local.set(key, entry.data, entry.versions)
+        elif stale is not None and local is not None and local.invalidated_tags.isdisjoint(tags):
+            stale[key] = entry
+    return entries, versions
+
+
+def get_tagged(key, tags, stale=None):
+    """
+    Fetches a cache entry together with the current generation of its tags in a single round-trip,
+    or without any round-trip when the entry is already in the request scoped local cache.
+    :return: (entry, versions) where entry is None when missing or when one of its tags has been invalidated since
+    """
+    entries, versions = get_many_tagged({key: tags}, stale)
+    entry = entries.get(key)
+    if entry is not None:
+        return entry, entry.versions
+    return None, versions
+
+
+def set_many_tagged(items, versions=None):
+    """
+    Stores entries stamped with the generation of their tags, with one set_many.
+    Pass the versions returned by get_many_tagged() so that a tag invalidated while data was being computed
+    makes the stored entry stale instead of silently resurrecting it.
+    :param items: dictionary of cache key -> (data, tags)
+    """
+    versions = dict(versions or {})
+    unknown = [tag for data, tags in items.values() for tag in tags if tag not in versions]
+    if unknown:
+        tag_keys = {tag: tag_version_key(tag) for tag in unknown}
+        values = cache.get_many(list(tag_keys.values()))
+        versions.update({tag: values.get(tag_key) for tag, tag_key in tag_keys.items()})
+    missing = {tag: _new_version() for tag, version in versions.items() if version is None}
+    if missing:
+        cache.set_many({tag_version_key(tag): version for tag, version in missing.items()}, CACHE_FOREVER_TIMEOUT)
+        versions.update(missing)
+    local = get_local_cache()
+    to_cache = {}
+    for key, (data, tags) in items.items():
+        entry_versions = {tag: versions[tag] for tag in tags}
+        to_cache[key] = TaggedEntry(entry_versions, data)
+        if local is not None:
+            local.set(key, data, entry_versions)
+    cache.set_many(to_cache, CACHE_FOREVER_TIMEOUT)
+
+
+def set_tagged(key, data, tags, versions=None):
+    """Stores data under key, stamped with the generation of the given tags, see set_many_tagged()"""
+    set_many_tagged({key: (data, tags)}, versions)
+    return data
+
+
+def invalidate_tags(tags):
+    """Bumps the generation of all given tags in one round-trip, which invalidates every entry carrying them"""
+    versions = {tag: _new_version() for tag in set(tags)}
+    if versions:
+        cache.set_many({tag_version_key(tag): version for tag, version in versions.items()}, CACHE_FOREVER_TIMEOUT)
+        local = get_local_cache()
+        if local is not None:
+            local.invalidate_tags(versions)
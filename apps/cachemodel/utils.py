@@ -12,3 +12,16 @@ def generate_cache_key(prefix, *args, **kwargs):
     if not isinstance(prefix, six.string_types):
         prefix = "_".join(str(a) for a in prefix)
     return "{}__{}".format(prefix, argkwarg_str)
+
+
+def model_name_from_key(key):
+    """keys are built by generate_cache_key with the model class name as first part of the prefix"""
+    return key.split('_', 1)[0]
+
+
+def group_by_attribute(objects, attribute, keys):
+    """Groups objects in a dictionary of key -> list of objects whose attribute equals key, for each of the keys"""
+    groups = {key: [] for key in keys}
+    for obj in objects:
+        groups.setdefault(getattr(obj, attribute), []).append(obj)
+    return groups
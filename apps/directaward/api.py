@@ -24,9 +24,7 @@ from mainsite.utils import EmailMessageMaker, send_mail
 
 
 def direct_award_remove_cache(direct_award):
-    direct_award.bundle.remove_cached_data(['cached_direct_awards'])
-    direct_award.badgeclass.remove_cached_data(['cached_direct_awards'])
-    direct_award.badgeclass.remove_cached_data(['cached_direct_award_bundles'])
+    direct_award.invalidate_cached_data()
 
 
 # Several reusable, generic request and responses
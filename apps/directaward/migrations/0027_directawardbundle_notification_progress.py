@@ -0,0 +1,23 @@
+# Generated by Django 5.2.13 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directaward', '0026_remove_directawardbundle_lti_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='directawardbundle',
+            name='notification_sent_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='directawardbundle',
+            name='notification_total',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,17 +1,20 @@
 import urllib.parse
 import uuid
 import datetime
+from collections import Counter, defaultdict
 from django.conf import settings
 from django.db import models, IntegrityError
+from django.db.models import Q
 from django.utils.html import strip_tags
 
 from cachemodel.decorators import cached_method
 from cachemodel.models import CacheModel
+from cachemodel.tags import invalidate_tags
 from entity.models import BaseVersionedEntity
 from mainsite.exceptions import BadgrValidationError
 from mainsite.models import BaseAuditedModel
 from mainsite.utils import send_mail, EmailMessageMaker
-from mobile_api.push_notifications import send_push_notification
+from mobile_api.push_notifications import badge_received_payload, send_push_notifications
 
 
 class DirectAward(BaseAuditedModel, BaseVersionedEntity, CacheModel):
@@ -67,16 +70,77 @@ class DirectAward(BaseAuditedModel, BaseVersionedEntity, CacheModel):
         )
                 .exclude(pk=self.pk)
                 .exclude(recipient_email__isnull=True).exists()):
-            raise IntegrityError(
-                f"DirectAward with eppn: {self.eppn} / email: {self.recipient_email} and status Unaccepted "
-                f"already exists for badgeclass {self.badgeclass.name} ({self.badgeclass.id})."
-            )
+            raise IntegrityError(self.duplicate_message(self.eppn, self.recipient_email, self.badgeclass))
         return super(DirectAward, self).validate_unique(exclude=exclude)
 
+    @staticmethod
+    def duplicate_message(eppn, recipient_email, badgeclass):
+        return (
+            f"DirectAward with eppn: {eppn} / email: {recipient_email} and status Unaccepted "
+            f"already exists for badgeclass {badgeclass.name} ({badgeclass.id})."
+        )
+
+    @classmethod
+    def unaccepted_duplicates(cls, badgeclass, eppns, recipient_emails):
+        """
+        The bulk counterpart of validate_unique: finds, in one query, which of the given identifiers already have an
+        unaccepted direct award for badgeclass.
+        :return: a tuple of the set of duplicate eppns (of eppn bundles) and the set of duplicate emails (of email
+        bundles)
+        """
+        existing = cls.objects.filter(
+            Q(eppn__in=[eppn for eppn in eppns if eppn], bundle__identifier_type=DirectAwardBundle.IDENTIFIER_EPPN)
+            | Q(recipient_email__in=recipient_emails, bundle__identifier_type=DirectAwardBundle.IDENTIFIER_EMAIL),
+            badgeclass=badgeclass,
+            status=cls.STATUS_UNACCEPTED,
+        ).values_list('eppn', 'recipient_email', 'bundle__identifier_type')
+        duplicate_eppns, duplicate_emails = set(), set()
+        for eppn, recipient_email, identifier_type in existing:
+            if identifier_type == DirectAwardBundle.IDENTIFIER_EPPN:
+                duplicate_eppns.add(eppn.lower())
+            else:
+                duplicate_emails.add(recipient_email.lower())
+        return duplicate_eppns, duplicate_emails
+
+    @classmethod
+    def unaccepted_counts(cls, users):
+        """
+        The number of unaccepted direct awards of many users at once, as counted by BadgeUser.direct_awards
+        :param users: list of BadgeUser
+        :return: dictionary of user pk -> number of unaccepted direct awards
+        """
+        from badgeuser.models import StudentAffiliation
+
+        users_by_eppn = defaultdict(set)
+        for user_id, eppn in StudentAffiliation.objects.filter(user__in=users).values_list('user_id', 'eppn'):
+            users_by_eppn[eppn.lower()].add(user_id)
+        users_by_email = defaultdict(set)
+        for user in users:
+            users_by_email[user.email.lower()].add(user.pk)
+        direct_awards = cls.objects.filter(
+            Q(eppn__in=list(users_by_eppn))
+            | Q(recipient_email__in=list(users_by_email), bundle__identifier_type=DirectAwardBundle.IDENTIFIER_EMAIL),
+            status=cls.STATUS_UNACCEPTED,
+        ).values_list('eppn', 'recipient_email', 'bundle__identifier_type')
+        counts = Counter()
+        for eppn, recipient_email, identifier_type in direct_awards:
+            user_ids = set(users_by_eppn.get((eppn or '').lower(), ()))
+            if identifier_type == DirectAwardBundle.IDENTIFIER_EMAIL:
+                user_ids.update(users_by_email.get(recipient_email.lower(), ()))
+            counts.update(user_ids)
+        return counts
+
     def save(self, *args, **kwargs):
         self.validate_unique()
         return super(DirectAward, self).save(*args, **kwargs)
 
+    def get_dependent_cache_tags(self):
+        tags = super(DirectAward, self).get_dependent_cache_tags()
+        tags += self.badgeclass.get_dependent_cache_tags()
+        if self.bundle_id:
+            tags.append(DirectAwardBundle.cache_tag_for(self.bundle_id))
+        return tags
+
     def revoke(self, revocation_reason):
         if self.status == DirectAward.STATUS_REVOKED:
             raise BadgrValidationError('DirectAward is already revoked', 999)
@@ -89,6 +153,7 @@ class DirectAward(BaseAuditedModel, BaseVersionedEntity, CacheModel):
     def award(self, recipient):
         """Accept the direct award and make an assertion out of it"""
         from issuer.models import BadgeInstance
+        from lti_edu.models import StudentsEnrolled
 
         if self.bundle.identifier_type == DirectAwardBundle.IDENTIFIER_EPPN:
             if self.eppn not in recipient.eppns:
@@ -144,8 +209,9 @@ class DirectAward(BaseAuditedModel, BaseVersionedEntity, CacheModel):
             enforce_validated_name=False,
         )
         # delete any pending enrollments for this badgeclass and user
-        recipient.cached_pending_enrollments().filter(badge_class=self.badgeclass).delete()
-        recipient.remove_cached_data(['cached_pending_enrollments'])
+        StudentsEnrolled.objects.filter(user=recipient, badge_class=self.badgeclass, badge_instance=None).delete()
+        # the bulk delete bypasses StudentsEnrolled.delete(), so invalidate what it would have
+        invalidate_tags(self.badgeclass.get_dependent_cache_tags() + [recipient.cache_tag])
         return assertion
 
     def get_permissions(self, user):
@@ -155,29 +221,24 @@ class DirectAward(BaseAuditedModel, BaseVersionedEntity, CacheModel):
         """
         return self.badgeclass.get_permissions(user)
 
-    def notify_recipient(self):
+    def notify_recipient(self, mailer=None, push=True):
+        """
+        :param mailer: optional BulkMailer to queue the mail on, when notifying many recipients at once
+        :param push: False when the caller sends the push notifications of many recipients in one batch
+        """
         from badgeuser.models import BadgeUser
         html_message = EmailMessageMaker.create_direct_award_student_mail(self)
         plain_text = strip_tags(html_message)
-        send_mail(
+        (mailer.send_mail if mailer else send_mail)(
             subject='Je hebt een edubadge ontvangen. You received an edubadge. Claim it now!',
             message=plain_text,
             html_message=html_message,
             recipient_list=[self.recipient_email],
         )
 
-        user = BadgeUser.objects.filter(email=self.recipient_email).first()
-        send_push_notification(
-            user=user,
-            title="Edubadge received",
-            body="You earned an edubadge, claim it now!",
-            data={
-                "title_key": "push.badge_received_title",
-                "body_key": "push.badge_received_body",
-                "badge": self.badgeclass.name,
-            },
-            badge_count=user.direct_awards.count(),
-        )
+        if push:
+            user = BadgeUser.objects.filter(email=self.recipient_email).first()
+            send_push_notifications([(user, badge_received_payload(self.badgeclass.name))])
 
     def get_recipient_name(self):
         if self.recipient_first_name and self.recipient_surname:
@@ -211,6 +272,13 @@ class DirectAwardBundle(BaseAuditedModel, BaseVersionedEntity, CacheModel):
     )
     identifier_type = models.CharField(max_length=254, choices=IDENTIFIER_TYPES, default=IDENTIFIER_EPPN)
     scheduled_at = models.DateTimeField(blank=True, null=True, default=None)
+    # Progress of notifying the recipients in the background
+    notification_total = models.IntegerField(default=0)
+    notification_sent_count = models.IntegerField(default=0)
+
+    def get_dependent_cache_tags(self):
+        tags = super(DirectAwardBundle, self).get_dependent_cache_tags()
+        return tags + self.badgeclass.get_dependent_cache_tags()
 
     @property
     def assertion_count(self):
@@ -248,9 +316,9 @@ class DirectAwardBundle(BaseAuditedModel, BaseVersionedEntity, CacheModel):
             'badgeclass/{}/direct-awards-bundles'.format(self.badgeclass.entity_id),
         )
 
-    @cached_method()
+    @cached_method(compact=True)
     def cached_direct_awards(self):
-        return list(DirectAward.objects.filter(bundle=self))
+        return DirectAward.objects.filter(bundle=self)
 
     @property
     def recipient_emails(self):
@@ -267,18 +335,10 @@ class DirectAwardBundle(BaseAuditedModel, BaseVersionedEntity, CacheModel):
             bcc=self.recipient_emails,
         )
 
-        for user in BadgeUser.objects.filter(email__in=self.recipient_emails):
-            send_push_notification(
-                user=user,
-                title="Edubadge received",
-                body="You earned an edubadge, claim it now!",
-                data={
-                    "title_key": "push.badge_received_title",
-                    "body_key": "push.badge_received_body",
-                    "badge": self.badgeclass.name,
-                },
-                badge_count=user.direct_awards.count(),
-            )
+        payload = badge_received_payload(self.badgeclass.name)
+        send_push_notifications(
+            [(user, payload) for user in BadgeUser.objects.filter(email__in=self.recipient_emails)]
+        )
 
     def notify_awarder(self):
         html_message = EmailMessageMaker.create_direct_award_bundle_mail(self)
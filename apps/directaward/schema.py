@@ -2,6 +2,8 @@ import graphene
 from graphene_django.types import DjangoObjectType
 
 from directaward.models import DirectAward, DirectAwardBundle
+from issuer.models import BadgeClass
+from mainsite.graphql_loaders import load_cached, load_related
 
 
 class DirectAwardType(DjangoObjectType):
@@ -10,6 +12,9 @@ class DirectAwardType(DjangoObjectType):
         fields = ('entity_id', 'eppn', 'status', 'recipient_email', 'badgeclass', 'created_at', 'updated_at',
                   'resend_at', 'delete_at', 'expiration_date', 'recipient_first_name', 'recipient_surname')
 
+    def resolve_badgeclass(self, info, **kwargs):
+        return load_related(info, self, 'badgeclass')
+
 
 class DirectAwardBundleType(DjangoObjectType):
     class Meta:
@@ -17,7 +22,7 @@ class DirectAwardBundleType(DjangoObjectType):
         fields = ('entity_id', 'badgeclass', 'created_at', 'updated_at', 'identifier_type',
                   'assertion_count', 'direct_award_count', 'direct_award_rejected_count', 'direct_award_expired_count',
                   'direct_award_removed_count', 'direct_award_deleted_count', 'direct_award_scheduled_count',
-                  'direct_award_revoked_count', 'initial_total')
+                  'direct_award_revoked_count', 'initial_total', 'notification_total', 'notification_sent_count')
 
     assertion_count = graphene.Int()
     direct_award_count = graphene.Int()
@@ -27,8 +32,18 @@ class DirectAwardBundleType(DjangoObjectType):
     direct_award_deleted_count = graphene.Int()
     direct_awards = graphene.List(DirectAwardType)
 
+    def resolve_badgeclass(self, info, **kwargs):
+        return load_related(info, self, 'badgeclass')
+
     def resolve_direct_awards(self, info, **kwargs):
-        return self.cached_direct_awards()
+        return load_cached(info, self, 'cached_direct_awards')
+
+
+def awardable_badgeclasses(user):
+    """the badgeclasses of the institution of the user on which the user may award"""
+    return BadgeClass.permitted(
+        user, ['may_award'], BadgeClass.objects.filter(issuer__faculty__institution=user.institution)
+    )
 
 
 class Query(object):
@@ -55,13 +70,10 @@ class Query(object):
 
     def resolve_all_unclaimed_direct_awards(self, info, **kwargs):
         user = info.context.user
-        return [da for da in DirectAward.objects.filter(badgeclass__issuer__faculty__institution=user.institution,
-                                                        status__in=[DirectAward.STATUS_UNACCEPTED,
-                                                                    DirectAward.STATUS_SCHEDULED]) if
-                da.badgeclass.has_permissions(info.context.user, ['may_award'])]
+        return DirectAward.objects.filter(badgeclass__in=awardable_badgeclasses(user),
+                                          status__in=[DirectAward.STATUS_UNACCEPTED, DirectAward.STATUS_SCHEDULED])
 
     def resolve_all_deleted_direct_awards(self, info, **kwargs):
         user = info.context.user
-        return [da for da in DirectAward.objects.filter(badgeclass__issuer__faculty__institution=user.institution,
-                                                        status=DirectAward.STATUS_DELETED) if
-                da.badgeclass.has_permissions(info.context.user, ['may_award'])]
+        return DirectAward.objects.filter(badgeclass__in=awardable_badgeclasses(user),
+                                          status=DirectAward.STATUS_DELETED)
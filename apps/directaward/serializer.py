@@ -1,17 +1,18 @@
 import datetime
 import re
-import threading
 
 from django.core.exceptions import ValidationError, BadRequest
 from django.db import transaction
 from rest_framework import serializers
 
 from directaward.models import DirectAward, DirectAwardBundle, DirectAwardAuditTrail
-from directaward.signals import audit_trail_signal
+from directaward.tasks import notify_bundle_recipients
+from directaward.signals import audit_trail_signal, build_audit_trail
 from issuer.models import BadgeClass
 from issuer.serializers import BadgeClassSlugRelatedField
 from mainsite import settings
 from mainsite.exceptions import BadgrValidationError
+from mainsite.utils import generate_entity_uri
 
 
 class DirectAwardSerializer(serializers.Serializer):
@@ -84,7 +85,6 @@ class DirectAwardBundleSerializer(serializers.Serializer):
         direct_awards = validated_data.pop('direct_awards')
         user_permissions = badgeclass.get_permissions(validated_data['created_by'])
         if user_permissions['may_award']:
-            successful_direct_awards = []
             un_successful_direct_awards = []
             if hasattr(self.context['request'], 'sis_api_call') and getattr(self.context['request'], 'sis_api_call'):
                 validated_data['sis_import'] = True
@@ -94,56 +94,78 @@ class DirectAwardBundleSerializer(serializers.Serializer):
                 direct_award_bundle = DirectAwardBundle.objects.create(
                     initial_total=direct_awards.__len__(), **validated_data
                 )
-                direct_award_bundle.badgeclass.remove_cached_data(['cached_direct_awards'])
-                direct_award_bundle.badgeclass.remove_cached_data(['cached_direct_award_bundles'])
 
                 eppn_required = validated_data.get('identifier_type', 'eppn') == 'eppn'
                 now = datetime.datetime.now(datetime.timezone.utc)
                 expiration_date = now + datetime.timedelta(days=settings.EXPIRY_DIRECT_AWARDS_DELETION_THRESHOLD_DAYS)
+                status = DirectAward.STATUS_SCHEDULED if scheduled_at else DirectAward.STATUS_UNACCEPTED
                 for direct_award in direct_awards:
                     # Not required and already validated
                     direct_award['recipient_email'] = direct_award['recipient_email'].lower()
                     direct_award['eppn'] = direct_award['eppn'].lower() if eppn_required else None
-                    status = DirectAward.STATUS_SCHEDULED if scheduled_at else DirectAward.STATUS_UNACCEPTED
                     direct_award['status'] = status
                     direct_award['created_by'] = validated_data['created_by']
                     direct_award['expiration_date'] = expiration_date
                     direct_award['recipient_first_name'] = direct_award.pop('first_name', None) or None
                     direct_award['recipient_surname'] = direct_award.pop('surname', None) or None
-                    try:
-                        da_created = DirectAward.objects.create(
-                            bundle=direct_award_bundle,
-                            badgeclass=badgeclass,
-                            **direct_award,
-                        )
-                        successful_direct_awards.append(da_created)
-                        audit_trail_signal.send(
-                            sender=self.__class__,
-                            request=self.context['request'],
-                            user=validated_data['created_by'],
-                            method='CREATE',
-                            summary='Directawards created',
-                            direct_award_id=da_created.entity_id,
-                            badgeclass_id=da_created.badgeclass_id,
-                        )
-                    except Exception as e:
+
+                # one query for the duplicates instead of validate_unique per direct award
+                duplicate_eppns, duplicate_emails = DirectAward.unaccepted_duplicates(
+                    badgeclass,
+                    [direct_award['eppn'] for direct_award in direct_awards],
+                    [direct_award['recipient_email'] for direct_award in direct_awards],
+                )
+                new_direct_awards = []
+                for direct_award in direct_awards:
+                    eppn, email = direct_award['eppn'], direct_award['recipient_email']
+                    if (eppn and eppn in duplicate_eppns) or email in duplicate_emails:
                         un_successful_direct_awards.append(
-                            {'error': str(e), 'eppn': direct_award['eppn'], 'email': direct_award['recipient_email']}
+                            {'error': DirectAward.duplicate_message(eppn, email, badgeclass), 'eppn': eppn,
+                             'email': email}
                         )
-                if not successful_direct_awards:
+                        continue
+                    if status == DirectAward.STATUS_UNACCEPTED:
+                        # later rows of this upload for the same recipient are duplicates of this one
+                        if eppn_required:
+                            duplicate_eppns.add(eppn)
+                        else:
+                            duplicate_emails.add(email)
+                    new_direct_awards.append(DirectAward(
+                        entity_id=generate_entity_uri(),
+                        bundle=direct_award_bundle,
+                        badgeclass=badgeclass,
+                        **direct_award,
+                    ))
+                if not new_direct_awards:
                     raise BadRequest(
                         f'No valid DirectAwards are created. All of them were rejected: '
                         f'{str(un_successful_direct_awards)}'
                     )
+                DirectAward.objects.bulk_create(new_direct_awards, batch_size=settings.DIRECT_AWARD_BULK_BATCH_SIZE)
+                # MySQL does not return the primary keys of bulk created rows
+                successful_direct_awards = list(DirectAward.objects.filter(bundle=direct_award_bundle))
+                DirectAwardAuditTrail.objects.bulk_create(
+                    [
+                        build_audit_trail(
+                            user=validated_data['created_by'],
+                            request=self.context['request'],
+                            method='CREATE',
+                            summary='Directawards created',
+                            direct_award=da_created,
+                            badgeclass=badgeclass,
+                        )
+                        for da_created in successful_direct_awards
+                    ],
+                    batch_size=settings.DIRECT_AWARD_BULK_BATCH_SIZE,
+                )
+                # bulk_create skips save(), invalidate the cached direct awards of the bundle and badgeclass at once
+                direct_award_bundle.invalidate_cached_data()
 
             if notify_recipients and not scheduled_at:
-
-                def send_mail(awards):
-                    for da in awards:
-                        da.notify_recipient()
-
-                thread = threading.Thread(target=send_mail, args=(successful_direct_awards,))
-                thread.start()
+                direct_award_bundle.notification_total = len(successful_direct_awards)
+                direct_award_bundle.save(update_fields=['notification_total'])
+                direct_award_ids = [da.pk for da in successful_direct_awards]
+                transaction.on_commit(lambda: notify_bundle_recipients(direct_award_bundle, direct_award_ids))
             if batch_mode and not scheduled_at:
                 direct_award_bundle.notify_awarder()
             if batch_mode and scheduled_at:
@@ -23,11 +23,22 @@ def get_client_ip(request):
     return ip
 
 
+def build_audit_trail(user, request, method, summary, direct_award=None, badgeclass=None):
+    """an unsaved DirectAwardAuditTrail, for bulk_create when many direct awards are created at once"""
+    return DirectAwardAuditTrail(
+        user=user,
+        user_agent_info=request.headers.get('user-agent', '<unknown>')[:255],
+        login_IP=get_client_ip(request),
+        action=method,
+        change_summary=summary,
+        direct_award=direct_award,
+        badgeclass=badgeclass,
+    )
+
+
 @receiver(audit_trail_signal)
 def direct_award_audit_trail(sender, user, request, direct_award_id, badgeclass_id, method, summary, **kwargs):
     try:
-        user_agent_info = (request.headers.get('user-agent', '<unknown>')[:255],)
-
         direct_award = None
         badgeclass = None
         if direct_award_id:
@@ -35,15 +46,8 @@ def direct_award_audit_trail(sender, user, request, direct_award_id, badgeclass_
         if badgeclass_id:
             badgeclass = BadgeClass.objects.filter(id=badgeclass_id).first()
 
-        audit_trail = DirectAwardAuditTrail.objects.create(
-            user=user,
-            user_agent_info=user_agent_info,
-            login_IP=get_client_ip(request),
-            action=method,
-            change_summary=summary,
-            direct_award=direct_award,
-            badgeclass=badgeclass,
-        )
+        audit_trail = build_audit_trail(user, request, method, summary, direct_award, badgeclass)
+        audit_trail.save()
         logger.info(
             f'direct_award_audit_trail created {audit_trail.id}  for user {audit_trail.user} and directaward {direct_award_id}'
         )
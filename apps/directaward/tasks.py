@@ -0,0 +1,60 @@
+import logging
+
+from django.conf import settings
+from django.db.models import F
+
+from mainsite.celery import IdempotentTask, app, notification_task_queue_name
+from mainsite.utils import BulkMailer
+from mobile_api.push_notifications import badge_received_payload, send_push_notifications
+
+logger = logging.getLogger('Badgr.Debug')
+
+
+@app.task(bind=True, base=IdempotentTask, queue=notification_task_queue_name)
+def notify_direct_award_recipients(self, bundle_id, direct_award_ids):
+    """
+    Notifies the recipients of the given direct awards and records the progress on their bundle. The recipients who
+    got their mail are sent their push notification and counted right away; only the ones whose mail failed are
+    retried.
+    :param bundle_id: pk of the DirectAwardBundle
+    :param direct_award_ids: pks of the direct awards in the bundle
+    """
+    from badgeuser.models import BadgeUser
+    from directaward.models import DirectAward, DirectAwardBundle
+
+    direct_awards = list(DirectAward.objects.filter(pk__in=direct_award_ids).select_related('badgeclass'))
+    queued = []
+    with BulkMailer(batch_size=len(direct_award_ids)) as mailer:
+        for direct_award in direct_awards:
+            try:
+                direct_award.notify_recipient(mailer=mailer, push=False)
+                queued.append(direct_award)
+            except Exception:
+                logger.exception('Failed to notify the recipient of direct award {}'.format(direct_award.entity_id))
+    not_delivered = set(mailer.failed_recipients) | set(mailer.refused_recipients)
+    delivered = [direct_award for direct_award in queued if direct_award.recipient_email not in not_delivered]
+    if delivered:
+        users = {user.email.lower(): user for user in
+                 BadgeUser.objects.filter(email__in=[direct_award.recipient_email for direct_award in delivered])}
+        send_push_notifications([
+            (users.get(direct_award.recipient_email.lower()), badge_received_payload(direct_award.badgeclass.name))
+            for direct_award in delivered
+        ])
+        DirectAwardBundle.objects.filter(pk=bundle_id).update(
+            notification_sent_count=F('notification_sent_count') + len(delivered)
+        )
+    failed = set(mailer.failed_recipients)
+    retry_ids = [direct_award.pk for direct_award in queued if direct_award.recipient_email in failed]
+    if retry_ids:
+        raise self.retry(args=(bundle_id, retry_ids))
+
+
+def notify_bundle_recipients(bundle, direct_award_ids):
+    """
+    Queues the notification of the recipients of a new bundle, in chunks
+    :param bundle: DirectAwardBundle
+    :param direct_award_ids: pks of the direct awards to notify
+    """
+    chunk_size = settings.DIRECT_AWARD_NOTIFICATION_CHUNK_SIZE
+    for start in range(0, len(direct_award_ids), chunk_size):
+        notify_direct_award_recipients.delay(bundle.pk, direct_award_ids[start:start + chunk_size])
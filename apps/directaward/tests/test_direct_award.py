@@ -1,9 +1,17 @@
 import json
+import uuid
+from unittest.mock import patch
+
+from django.core import mail
+from fcm_django.models import FCMDevice
+
 from mainsite.tests import BadgrTestCase
 
-from directaward.models import DirectAward, DirectAwardBundle
+from directaward.models import DirectAward, DirectAwardBundle, DirectAwardAuditTrail
+from directaward.tasks import notify_direct_award_recipients
 from issuer.models import BadgeInstance
 from lti_edu.models import StudentsEnrolled
+from mobile_api.push_notifications import badge_received_payload, local_messaging_client, send_push_notifications
 
 
 class DirectAwardTest(BadgrTestCase):
@@ -37,6 +45,67 @@ class DirectAwardTest(BadgrTestCase):
         self.assertEqual(response.status_code, 400)
         self.assertFalse(DirectAward.objects.filter(eppn='unique_eppn').exists())  # if atomic, this one was not created
 
+    def test_create_direct_award_bundle_in_bulk(self):
+        teacher1 = self.setup_teacher(authenticate=True, )
+        self.setup_staff_membership(teacher1, teacher1.institution, may_award=True)
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=faculty)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        self.setup_direct_award(badgeclass=badgeclass, eppn='duplicate_eppn')
+        post_data = {'badgeclass': badgeclass.entity_id,
+                     'notify_recipients': True,
+                     'direct_awards': [{'recipient_email': 'some@email.com', 'eppn': 'unique_eppn'},
+                                       {'recipient_email': 'some@email2.com', 'eppn': 'duplicate_eppn'},
+                                       {'recipient_email': 'some@email3.com', 'eppn': 'UNIQUE_EPPN'}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/directaward/create', json.dumps(post_data),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['un_successful_direct_award']), 2)
+        bundle = DirectAwardBundle.objects.get(entity_id=response.data['entity_id'])
+        self.assertEqual(bundle.directaward_set.get().eppn, 'unique_eppn')
+        self.assertEqual(DirectAwardAuditTrail.objects.filter(direct_award__bundle=bundle).count(), 1)
+        self.assertEqual(bundle.notification_total, 1)
+        self.assertEqual(bundle.notification_sent_count, 1)
+        self.assertEqual(len(badgeclass.cached_direct_awards()), 2)
+
+    def test_notification_task_runs_once_per_message(self):
+        teacher1 = self.setup_teacher()
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=faculty)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        direct_award = self.setup_direct_award(badgeclass=badgeclass)
+        mail.outbox = []
+        # a message redelivered after the worker died keeps its task id
+        task_id = str(uuid.uuid4())
+        for _ in range(2):
+            notify_direct_award_recipients.apply(args=(direct_award.bundle_id, [direct_award.pk]), task_id=task_id)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(DirectAwardBundle.objects.get(pk=direct_award.bundle_id).notification_sent_count, 1)
+
+    def test_push_notifications_sent_in_batches(self):
+        teacher1 = self.setup_teacher()
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=faculty)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        bundle = self.setup_direct_award_bundle(badgeclass=badgeclass,
+                                                identifier_type=DirectAwardBundle.IDENTIFIER_EMAIL)
+        students = [self.setup_student() for _ in range(3)]
+        for index, student in enumerate(students):
+            FCMDevice.objects.create(user=student, registration_id='token{}'.format(index), type='android')
+            self.setup_direct_award(badgeclass=badgeclass, bundle=bundle, recipient_email=student.email)
+        local_messaging_client.outbox = []
+        local_messaging_client.batches = 0
+        with patch('mobile_api.push_notifications.FCM_BATCH_SIZE', 2):
+            # the devices, the affiliations and the unclaimed direct awards
+            with self.assertNumQueries(3):
+                delivered = send_push_notifications(
+                    [(student, badge_received_payload(badgeclass.name)) for student in students]
+                )
+        self.assertEqual(delivered, 3)
+        self.assertEqual(local_messaging_client.batches, 2)
+        self.assertEqual([message.apns.payload.aps.badge for message in local_messaging_client.outbox], [1, 1, 1])
+
     def test_accept_direct_award_from_bundle(self):
         institution = self.setup_institution(identifier='some_home')
         teacher1 = self.setup_teacher(authenticate=True, institution=institution)
@@ -1,33 +1,15 @@
-import threading
-
+from django.db import transaction
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from endorsement.models import Endorsement
 from endorsement.serializer import EndorsementSerializer
+from endorsement.tasks import send_endorsement_notifications
 from entity.api import BaseEntityListView, BaseEntityDetailView, VersionedObjectMixin
 from mainsite.exceptions import BadgrValidationError
 from mainsite.permissions import AuthenticatedWithVerifiedEmail, TeachPermission
-from mainsite.utils import EmailMessageMaker, send_mail
+from mainsite.utils import EmailMessageMaker
 from rest_framework import status
 
-# Send notifications to all users who have indicated they want to get notified
-from notifications.models import BadgeClassUserNotification
-
-
-def send_notifications(endorsement: Endorsement, current_user):
-    user_notifications = BadgeClassUserNotification.objects.filter(badgeclass=endorsement.endorser).all()
-    for user_notification in user_notifications:
-        perms = endorsement.endorser.get_permissions(user_notification.user)
-        if perms['may_award']:
-            html_message = EmailMessageMaker.create_endorsement_requested_mail(current_user,
-                                                                               user_notification.user,
-                                                                               endorsement)
-            send_mail(subject='Een endorsement is aangevraagd! An endorsement is requested!',
-                      message=None, html_message=html_message,
-                      recipient_list=[user_notification.user.email])
-        else:
-            user_notification.delete()
-
 
 class EndorsementList(VersionedObjectMixin, BaseEntityListView):
     permission_classes = (AuthenticatedWithVerifiedEmail,)
@@ -37,8 +19,8 @@ class EndorsementList(VersionedObjectMixin, BaseEntityListView):
         serializer = EndorsementSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             endorsement = serializer.save()
-            thread = threading.Thread(target=send_notifications, args=(endorsement, request.user))
-            thread.start()
+            # Send notifications to all users who have indicated they want to get notified
+            transaction.on_commit(lambda: send_endorsement_notifications.delay(endorsement.pk, request.user.pk))
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -87,6 +69,5 @@ class EndorsementResend(APIView):
 
     def post(self, request, **kwargs):
         endorsement = Endorsement.objects.get(entity_id=kwargs['entity_id'])
-        thread = threading.Thread(target=send_notifications, args=(endorsement, request.user))
-        thread.start()
+        send_endorsement_notifications.delay(endorsement.pk, request.user.pk)
         return Response({}, status=status.HTTP_200_OK)
@@ -50,6 +50,16 @@ class Endorsement(BaseAuditedModel, BaseVersionedEntity, CacheModel):
         """
         return self.endorsee.get_permissions(user)
 
+    def get_dependent_cache_tags(self):
+        tags = super(Endorsement, self).get_dependent_cache_tags()
+        return tags + [self.endorsee.cache_tag, self.endorser.cache_tag]
+
+    def get_changed_cache_tags(self):
+        tags = super(Endorsement, self).get_changed_cache_tags()
+        return tags + [
+            BadgeClass.public_json_tag_for(self.endorsee_id),
+            BadgeClass.public_json_tag_for(self.endorser_id),
+        ]
+
     def clear_endorsement_cache(self):
-        self.endorsee.remove_cached_data(['cached_endorsements'])
-        self.endorser.remove_cached_data(['cached_endorsed'])
+        self.invalidate_cached_data()
@@ -0,0 +1,38 @@
+from mainsite.celery import IdempotentTask, app, notification_task_queue_name
+from mainsite.utils import BulkMailer, EmailMessageMaker
+
+
+@app.task(bind=True, base=IdempotentTask, queue=notification_task_queue_name)
+def send_endorsement_notifications(self, endorsement_id, current_user_id, recipients=None):
+    """
+    Mails the users who want to be notified of endorsement requests for the endorser, if they may still award it.
+    :param recipients: the emails to mail, on a retry; all users with a notification when None
+    """
+    from badgeuser.models import BadgeUser
+    from endorsement.models import Endorsement
+    from notifications.models import BadgeClassUserNotification
+
+    endorsement = Endorsement.objects.filter(pk=endorsement_id).first()
+    current_user = BadgeUser.objects.filter(pk=current_user_id).first()
+    if endorsement is None or current_user is None:
+        return
+    user_notifications = BadgeClassUserNotification.objects.filter(
+        badgeclass=endorsement.endorser
+    ).select_related('user')
+    if recipients is not None:
+        user_notifications = user_notifications.filter(user__email__in=recipients)
+    with BulkMailer() as mailer:
+        for user_notification in user_notifications:
+            perms = endorsement.endorser.get_permissions(user_notification.user)
+            if perms['may_award']:
+                html_message = EmailMessageMaker.create_endorsement_requested_mail(current_user,
+                                                                                   user_notification.user,
+                                                                                   endorsement)
+                mailer.send_mail(subject='Een endorsement is aangevraagd! An endorsement is requested!',
+                                 message=None, html_message=html_message,
+                                 recipient_list=[user_notification.user.email])
+            else:
+                user_notification.delete()
+    if mailer.failed_recipients:
+        # only the recipients of the failed batches, the others already got their mail
+        raise self.retry(args=(endorsement_id, current_user_id,), kwargs={'recipients': mailer.failed_recipients})
@@ -1,5 +1,6 @@
 # encoding: utf-8
 from cachemodel.decorators import cached_method
+from cachemodel.local import get_local_cache
 from cachemodel.models import CacheModel
 from cachemodel.utils import generate_cache_key
 from django.db import models
@@ -17,6 +18,7 @@ class BadgrCacheModel(CacheModel):
         """
         Deletes the cached values for the given method names
         """
+        local = get_local_cache()
         for method_name  in method_names:
             method = getattr(self, method_name, None)
             if not getattr(method, '_cached_method', False):
@@ -25,6 +27,8 @@ class BadgrCacheModel(CacheModel):
             if callable(target):
                 key = generate_cache_key([self.__class__.__name__, target.__name__, self.pk])
                 cache.delete(key)
+                if local is not None:
+                    local.delete(key)
 
 
 class _AbstractVersionedEntity(BadgrCacheModel):
@@ -7,18 +7,29 @@ from django.db import models
 from django.db.models import Q
 from django.urls import reverse
 
-from cachemodel.decorators import cached_method
+from cachemodel.decorators import cached_method, cached_method_many
+from cachemodel.utils import group_by_attribute
 from entity.models import BaseVersionedEntity, EntityUserProvisionmentMixin
 from mainsite.exceptions import BadgrValidationFieldError, BadgrValidationMultipleFieldError
 from mainsite.mixins import ImageUrlGetterMixin, DefaultLanguageMixin
 from mainsite.models import BaseAuditedModel, ArchiveMixin
+from mainsite.derivatives import ImageDerivativesMixin
+from mainsite.public_json import PublicJsonMixin
+from mainsite.snapshots import CatalogMixin
 from mainsite.utils import OriginSetting
 from staff.mixins import PermissionedModelMixin
 from staff.models import FacultyStaff, InstitutionStaff
 
 
 class Institution(
-    EntityUserProvisionmentMixin, PermissionedModelMixin, ImageUrlGetterMixin, BaseVersionedEntity, BaseAuditedModel
+    CatalogMixin,
+    PublicJsonMixin,
+    ImageDerivativesMixin,
+    EntityUserProvisionmentMixin,
+    PermissionedModelMixin,
+    ImageUrlGetterMixin,
+    BaseVersionedEntity,
+    BaseAuditedModel,
 ):
     def __str__(self):
         return self.name or ''
@@ -36,6 +47,7 @@ class Institution(
     description_dutch = models.TextField(blank=True, null=True, default=None)
     image_english = models.FileField(upload_to='uploads/institution', blank=True, null=True)
     image_dutch = models.FileField(upload_to='uploads/institution', blank=True, null=True)
+    derivative_image_fields = ('image_english', 'image_dutch')
     grading_table = models.CharField(max_length=254, blank=True, null=True, default=None)
     brin = models.CharField(max_length=254, blank=True, null=True, default=None)
     direct_awarding_enabled = models.BooleanField(default=False)
@@ -152,21 +164,24 @@ class Institution(
         total_assertions_revoked = 0
         total_enrollments = 0
         unique_recipients = set()
-        for badgeclass in self.cached_badgeclasses():
-            for assertion in badgeclass.cached_assertions():
+        badgeclasses = self.cached_badgeclasses()
+        all_assertions = cached_method_many(badgeclasses, 'cached_assertions')
+        all_enrollments = cached_method_many(badgeclasses, 'cached_enrollments')
+        for badgeclass, assertions, enrollments in zip(badgeclasses, all_assertions, all_enrollments):
+            for assertion in assertions:
                 if badgeclass.formal:
                     total_assertions_formal += 1
                 else:
                     total_assertions_informal += 1
                 if assertion.revoked:
                     total_assertions_revoked += 1
-                unique_recipients.add(assertion.user)
-            total_enrollments += badgeclass.cached_enrollments().__len__()
+                unique_recipients.add(assertion.user_id)
+            total_enrollments += enrollments.__len__()
         return {
             'name': self.name,
             'type': self.__class__.__name__.capitalize(),
             'id': self.pk,
-            'total_badgeclasss': self.cached_badgeclasses().__len__(),
+            'total_badgeclasss': badgeclasses.__len__(),
             'total_issuers': self.cached_issuers().__len__(),
             'total_faculties': self.cached_faculties().__len__(),
             'total_enrollments': total_enrollments,
@@ -267,22 +282,32 @@ class Institution(
         """returns all staff members"""
         return list(InstitutionStaff.objects.filter(institution=self))
 
+    @cached_staff.many
+    def cached_staff(institutions):
+        staff = InstitutionStaff.objects.filter(institution__in=institutions)
+        return group_by_attribute(staff, 'institution_id', [institution.pk for institution in institutions])
+
     @cached_method(auto_publish=True)
     def cached_faculties(self):
         return list(self.faculty_set.all())
 
+    @cached_faculties.many
+    def cached_faculties(institutions):
+        faculties = Faculty.objects.filter(institution__in=institutions)
+        return group_by_attribute(faculties, 'institution_id', [institution.pk for institution in institutions])
+
     @cached_method(auto_publish=True)
     def cached_issuers(self):
         r = []
-        for faculty in self.cached_faculties():
-            r += list(faculty.cached_issuers())
+        for issuers in cached_method_many(self.cached_faculties(), 'cached_issuers'):
+            r += list(issuers)
         return r
 
     @cached_method(auto_publish=True)
     def cached_badgeclasses(self):
         r = []
-        for issuer in self.cached_issuers():
-            r += list(issuer.cached_badgeclasses())
+        for badgeclasses in cached_method_many(self.cached_issuers(), 'cached_badgeclasses'):
+            r += list(badgeclasses)
         return r
 
     @cached_method()
@@ -340,6 +365,9 @@ class BadgeClassTag(models.Model):
 
 
 class Faculty(
+    CatalogMixin,
+    PublicJsonMixin,
+    ImageDerivativesMixin,
     EntityUserProvisionmentMixin,
     ArchiveMixin,
     DefaultLanguageMixin,
@@ -358,10 +386,12 @@ class Faculty(
         verbose_name_plural = 'faculties'
 
     DUTCH_NAME = 'issuer group'
+    parent_field_name = 'institution'
     name_dutch = models.CharField(max_length=512, null=True)
     name_english = models.CharField(max_length=512, null=True)
     image_english = models.FileField(upload_to='uploads/faculties', blank=True, null=True)
     image_dutch = models.FileField(upload_to='uploads/faculties', blank=True, null=True)
+    derivative_image_fields = ('image_english', 'image_dutch')
     institution = models.ForeignKey(Institution, on_delete=models.CASCADE, blank=False, null=False)
     staff = models.ManyToManyField('badgeuser.BadgeUser', through='staff.FacultyStaff')
     description_english = models.TextField(blank=True, null=True, default=None)
@@ -414,21 +444,24 @@ class Faculty(
         total_assertions_revoked = 0
         total_enrollments = 0
         unique_recipients = set()
-        for badgeclass in self.cached_badgeclasses():
-            for assertion in badgeclass.cached_assertions():
+        badgeclasses = self.cached_badgeclasses()
+        all_assertions = cached_method_many(badgeclasses, 'cached_assertions')
+        all_enrollments = cached_method_many(badgeclasses, 'cached_enrollments')
+        for badgeclass, assertions, enrollments in zip(badgeclasses, all_assertions, all_enrollments):
+            for assertion in assertions:
                 if badgeclass.formal:
                     total_assertions_formal += 1
                 else:
                     total_assertions_informal += 1
                 if assertion.revoked:
                     total_assertions_revoked += 1
-                unique_recipients.add(assertion.user)
-            total_enrollments += badgeclass.cached_enrollments().__len__()
+                unique_recipients.add(assertion.user_id)
+            total_enrollments += enrollments.__len__()
         return {
             'name': self.name,
             'type': self.__class__.__name__.capitalize(),
             'id': self.pk,
-            'total_badgeclasss': self.cached_badgeclasses().__len__(),
+            'total_badgeclasss': badgeclasses.__len__(),
             'total_issuers': self.cached_issuers().__len__(),
             'total_enrollments': total_enrollments,
             'total_recipients': unique_recipients.__len__(),
@@ -520,24 +553,39 @@ class Faculty(
 
     @cached_method(auto_publish=True)
     def cached_staff(self):
-        return FacultyStaff.objects.filter(faculty=self)
+        return list(FacultyStaff.objects.filter(faculty=self))
+
+    @cached_staff.many
+    def cached_staff(faculties):
+        staff = FacultyStaff.objects.filter(faculty__in=faculties)
+        return group_by_attribute(staff, 'faculty_id', [faculty.pk for faculty in faculties])
+
+    def get_public_json_objects(self):
+        institution = Institution.cached.get(pk=self.institution_id)
+        return super(Faculty, self).get_public_json_objects() + institution.get_public_json_objects()
 
     @cached_method(auto_publish=True)
     def cached_issuers(self):
         return list(self.issuer_set.all())
 
-    @cached_method(auto_publish=True)
+    @cached_issuers.many
+    def cached_issuers(faculties):
+        from issuer.models import Issuer
+
+        issuers = Issuer.objects.filter(faculty__in=faculties)
+        return group_by_attribute(issuers, 'faculty_id', [faculty.pk for faculty in faculties])
+
+    @cached_method(auto_publish=True, compact=True)
     def cached_pending_enrollments(self):
         r = []
-        for issuer in self.cached_issuers():
-            r += issuer.cached_pending_enrollments()
+        for pending_enrollments in cached_method_many(self.cached_issuers(), 'cached_pending_enrollments'):
+            r += pending_enrollments
         return r
 
     @cached_method(auto_publish=True)
     def cached_badgeclasses(self):
         r = []
-        for issuer in self.cached_issuers():
-            badgeclasses = issuer.cached_badgeclasses()
+        for badgeclasses in cached_method_many(self.cached_issuers(), 'cached_badgeclasses'):
             if badgeclasses:
                 r += badgeclasses
         return r
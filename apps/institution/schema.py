@@ -5,6 +5,7 @@ from issuer.models import Issuer
 from issuer.schema import IssuerType
 from mainsite.graphql_utils import UserProvisionmentResolverMixin, ContentTypeIdResolverMixin, StaffResolverMixin, \
     ImageResolverMixin, PermissionsResolverMixin, DefaultLanguageResolverMixin
+from mainsite.graphql_loaders import load_cached, load_related
 from mainsite.utils import generate_image_url
 from staff.schema import InstitutionStaffType, FacultyStaffType
 from .models import Institution, Faculty, BadgeClassTag
@@ -41,17 +42,20 @@ class FacultyType(UserProvisionmentResolverMixin, PermissionsResolverMixin, Staf
     def resolve_name(self, info):
         return self.name
 
+    def resolve_institution(self, info):
+        return load_related(info, self, 'institution')
+
     def resolve_issuers(self, info):
-        return self.get_issuers(info.context.user, ['may_read'])
+        return readable_issuers(info, self)
 
     def resolve_issuer_count(self, info):
-        return self.get_issuers(info.context.user, ['may_read']).__len__()
+        return readable_issuers(info, self).__len__()
 
     def resolve_pending_enrollment_count(self, info):
-        return self.cached_pending_enrollments().__len__()
+        return load_cached(info, self, 'cached_pending_enrollments').__len__()
 
     def resolve_public_issuers(self, info):
-        return self.cached_issuers()
+        return load_cached(info, self, 'cached_issuers')
 
     def resolve_has_unrevoked_assertions(self, info):
         return any([assertion.revoked is False for assertion in self.assertions])
@@ -59,6 +63,14 @@ class FacultyType(UserProvisionmentResolverMixin, PermissionsResolverMixin, Staf
     def resolve_has_assertions(self, info):
         return bool(self.assertions)
 
+
+def readable_issuers(info, faculty):
+    """Faculty.get_issuers() with the issuers of the sibling faculties loaded in one batch"""
+    user = info.context.user
+    return [issuer for issuer in load_cached(info, faculty, 'cached_issuers')
+            if issuer.has_permissions(user, ['may_read'])]
+
+
 class BadgeClassTagType(DjangoObjectType):
     class Meta:
         model = BadgeClassTag
@@ -104,10 +116,12 @@ class InstitutionType(UserProvisionmentResolverMixin, PermissionsResolverMixin,
         return list(self.badgeclasstag_set.all())
 
     def resolve_faculties(self, info):
-        return self.get_faculties(info.context.user, ['may_read'])
+        user = info.context.user
+        return [faculty for faculty in load_cached(info, self, 'cached_faculties')
+                if faculty.has_permissions(user, ['may_read'])]
 
     def resolve_public_faculties(self, info):
-        faculties = self.cached_faculties()
+        faculties = load_cached(info, self, 'cached_faculties')
         return [faculty for faculty in faculties if
                 faculty.visibility_type is None or faculty.visibility_type == Faculty.VISIBILITY_PUBLIC]
 
@@ -137,16 +151,15 @@ class Query(object):
 
     def resolve_issuers(self, info, **kwargs):
         user = info.context.user
-        return [iss for iss in Issuer.objects.filter(faculty__institution=user.institution) if
-                iss.has_permissions(user, ['may_update'])]
+        return Issuer.permitted(user, ['may_update'], Issuer.objects.filter(faculty__institution=user.institution))
 
     def resolve_institutions(self, info, **kwargs):
         user = info.context.user
         if not hasattr(user, 'is_authenticated') or not user.is_authenticated:
             return []
-        is_superuser = hasattr(user, 'is_superuser') and user.is_superuser
-        return [inst for inst in Institution.objects.all() if
-                inst.has_permissions(user, ['may_read']) or is_superuser]
+        if hasattr(user, 'is_superuser') and user.is_superuser:
+            return Institution.objects.all()
+        return Institution.permitted(user, ['may_read'])
 
     def resolve_public_institution(self, info, **kwargs):
         id = kwargs.get('id')
@@ -163,7 +176,7 @@ class Query(object):
             return Faculty.objects.get(entity_id=id)
 
     def resolve_faculties(self, info, **kwargs):
-        return [fac for fac in Faculty.objects.all() if fac.has_permissions(info.context.user, ['may_read'])]
+        return Faculty.permitted(info.context.user, ['may_read'])
 
     def resolve_faculty(self, info, **kwargs):
         id = kwargs.get('id')
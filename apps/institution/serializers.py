@@ -8,6 +8,7 @@ from rest_framework.serializers import PrimaryKeyRelatedField
 
 from badgeuser.models import BadgeUser
 
+from cachemodel.tags import invalidate_tags
 from mainsite.drf_fields import ValidImageField
 from mainsite.exceptions import BadgrValidationError
 from mainsite.mixins import InternalValueErrorOverrideMixin
@@ -88,14 +89,13 @@ class InstitutionSerializer(InternalValueErrorOverrideMixin, serializers.Seriali
                     tag_db.save()
                 else:
                     from issuer.models import BadgeClass
-                    # Now remove all the cached tags on badgeClasses
-                    badge_classes = BadgeClass.objects \
-                        .filter(tags__name=tag_db.name) \
-                        .filter(issuer__faculty__institution=instance) \
-                        .all()
-                    for bc in badge_classes:
-                        bc.remove_cached_data(['cached_tags'])
+                    badge_class_ids = list(BadgeClass.objects
+                                           .filter(tags__name=tag_db.name)
+                                           .filter(issuer__faculty__institution=instance)
+                                           .values_list('pk', flat=True))
                     tag_db.delete()
+                    # Now invalidate the cached tags of the badgeClasses
+                    invalidate_tags([BadgeClass.cache_tag_for(pk) for pk in badge_class_ids])
 
         instance.award_allowed_institutions.set(validated_data.get('award_allowed_institutions', []))
         instance.save()
@@ -7,6 +7,7 @@ from rest_framework.response import Response
 from rest_framework.status import HTTP_404_NOT_FOUND, HTTP_400_BAD_REQUEST, HTTP_204_NO_CONTENT
 
 import badgrlog
+from cachemodel.deferred import coalesce_publishes
 from entity.api import BaseEntityListView, BaseEntityDetailView, VersionedObjectMixin, BaseEntityView, BaseArchiveView
 from issuer.models import Issuer, BadgeClass, BadgeInstance, BadgeInstanceCollection
 from issuer.serializers import (
@@ -207,13 +208,12 @@ class BatchAwardEnrollments(VersionedObjectMixin, BaseEntityView):
         serializer_class = self.get_serializer_class()
         serializer = serializer_class(many=True, data=request.data.get('enrollments'), context=context)
         serializer.is_valid(raise_exception=True)
-        new_instances = serializer.save(created_by=request.user)
+        with coalesce_publishes():
+            new_instances = serializer.save(created_by=request.user)
         for new_instance in new_instances:
             self.log_create(new_instance)
-        # Clear cache for the enrollments of this badgeclass
-        badgeclass.remove_cached_data(['cached_pending_enrollments'])
-        badgeclass.remove_cached_data(['cached_pending_enrollments_including_denied'])
-        badgeclass.remove_cached_data(['cached_assertions'])
+        # Clear cache for the enrollments and assertions of this badgeclass and its parents
+        badgeclass.invalidate_cached_data()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
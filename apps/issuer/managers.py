@@ -3,12 +3,14 @@ import io
 import json
 import os
 import urllib.parse
+from collections import Counter, defaultdict
 from json import dumps as json_dumps
 
 import dateutil.parser
 from django.core.files.base import ContentFile
 from django.core.files.storage import DefaultStorage
-from django.db import models, transaction
+from django.db import connections, models, transaction
+from django.db.models import Count, F, Q
 from django.urls import Resolver404, resolve
 from mainsite.utils import OriginSetting, fetch_remote_file_to_storage, list_of
 
@@ -205,6 +207,65 @@ class BadgeInstanceManager(BaseOpenBadgeObjectManager):
         return new_instance
 
 
+class BadgeClassAssertionCountsManager(models.Manager):
+    def adjust(self, changes):
+        """
+        Applies changes of the counted state of assertions, with one UPDATE per badgeclass.
+        A badgeclass without a counters row yet is recounted instead.
+        :param changes: iterable of (counted state, delta), the counted state is a (badgeclass_id, award_type,
+        accepted) tuple as returned by BadgeInstance.counted_as()
+        """
+        deltas = defaultdict(Counter)
+        for (badgeclass_id, award_type, accepted), delta in changes:
+            issued_field, accepted_field = self.model.counter_fields(award_type)
+            deltas[badgeclass_id][issued_field] += delta
+            if accepted:
+                deltas[badgeclass_id][accepted_field] += delta
+        for badgeclass_id, fields in deltas.items():
+            fields = {field: F(field) + delta for field, delta in fields.items() if delta}
+            if fields and not self.filter(badgeclass_id=badgeclass_id).update(**fields):
+                self.recount([badgeclass_id])
+
+    def for_badgeclasses(self, badgeclasses):
+        """
+        :return: the counters of each of the badgeclasses in one query, zero counters for a badgeclass without a row
+        """
+        counts = self.in_bulk([badgeclass.pk for badgeclass in badgeclasses])
+        return [counts.get(badgeclass.pk) or self.model(badgeclass_id=badgeclass.pk) for badgeclass in badgeclasses]
+
+    def recount(self, badgeclass_ids=None):
+        """
+        (Re)creates the counters of the badgeclasses from their assertions, all badgeclasses when None
+        """
+        from issuer.models import BadgeClass, BadgeInstance
+
+        badgeclasses = BadgeClass.objects.all()
+        if badgeclass_ids is not None:
+            badgeclasses = badgeclasses.filter(pk__in=badgeclass_ids)
+        counts = []
+        for award_type, _ in BadgeInstance.AWARD_TYPE_CHOICES:
+            issued_field, accepted_field = self.model.counter_fields(award_type)
+            counts.append((issued_field, Count('badgeinstances', filter=Q(badgeinstances__award_type=award_type))))
+            counts.append((accepted_field, Count('badgeinstances', filter=Q(
+                badgeinstances__award_type=award_type,
+                badgeinstances__revoked=False,
+                badgeinstances__acceptance=BadgeInstance.ACCEPTANCE_ACCEPTED,
+            ))))
+        fields = [field for field, _ in counts]
+        rows = badgeclasses.annotate(**dict(counts)).values('pk', *fields)
+        # MySQL upserts on any unique key and refuses a conflict target, the others require one
+        conflict_target = {}
+        if connections[self.db].features.supports_update_conflicts_with_target:
+            conflict_target['unique_fields'] = ['badgeclass']
+        self.bulk_create(
+            [self.model(badgeclass_id=row.pop('pk'), **row) for row in rows],
+            batch_size=1000,
+            update_conflicts=True,
+            update_fields=fields,
+            **conflict_target,
+        )
+
+
 class BadgeInstanceEvidenceManager(models.Manager):
     @transaction.atomic
     def create_from_ob2(self, badgeinstance, evidence_obo):
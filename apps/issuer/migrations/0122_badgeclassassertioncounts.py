@@ -0,0 +1,48 @@
+# Generated by Django 5.2.13 on 2026-10-18 12:10
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def count_assertions(apps, schema_editor):
+    BadgeClass = apps.get_model('issuer', 'BadgeClass')
+    BadgeClassAssertionCounts = apps.get_model('issuer', 'BadgeClassAssertionCounts')
+    counts = {}
+    for award_type in ('requested', 'direct_award'):
+        counts['{}_count'.format(award_type)] = Count(
+            'badgeinstances', filter=Q(badgeinstances__award_type=award_type)
+        )
+        counts['{}_accepted_count'.format(award_type)] = Count(
+            'badgeinstances',
+            filter=Q(
+                badgeinstances__award_type=award_type,
+                badgeinstances__revoked=False,
+                badgeinstances__acceptance='Accepted',
+            ),
+        )
+    rows = BadgeClass.objects.annotate(**counts).values('pk', *counts)
+    BadgeClassAssertionCounts.objects.bulk_create(
+        [BadgeClassAssertionCounts(badgeclass_id=row.pop('pk'), **row) for row in rows], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issuer', '0121_data_migration_to_update_quality_assurance_text_and_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeClassAssertionCounts',
+            fields=[
+                ('badgeclass', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='assertion_counts', serialize=False, to='issuer.badgeclass')),
+                ('requested_count', models.IntegerField(default=0)),
+                ('direct_award_count', models.IntegerField(default=0)),
+                ('requested_accepted_count', models.IntegerField(default=0)),
+                ('direct_award_accepted_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_assertions, migrations.RunPython.noop),
+    ]
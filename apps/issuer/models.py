@@ -22,17 +22,27 @@ from django.utils import timezone
 from jsonfield import JSONField
 from rest_framework import serializers
 
-from cachemodel.decorators import cached_method
+from cachemodel.decorators import cached_method, cached_method_many
 from cachemodel.managers import CacheModelManager
 from cachemodel.models import CacheModel
+from cachemodel.utils import group_by_attribute
 from directaward.models import DirectAward, DirectAwardBundle
 from entity.models import BaseVersionedEntity, EntityUserProvisionmentMixin
-from issuer.managers import BadgeInstanceManager, IssuerManager, BadgeClassManager, BadgeInstanceEvidenceManager
+from issuer.managers import (
+    BadgeInstanceManager,
+    IssuerManager,
+    BadgeClassManager,
+    BadgeInstanceEvidenceManager,
+    BadgeClassAssertionCountsManager,
+)
 from mainsite.exceptions import BadgrValidationError, BadgrValidationFieldError, BadgrValidationMultipleFieldError
 from mainsite.mixins import ImageUrlGetterMixin, DefaultLanguageMixin
 from mainsite.models import BadgrApp, BaseAuditedModel, ArchiveMixin
+from mainsite.derivatives import ImageDerivativesMixin
+from mainsite.public_json import PublicJsonMixin
+from mainsite.snapshots import CatalogMixin
 from mainsite.utils import OriginSetting, generate_entity_uri, EmailMessageMaker, send_mail
-from mobile_api.push_notifications import send_push_notification
+from mobile_api.push_notifications import badge_received_payload, send_push_notifications
 from signing import tsob
 from signing.models import AssertionTimeStamp, PublicKeyIssuer
 from signing.models import PublicKey
@@ -125,6 +135,9 @@ class BaseOpenBadgeExtension(CacheModel):
 
 
 class Issuer(
+    CatalogMixin,
+    PublicJsonMixin,
+    ImageDerivativesMixin,
     EntityUserProvisionmentMixin,
     ArchiveMixin,
     PermissionedModelMixin,
@@ -136,6 +149,7 @@ class Issuer(
 ):
     entity_class_name = 'Issuer'
     DUTCH_NAME = 'issuer'
+    parent_field_name = 'faculty'
 
     staff = models.ManyToManyField('badgeuser.BadgeUser', through='staff.IssuerStaff')
     badgrapp = models.ForeignKey('mainsite.BadgrApp', on_delete=models.SET_NULL, blank=True, null=True, default=None)
@@ -143,6 +157,7 @@ class Issuer(
     name_dutch = models.CharField(max_length=512, null=True)  # or this one, must be supplied to pass save() method
     image_english = models.FileField(upload_to='uploads/issuers', blank=True, null=True)
     image_dutch = models.FileField(upload_to='uploads/issuers', blank=True, null=True)
+    derivative_image_fields = ('image_english', 'image_dutch')
     description_english = models.TextField(blank=True, null=True, default=None)
     description_dutch = models.TextField(blank=True, null=True, default=None)
     url_english = models.CharField(max_length=254, blank=True, null=True, default=None)
@@ -180,21 +195,24 @@ class Issuer(
         total_assertions_revoked = 0
         total_enrollments = 0
         unique_recipients = set()
-        for badgeclass in self.cached_badgeclasses():
-            for assertion in badgeclass.cached_assertions():
+        badgeclasses = self.cached_badgeclasses()
+        all_assertions = cached_method_many(badgeclasses, 'cached_assertions')
+        all_enrollments = cached_method_many(badgeclasses, 'cached_enrollments')
+        for badgeclass, assertions, enrollments in zip(badgeclasses, all_assertions, all_enrollments):
+            for assertion in assertions:
                 if badgeclass.formal:
                     total_assertions_formal += 1
                 else:
                     total_assertions_informal += 1
                 if assertion.revoked:
                     total_assertions_revoked += 1
-                unique_recipients.add(assertion.user)
-            total_enrollments += badgeclass.cached_enrollments().__len__()
+                unique_recipients.add(assertion.user_id)
+            total_enrollments += enrollments.__len__()
         return {
             'name': self.name,
             'type': self.__class__.__name__.capitalize(),
             'id': self.pk,
-            'total_badgeclasses': self.cached_badgeclasses().__len__(),
+            'total_badgeclasses': badgeclasses.__len__(),
             'total_enrollments': total_enrollments,
             'total_recipients': unique_recipients.__len__(),
             'total_assertions_formal': total_assertions_formal,
@@ -283,6 +301,11 @@ class Issuer(
     def cached_staff(self):
         return list(IssuerStaff.objects.filter(issuer=self))
 
+    @cached_staff.many
+    def cached_staff(issuers):
+        staff = IssuerStaff.objects.filter(issuer__in=issuers)
+        return group_by_attribute(staff, 'issuer_id', [issuer.pk for issuer in issuers])
+
     def create_staff_membership(self, user, permissions):
         return IssuerStaff.objects.create(user=user, issuer=self, **permissions)
 
@@ -297,14 +320,19 @@ class Issuer(
     def cached_badgeclasses(self):
         return list(self.badgeclasses.all())
 
-    @cached_method(auto_publish=True)
+    @cached_badgeclasses.many
+    def cached_badgeclasses(issuers):
+        badgeclasses = BadgeClass.objects.filter(issuer__in=issuers)
+        return group_by_attribute(badgeclasses, 'issuer_id', [issuer.pk for issuer in issuers])
+
+    @cached_method(auto_publish=True, compact=True)
     def cached_assertions(self):
         r = []
-        for bc in self.cached_badgeclasses():
-            r += bc.cached_assertions()
+        for assertions in cached_method_many(self.cached_badgeclasses(), 'cached_assertions'):
+            r += assertions
         return r
 
-    @cached_method(auto_publish=True)
+    @cached_method(auto_publish=True, compact=True)
     def cached_pending_enrollments(self):
         r = []
         for bc in self.cached_badgeclasses():
@@ -517,11 +545,20 @@ class Issuer(
         id = self.badgrapp_id if self.badgrapp_id else getattr(settings, 'BADGR_APP_ID', 1)
         return BadgrApp.cached.get(id=id)
 
+    def get_public_json_objects(self):
+        from institution.models import Faculty
+
+        faculty = Faculty.cached.get(pk=self.faculty_id)
+        return super(Issuer, self).get_public_json_objects() + faculty.get_public_json_objects()
+
     def __unicode__(self):
         return self.name
 
 
 class BadgeClass(
+    CatalogMixin,
+    PublicJsonMixin,
+    ImageDerivativesMixin,
     EntityUserProvisionmentMixin,
     ArchiveMixin,
     PermissionedModelMixin,
@@ -533,6 +570,7 @@ class BadgeClass(
 ):
     entity_class_name = 'BadgeClass'
     DUTCH_NAME = 'badge class'
+    parent_field_name = 'issuer'
     issuer = models.ForeignKey(Issuer, blank=False, null=False, on_delete=models.CASCADE, related_name='badgeclasses')
     name = models.CharField(max_length=255)
     image = models.FileField(upload_to='uploads/badges', blank=True, null=True)
@@ -600,7 +638,7 @@ class BadgeClass(
                 total_assertions_informal += 1
             if assertion.revoked:
                 total_assertions_revoked += 1
-            unique_recipients.add(assertion.user)
+            unique_recipients.add(assertion.user_id)
         return {
             'name': self.name,
             'type': self.__class__.__name__.capitalize(),
@@ -630,12 +668,22 @@ class BadgeClass(
 
     @cached_method(auto_publish=True)
     def cached_staff(self):
-        return BadgeClassStaff.objects.filter(badgeclass=self)
+        return list(BadgeClassStaff.objects.filter(badgeclass=self))
 
-    @cached_method(auto_publish=True)
+    @cached_staff.many
+    def cached_staff(badgeclasses):
+        staff = BadgeClassStaff.objects.filter(badgeclass__in=badgeclasses)
+        return group_by_attribute(staff, 'badgeclass_id', [badgeclass.pk for badgeclass in badgeclasses])
+
+    @cached_method(auto_publish=True, compact=True)
     def cached_assertions(self):
         return list(self.badgeinstances.all())
 
+    @cached_assertions.many
+    def cached_assertions(badgeclasses):
+        assertions = BadgeInstance.objects.filter(badgeclass__in=badgeclasses)
+        return group_by_attribute(assertions, 'badgeclass_id', [badgeclass.pk for badgeclass in badgeclasses])
+
     @cached_method(auto_publish=True)
     def cached_endorsements(self):
         return list(self.endorsements.all())
@@ -644,18 +692,28 @@ class BadgeClass(
     def cached_endorsed(self):
         return list(self.endorsed.all())
 
-    @cached_method(auto_publish=True)
+    @cached_method(auto_publish=True, compact=True)
     def cached_direct_awards(self):
-        return list(DirectAward.objects.filter(badgeclass=self))
+        return DirectAward.objects.filter(badgeclass=self)
 
-    @cached_method(auto_publish=True)
+    @cached_direct_awards.many
+    def cached_direct_awards(badgeclasses):
+        direct_awards = DirectAward.objects.filter(badgeclass__in=badgeclasses)
+        return group_by_attribute(direct_awards, 'badgeclass_id', [badgeclass.pk for badgeclass in badgeclasses])
+
+    @cached_method(auto_publish=True, compact=True)
     def cached_pending_direct_awards(self):
         return DirectAward.objects.filter(badgeclass=self, status=DirectAward.STATUS_UNACCEPTED)
 
-    @cached_method(auto_publish=True)
+    @cached_method(auto_publish=True, compact=True)
     def cached_direct_award_bundles(self):
         return list(DirectAwardBundle.objects.filter(badgeclass=self))
 
+    @cached_direct_award_bundles.many
+    def cached_direct_award_bundles(badgeclasses):
+        bundles = DirectAwardBundle.objects.filter(badgeclass__in=badgeclasses)
+        return group_by_attribute(bundles, 'badgeclass_id', [badgeclass.pk for badgeclass in badgeclasses])
+
     @property
     def assertions(self):
         """return all assertions this is used to check if an entity can be archived / deleted"""
@@ -663,7 +721,10 @@ class BadgeClass(
 
     def publish(self):
         super(BadgeClass, self).publish()
-        self.issuer.publish()
+        self.issuer.republish()
+
+    def get_public_json_objects(self):
+        return super(BadgeClass, self).get_public_json_objects() + self.cached_issuer.get_public_json_objects()
 
     def get_required_terms(self):
         """
@@ -740,39 +801,60 @@ class BadgeClass(
     def cached_issuer(self):
         return Issuer.cached.get(pk=self.issuer_id)
 
-    @cached_method(auto_publish=True)
+    @cached_method(auto_publish=True, compact=True)
     def cached_enrollments(self):
         from lti_edu.models import StudentsEnrolled
 
-        return StudentsEnrolled.objects.filter(badge_class=self)
+        return list(StudentsEnrolled.objects.filter(badge_class=self))
 
-    @cached_method(auto_publish=True)
+    @cached_enrollments.many
+    def cached_enrollments(badgeclasses):
+        from lti_edu.models import StudentsEnrolled
+
+        enrollments = StudentsEnrolled.objects.filter(badge_class__in=badgeclasses)
+        return group_by_attribute(enrollments, 'badge_class_id', [badgeclass.pk for badgeclass in badgeclasses])
+
+    @cached_method(auto_publish=True, compact=True)
     def cached_pending_enrollments_including_denied(self):
         from lti_edu.models import StudentsEnrolled
 
         return StudentsEnrolled.objects.filter(badge_class=self, badge_instance=None)
 
-    @cached_method(auto_publish=True)
+    @cached_pending_enrollments_including_denied.many
+    def cached_pending_enrollments_including_denied(badgeclasses):
+        from lti_edu.models import StudentsEnrolled
+
+        enrollments = StudentsEnrolled.objects.filter(badge_class__in=badgeclasses, badge_instance=None)
+        return group_by_attribute(enrollments, 'badge_class_id', [badgeclass.pk for badgeclass in badgeclasses])
+
+    @cached_method(auto_publish=True, compact=True)
     def cached_pending_enrollments(self):
         from lti_edu.models import StudentsEnrolled
 
         return StudentsEnrolled.objects.filter(badge_class=self, badge_instance=None, denied=False)
 
+    @cached_pending_enrollments.many
+    def cached_pending_enrollments(badgeclasses):
+        from lti_edu.models import StudentsEnrolled
+
+        enrollments = StudentsEnrolled.objects.filter(badge_class__in=badgeclasses, badge_instance=None, denied=False)
+        return group_by_attribute(enrollments, 'badge_class_id', [badgeclass.pk for badgeclass in badgeclasses])
+
+    def _assertion_counts(self):
+        # queried instead of the reverse relation, which would be published along with the badgeclass
+        return BadgeClassAssertionCounts.objects.filter(badgeclass_id=self.pk).first() or BadgeClassAssertionCounts()
+
     @property
     def assertions_count(self):
-        return BadgeInstance.objects.filter(badgeclass=self, revoked=False, acceptance='Accepted').count()
+        return self._assertion_counts().accepted_count
 
     @property
     def direct_awarded_assertions_count(self):
-        return BadgeInstance.objects.filter(
-            badgeclass=self, revoked=False, award_type='direct_award', acceptance='Accepted'
-        ).count()
+        return self._assertion_counts().direct_award_accepted_count
 
     @property
     def self_requested_assertions_count(self):
-        return BadgeInstance.objects.filter(
-            badgeclass=self, revoked=False, award_type='requested', acceptance='Accepted'
-        ).count()
+        return self._assertion_counts().requested_accepted_count
 
     @cached_method(auto_publish=True)
     def cached_alignments(self):
@@ -878,17 +960,7 @@ class BadgeClass(
             )
 
             user = BadgeUser.objects.filter(email=recipient.email).first()
-            send_push_notification(
-                user=user,
-                title="Edubadge received",
-                body="You earned an edubadge, claim it now!",
-                data={
-                    "title_key": "push.badge_received_title",
-                    "body_key": "push.badge_received_body",
-                    "badge": self.name,
-                },
-                badge_count=user.direct_awards.count(),
-            )
+            send_push_notifications([(user, badge_received_payload(self.name))])
 
         return assertion
 
@@ -1014,7 +1086,13 @@ class BadgeClass(
         return False
 
 
-class BadgeInstance(BaseAuditedModel, ImageUrlGetterMixin, BaseVersionedEntity, BaseOpenBadgeObjectModel):
+class BadgeInstance(
+    PublicJsonMixin,
+    BaseAuditedModel,
+    ImageUrlGetterMixin,
+    BaseVersionedEntity,
+    BaseOpenBadgeObjectModel,
+):
     entity_class_name = 'Assertion'
 
     issued_on = models.DateTimeField(blank=False, null=False, default=timezone.now)
@@ -1198,24 +1276,58 @@ class BadgeInstance(BaseAuditedModel, ImageUrlGetterMixin, BaseVersionedEntity,
         if self.revoked is False:
             self.revocation_reason = None
 
-        super(BadgeInstance, self).save(*args, **kwargs)
-        self.badgeclass.remove_cached_data(['cached_assertions'])
-        self.user.remove_cached_data(['cached_badgeinstances'])
+        adding = self._state.adding
+        previous = None if adding else getattr(self, '_counted_as', None)
+        with transaction.atomic():
+            super(BadgeInstance, self).save(*args, **kwargs)
+            counted_as = self.counted_as()
+            if not adding and previous is None:
+                # loaded without the counted fields, what changed is unknown
+                BadgeClassAssertionCounts.objects.recount([self.badgeclass_id])
+            elif previous != counted_as:
+                BadgeClassAssertionCounts.objects.adjust(
+                    ([(previous, -1)] if previous else []) + [(counted_as, 1)]
+                )
+        self._counted_as = counted_as
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(BadgeInstance, cls).from_db(db, field_names, values)
+        if all(field in instance.__dict__ for field in ('badgeclass_id', 'award_type', 'revoked', 'acceptance')):
+            instance._counted_as = instance.counted_as()
+        return instance
+
+    def counted_as(self):
+        """
+        :return: the state of this assertion for the BadgeClassAssertionCounts: (badgeclass_id, award_type, accepted)
+        """
+        accepted = not self.revoked and self.acceptance == BadgeInstance.ACCEPTANCE_ACCEPTED
+        return self.badgeclass_id, self.award_type, accepted
+
+    def get_dependent_cache_tags(self):
+        tags = super(BadgeInstance, self).get_dependent_cache_tags()
+        tags += self.badgeclass.get_dependent_cache_tags()
+        if self.user_id:
+            tags.append(self.user.cache_tag)
+        return tags
+
+    def get_public_json_objects(self):
+        return super(BadgeInstance, self).get_public_json_objects() + self.cached_badgeclass.get_public_json_objects()
 
     def publish(self):
         super(BadgeInstance, self).publish()
-        self.badgeclass.publish()
+        self.badgeclass.republish()
         if self.user:
-            self.user.publish()
+            self.user.republish()
 
         self.publish_by('entity_id', 'revoked')
 
     def delete(self, *args, **kwargs):
         badgeclass = self.badgeclass
         super(BadgeInstance, self).delete(*args, **kwargs)
-        badgeclass.publish()
+        badgeclass.republish()
         if self.user:
-            self.user.publish()
+            self.user.republish()
         self.publish_delete('entity_id', 'revoked')
 
     def revoke(self, revocation_reason, user):
@@ -1436,6 +1548,41 @@ class BadgeInstance(BaseAuditedModel, ImageUrlGetterMixin, BaseVersionedEntity,
         return self.cached_issuer.cached_badgrapp
 
 
+class BadgeClassAssertionCounts(models.Model):
+    """
+    The number of assertions of a badgeclass per award type, kept up to date when assertions are issued, accepted,
+    revoked or deleted, so listings of badgeclasses don't count the assertions of every badgeclass.
+    The issued counts include revoked and unaccepted assertions, the accepted counts only the valid accepted ones.
+    """
+    badgeclass = models.OneToOneField(
+        BadgeClass, primary_key=True, on_delete=models.CASCADE, related_name='assertion_counts'
+    )
+    requested_count = models.IntegerField(default=0)
+    direct_award_count = models.IntegerField(default=0)
+    requested_accepted_count = models.IntegerField(default=0)
+    direct_award_accepted_count = models.IntegerField(default=0)
+
+    objects = BadgeClassAssertionCountsManager()
+
+    @property
+    def accepted_count(self):
+        return self.requested_accepted_count + self.direct_award_accepted_count
+
+    @staticmethod
+    def counter_fields(award_type):
+        """:return: the names of the issued and the accepted counter of an award type"""
+        return '{}_count'.format(award_type), '{}_accepted_count'.format(award_type)
+
+
+def uncount_deleted_assertion(sender, instance, **kwargs):
+    counted_as = getattr(instance, '_counted_as', None) or instance.counted_as()
+    BadgeClassAssertionCounts.objects.adjust([(counted_as, -1)])
+
+
+# a signal instead of BadgeInstance.delete(), to count the assertions deleted along with their user as well
+models.signals.post_delete.connect(uncount_deleted_assertion, sender=BadgeInstance)
+
+
 class BadgeInstanceEvidence(OriginalJsonMixin, CacheModel):
     badgeinstance = models.ForeignKey('issuer.BadgeInstance', on_delete=models.CASCADE)
     evidence_url = models.CharField(max_length=2083, blank=True, null=True, default=None)
@@ -1445,9 +1592,13 @@ class BadgeInstanceEvidence(OriginalJsonMixin, CacheModel):
 
     objects = BadgeInstanceEvidenceManager()
 
+    def get_changed_cache_tags(self):
+        tags = super(BadgeInstanceEvidence, self).get_changed_cache_tags()
+        return tags + [BadgeInstance.public_json_tag_for(self.badgeinstance_id)]
+
     def publish(self):
         super(BadgeInstanceEvidence, self).publish()
-        self.badgeinstance.publish()
+        self.badgeinstance.republish()
 
     def get_json(self, obi_version=CURRENT_OBI_VERSION, include_context=False):
         json = OrderedDict()
@@ -1475,13 +1626,17 @@ class BadgeClassAlignment(OriginalJsonMixin, CacheModel):
     target_framework = models.TextField(blank=True, null=True, default=None)
     target_code = models.TextField(blank=True, null=True, default=None)
 
+    def get_changed_cache_tags(self):
+        tags = super(BadgeClassAlignment, self).get_changed_cache_tags()
+        return tags + [BadgeClass.public_json_tag_for(self.badgeclass_id)]
+
     def publish(self):
         super(BadgeClassAlignment, self).publish()
-        self.badgeclass.publish()
+        self.badgeclass.republish()
 
     def delete(self, *args, **kwargs):
         super(BadgeClassAlignment, self).delete(*args, **kwargs)
-        self.badgeclass.publish()
+        self.badgeclass.republish()
 
     def get_json(self, obi_version=CURRENT_OBI_VERSION, include_context=False):
         json = OrderedDict()
@@ -1504,37 +1659,49 @@ class BadgeClassAlignment(OriginalJsonMixin, CacheModel):
 class IssuerExtension(BaseOpenBadgeExtension):
     issuer = models.ForeignKey('issuer.Issuer', on_delete=models.CASCADE)
 
+    def get_changed_cache_tags(self):
+        tags = super(IssuerExtension, self).get_changed_cache_tags()
+        return tags + [Issuer.public_json_tag_for(self.issuer_id)]
+
     def publish(self):
         super(IssuerExtension, self).publish()
-        self.issuer.publish()
+        self.issuer.republish()
 
     def delete(self, *args, **kwargs):
         super(IssuerExtension, self).delete(*args, **kwargs)
-        self.issuer.publish()
+        self.issuer.republish()
 
 
 class BadgeClassExtension(BaseOpenBadgeExtension):
     badgeclass = models.ForeignKey('issuer.BadgeClass', on_delete=models.CASCADE)
 
+    def get_changed_cache_tags(self):
+        tags = super(BadgeClassExtension, self).get_changed_cache_tags()
+        return tags + [BadgeClass.public_json_tag_for(self.badgeclass_id)]
+
     def publish(self):
         super(BadgeClassExtension, self).publish()
-        self.badgeclass.publish()
+        self.badgeclass.republish()
 
     def delete(self, *args, **kwargs):
         super(BadgeClassExtension, self).delete(*args, **kwargs)
-        self.badgeclass.publish()
+        self.badgeclass.republish()
 
 
 class BadgeInstanceExtension(BaseOpenBadgeExtension):
     badgeinstance = models.ForeignKey('issuer.BadgeInstance', on_delete=models.CASCADE)
 
+    def get_changed_cache_tags(self):
+        tags = super(BadgeInstanceExtension, self).get_changed_cache_tags()
+        return tags + [BadgeInstance.public_json_tag_for(self.badgeinstance_id)]
+
     def publish(self):
         super(BadgeInstanceExtension, self).publish()
-        self.badgeinstance.publish()
+        self.badgeinstance.republish()
 
     def delete(self, *args, **kwargs):
         super(BadgeInstanceExtension, self).delete(*args, **kwargs)
-        self.badgeinstance.publish()
+        self.badgeinstance.republish()
 
 
 class BadgeInstanceCollection(BaseAuditedModel, BaseVersionedEntity, CacheModel):
@@ -5,22 +5,24 @@ from django.conf import settings
 from graphene.relay import ConnectionField
 from graphene_django.types import DjangoObjectType, Connection
 
+from cachemodel.decorators import cached_method_many
 from directaward.schema import DirectAwardType, DirectAwardBundleType
 from endorsement.schema import EndorsementType
 from lti_edu.schema import StudentsEnrolledType
 from mainsite.graphql_utils import JSONType, UserProvisionmentResolverMixin, ContentTypeIdResolverMixin, \
     StaffResolverMixin, ImageResolverMixin, PermissionsResolverMixin, resolver_blocker_for_students, \
     DefaultLanguageResolverMixin, resolver_blocker_only_for_current_user
+from mainsite.graphql_loaders import load, load_cached, load_related
 from mainsite.utils import generate_image_url
 from staff.schema import IssuerStaffType, BadgeClassStaffType
 from .models import Issuer, BadgeClass, BadgeInstance, BadgeClassExtension, IssuerExtension, BadgeInstanceExtension, \
-    BadgeClassAlignment, BadgeInstanceEvidence, BadgeInstanceCollection
+    BadgeClassAlignment, BadgeInstanceEvidence, BadgeInstanceCollection, BadgeClassAssertionCounts
 
 
 class ExtensionResolverMixin(object):
 
     def resolve_extensions(self, info):
-        return self.cached_extensions()
+        return load_cached(info, self, 'cached_extensions')
 
 
 class ExtensionTypeMetaMixin(object):
@@ -112,29 +114,43 @@ class IssuerType(ContentTypeIdResolverMixin, PermissionsResolverMixin, StaffReso
     def resolve_description(self, info):
         return self.description
 
+    def resolve_faculty(self, info):
+        return load_related(info, self, 'faculty')
+
     def resolve_assertion_count(self, info):
-        return self.cached_assertions().__len__()
+        return load_cached(info, self, 'cached_assertions').__len__()
 
     def resolve_badgeclasses(self, info):
-        return self.get_badgeclasses(info.context.user, ['may_read'])
+        return readable_badgeclasses(info, self)
 
     def resolve_badgeclass_count(self, info):
-        return self.get_badgeclasses(info.context.user, ['may_read']).__len__()
+        return readable_badgeclasses(info, self).__len__()
 
     def resolve_public_badgeclasses(self, info):
-        return [bc for bc in self.cached_badgeclasses() if not bc.is_private]
+        return [bc for bc in load_cached(info, self, 'cached_badgeclasses') if not bc.is_private]
 
     def resolve_badgeclasses_count(self, info):
         return self.badgeclasses_count
 
     def resolve_pending_enrollment_count(self, info):
-        return self.cached_pending_enrollments().__len__()
+        return load_cached(info, self, 'cached_pending_enrollments').__len__()
 
     def resolve_has_unrevoked_assertions(self, info):
-        return any([assertion.revoked is False for assertion in self.assertions])
+        return any([assertion.revoked is False for assertion in load_cached(info, self, 'cached_assertions')])
 
     def resolve_has_assertions(self, info):
-        return bool(self.assertions)
+        return bool(load_cached(info, self, 'cached_assertions'))
+
+
+def readable_badgeclasses(info, issuer):
+    """Issuer.get_badgeclasses() with the badgeclasses of the sibling issuers loaded in one batch"""
+    user = info.context.user
+    return [bc for bc in load_cached(info, issuer, 'cached_badgeclasses') if bc.has_permissions(user, ['may_read'])]
+
+
+def assertion_counts(info, badgeclass):
+    """The BadgeClassAssertionCounts of a badgeclass, loaded in one query for the sibling badgeclasses"""
+    return load(info, badgeclass, 'assertion_counts', BadgeClassAssertionCounts.objects.for_badgeclasses)
 
 
 def badge_user_type():
@@ -165,7 +181,7 @@ class BadgeInstanceType(ImageResolverMixin, ExtensionResolverMixin, DjangoObject
         return self.validate()
 
     def resolve_evidences(self, info, **kwargs):
-        return self.cached_evidence()
+        return load_cached(info, self, 'cached_evidence')
 
 
 class BadgeInstanceCollectionType(DjangoObjectType, ):
@@ -236,68 +252,71 @@ class BadgeClassType(ContentTypeIdResolverMixin, PermissionsResolverMixin, Staff
     endorsements = graphene.List(EndorsementType)
     endorsed = graphene.List(EndorsementType)
 
+    def resolve_issuer(self, info, **kwargs):
+        return load_related(info, self, 'issuer')
+
     def resolve_terms(self, info, **kwargs):
         return self._get_terms()
 
     def resolve_tags(self, info, **kwargs):
-        return self.cached_tags()
+        return load_cached(info, self, 'cached_tags')
 
     def resolve_alignments(self, info, **kwargs):
-        return self.cached_alignments()
+        return load_cached(info, self, 'cached_alignments')
 
     def resolve_endorsements(self, info, **kwargs):
-        return self.cached_endorsements()
+        return load_cached(info, self, 'cached_endorsements')
 
     def resolve_endorsed(self, info, **kwargs):
-        return self.cached_endorsed()
+        return load_cached(info, self, 'cached_endorsed')
 
     @resolver_blocker_for_students
     def resolve_direct_awards(self, info, **kwargs):
-        return self.cached_direct_awards()
+        return load_cached(info, self, 'cached_direct_awards')
 
     @resolver_blocker_for_students
     def resolve_direct_award_bundles(self, info, **kwargs):
-        return self.cached_direct_award_bundles()
+        return load_cached(info, self, 'cached_direct_award_bundles')
 
     @resolver_blocker_for_students
     def resolve_enrollments(self, info, **kwargs):
-        return self.cached_enrollments()
+        return load_cached(info, self, 'cached_enrollments')
 
     @resolver_blocker_for_students
     def resolve_pending_enrollments(self, info, **kwargs):
-        return self.cached_pending_enrollments()
+        return load_cached(info, self, 'cached_pending_enrollments')
 
     def resolve_pending_enrollments_including_denied(self, info, **kwargs):
-        return self.cached_pending_enrollments_including_denied()
+        return load_cached(info, self, 'cached_pending_enrollments_including_denied')
 
     @resolver_blocker_for_students
     def resolve_pending_enrollment_count(self, info, **kwargs):
-        return self.cached_pending_enrollments().__len__()
+        return load_cached(info, self, 'cached_pending_enrollments').__len__()
 
     @resolver_blocker_for_students
     def resolve_badge_assertions(self, info, **kwargs):
-        return self.assertions
+        return load_cached(info, self, 'cached_assertions')
 
     @resolver_blocker_for_students
     def resolve_assertions_paginated(self, info, **kwargs):
-        return self.assertions
+        return load_cached(info, self, 'cached_assertions')
 
     @resolver_blocker_for_students
     def resolve_assertion_count(self, info, **kwargs):
-        return self.assertions.__len__()
+        return load_cached(info, self, 'cached_assertions').__len__()
 
     def resolve_expiration_period(self, info, **kwargs):
         if self.expiration_period:
             return self.expiration_period.days
 
     def resolve_assertions_count(self, info):
-        return self.assertions_count
+        return assertion_counts(info, self).accepted_count
 
     def resolve_self_requested_assertions_count(self, info):
-        return self.self_requested_assertions_count
+        return assertion_counts(info, self).requested_accepted_count
 
     def resolve_direct_awarded_assertions_count(self, info):
-        return self.direct_awarded_assertions_count
+        return assertion_counts(info, self).direct_award_accepted_count
 
     def resolve_award_allowed_institutions(self, info):
         return [institution.identifier for institution in self.award_allowed_institutions.all()]
@@ -324,7 +343,7 @@ class Query(object):
     badge_classes_count = graphene.Int()
 
     def resolve_issuers(self, info, **kwargs):
-        return [issuer for issuer in Issuer.objects.all() if issuer.has_permissions(info.context.user, ['may_read'])]
+        return Issuer.permitted(info.context.user, ['may_read'])
 
     def resolve_issuer(self, info, **kwargs):
         id = kwargs.get('id')
@@ -340,26 +359,26 @@ class Query(object):
             return issuer
 
     def resolve_badge_classes(self, info, **kwargs):
-        return [bc for bc in BadgeClass.objects.all()
-                if bc.has_permissions(info.context.user, ['may_read'])]
+        return BadgeClass.permitted(info.context.user, ['may_read'])
 
     def resolve_badge_classes_to_award(self, info, **kwargs):
         user = info.context.user
-        badge_classes = [bc for bc in
-                         BadgeClass.objects.filter(archived=False).filter(issuer__faculty__institution=user.institution)
-                         if
-                         bc.has_permissions(info.context.user,
-                                            ['may_award']) and bc.cached_pending_enrollments().__len__() > 0]
-        return badge_classes
+        badge_classes = BadgeClass.permitted(
+            user,
+            ['may_award'],
+            BadgeClass.objects.filter(archived=False, issuer__faculty__institution=user.institution),
+        )
+        badge_classes = list(badge_classes)
+        pending = cached_method_many(badge_classes, 'cached_pending_enrollments')
+        return [bc for bc, enrollments in zip(badge_classes, pending) if enrollments.__len__() > 0]
 
     def resolve_enrollments_to_award(self, info, **kwargs):
         user = info.context.user
         from lti_edu.models import StudentsEnrolled
-        enrollments = [se for se in
-                       StudentsEnrolled.objects.filter(badge_class__issuer__faculty__institution=user.institution)
-                       .filter(badge_instance=None, denied=False) if
-                       se.badge_class.has_permissions(user, ['may_award'])]
-        return enrollments
+        badge_classes = BadgeClass.permitted(
+            user, ['may_award'], BadgeClass.objects.filter(issuer__faculty__institution=user.institution)
+        )
+        return StudentsEnrolled.objects.filter(badge_class__in=badge_classes, badge_instance=None, denied=False)
 
     def resolve_public_badge_classes(self, info, **kwargs):
         return [bc for bc in BadgeClass.objects.filter(is_private=False)]
@@ -17,6 +17,7 @@ from rest_framework.exceptions import ErrorDetail, ValidationError
 from rest_framework.serializers import PrimaryKeyRelatedField
 
 from badgeuser.serializers import BadgeUserIdentifierField
+from directaward.models import DirectAward
 from institution.models import Institution, BadgeClassTag
 from institution.serializers import FacultySlugRelatedField
 from lti_edu.models import StudentsEnrolled
@@ -404,8 +405,8 @@ class BadgeClassSerializer(
         instance.tags.set(validated_data.get('tags', []))
         badge_class = BadgeClass.objects.get(id=instance.id)
         if badge_class.issuer.id != validated_data['issuer'].id:
-            badge_class.issuer.faculty.remove_cached_data(['cached_badgeclasses'])
-            badge_class.issuer.remove_cached_data(['cached_badgeclasses'])
+            # saving invalidates the collections of the new issuer, these are the ones of the old issuer
+            badge_class.issuer.invalidate_cached_data()
         instance.save()
         return instance
 
@@ -566,8 +567,6 @@ class BadgeInstanceSerializer(OriginalJsonSerializerMixin, serializers.Serialize
         """
         badgeclass = self.context['request'].data.get('badgeclass')
         enrollment = StudentsEnrolled.objects.get(entity_id=validated_data.get('enrollment_entity_id'))
-        da = badgeclass.cached_pending_direct_awards().filter(eppn__in=enrollment.user.eppns)
-
         expires_at = None
         if badgeclass.expiration_period:
             expires_at = (
@@ -609,9 +608,11 @@ class BadgeInstanceSerializer(OriginalJsonSerializerMixin, serializers.Serialize
         enrollment.deny_reason = None
         enrollment.denied = False
         enrollment.save()
-        enrollment.user.remove_cached_data(['cached_pending_enrollments'])
         # delete the pending direct awards for this badgeclass and this user
-        badgeclass.cached_pending_direct_awards().filter(eppn__in=enrollment.user.eppns).delete()
+        DirectAward.objects.filter(
+            badgeclass=badgeclass, status=DirectAward.STATUS_UNACCEPTED, eppn__in=enrollment.user.eppns
+        ).delete()
+        badgeclass.invalidate_cached_data()
         return assertion
 
 
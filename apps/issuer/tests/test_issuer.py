@@ -1,13 +1,20 @@
 import copy
 import json
 import os
+from unittest.mock import patch
 
+from cachemodel import local
+from cachemodel.compact import CompactList
+from cachemodel.decorators import cached_method_many, scan_fields_decorated_with
+from cachemodel.lease import acquire_lease, lease_key
+from cachemodel.utils import generate_cache_key
 from directaward.models import DirectAward
+from django.core.cache import cache
 from django.db import IntegrityError
 from django.db.models import ProtectedError
 from django.urls import reverse
 from institution.models import Institution
-from issuer.models import Issuer, BadgeClass
+from issuer.models import Issuer, BadgeClass, BadgeClassAssertionCounts, BadgeInstance
 from issuer.testfiles.helper import badgeclass_json, issuer_json
 from lti_edu.models import StudentsEnrolled
 from mainsite.exceptions import BadgrValidationFieldError, BadgrValidationMultipleFieldError, BadgrValidationError
@@ -272,7 +279,7 @@ class IssuerAPITest(BadgrTestCase):
             json.dumps(award_body),
             content_type='application/json',
         )
-        assertion = student.cached_badgeinstances().first()
+        assertion = student.cached_badgeinstances()[0]
         evidence = assertion.cached_evidence().first()  # test cache update
         self.assertEqual(evidence.evidence_url, 'https://www.valid.com')
         self.assertEqual(evidence.narrative, 'Some evidence narrative')
@@ -347,6 +354,42 @@ class IssuerPublicAPITest(BadgrTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['validated_name'], assertion.get_validated_name())
 
+    def test_public_assertion_json_cached_until_its_chain_changes(self):
+        teacher1 = self.setup_teacher()
+        student = self.setup_student()
+        issuer = self.setup_issuer(teacher1)
+        badgeclass = self.setup_badgeclass(issuer)
+        assertion = self.setup_assertion(student, badgeclass, teacher1)
+        assertion.public = True
+        assertion.save()
+        self.client.logout()
+        url = reverse('badgeinstance_json', kwargs={'entity_id': assertion.entity_id})
+        expand = {'expand': ['badge', 'badge.issuer']}
+
+        response = self.client.get(url, expand)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(url, expand, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # other assertions of the badgeclass do not invalidate the document
+        self.setup_assertion(self.setup_student(), badgeclass, teacher1)
+        with patch.object(BadgeInstance, 'get_json') as get_json:
+            response = self.client.get(url, expand, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        get_json.assert_not_called()
+
+        issuer.name_english = 'Renamed issuer'
+        issuer.save()
+        response = self.client.get(url, expand, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['badge']['issuer']['name_english'], 'Renamed issuer')
+
+        assertion.revoke('Revoked for the test', teacher1)
+        response = self.client.get(url, expand)
+        self.assertTrue(response.data['revoked'])
+
 
 # class IssuerExtensionsTest(BadgrTestCase):
 #
@@ -463,6 +506,140 @@ class IssuerModelsTest(BadgrTestCase):
         self.assertEqual(issuer.cached_badgeclasses().__len__(), 1)
         self.assertEqual(teacher1.institution.cached_faculties().__len__(), 1)
 
+    def test_cache_tags_invalidate_ancestors(self):
+        """a change in a badgeclass invalidates the cached collections of the whole branch above it"""
+        teacher1 = self.setup_teacher()
+        student = self.setup_student(affiliated_institutions=[teacher1.institution])
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(faculty=faculty, created_by=teacher1)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        institution = teacher1.institution
+        self.assertEqual(institution.cached_badgeclasses(), [badgeclass])
+        self.assertEqual(issuer.cached_assertions(), [])
+        other_badgeclass = self.setup_badgeclass(issuer=issuer)
+        assertion = self.setup_assertion(student, badgeclass, teacher1)
+        self.assertEqual(len(institution.cached_badgeclasses()), 2)
+        self.assertIn(other_badgeclass, institution.cached_badgeclasses())
+        self.assertEqual(issuer.cached_assertions(), [assertion])
+        self.assertEqual(list(student.cached_badgeinstances()), [assertion])
+
+    def test_compact_cached_method_stores_primary_keys(self):
+        teacher1 = self.setup_teacher()
+        student = self.setup_student(affiliated_institutions=[teacher1.institution])
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(faculty=faculty, created_by=teacher1)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        assertion = self.setup_assertion(student, badgeclass, teacher1)
+        self.assertEqual(badgeclass.cached_assertions(), [assertion])
+        key = generate_cache_key([BadgeClass.__name__, 'cached_assertions', badgeclass.pk])
+        entry = cache.get(key)
+        self.assertEqual(entry.data, CompactList('issuer.badgeinstance', [assertion.pk]))
+        self.assertEqual(badgeclass.cached_assertions(), [assertion])  # hydrated from the payload
+        assertion.narrative = 'changed narrative'
+        assertion.save()
+        self.assertEqual(badgeclass.cached_assertions()[0].narrative, 'changed narrative')
+
+    def test_cached_method_many_batches_lookups(self):
+        teacher1 = self.setup_teacher()
+        student = self.setup_student(affiliated_institutions=[teacher1.institution])
+        issuer = self.setup_issuer(created_by=teacher1)
+        badgeclasses = [self.setup_badgeclass(issuer=issuer) for _ in range(3)]
+        assertions = [self.setup_assertion(student, badgeclass, teacher1) for badgeclass in badgeclasses]
+        self.assertEqual(badgeclasses[0].cached_assertions(), assertions[:1])
+        for badgeclass in badgeclasses[1:]:
+            cache.delete(generate_cache_key([BadgeClass.__name__, 'cached_assertions', badgeclass.pk]))
+        # one hit, two misses
+        with patch('cachemodel.tags.cache', wraps=cache) as memcached:
+            # one query for the two misses with the bulk loader
+            with self.assertNumQueries(1):
+                results = cached_method_many(badgeclasses, 'cached_assertions')
+            memcached.get_many.assert_called_once()
+            memcached.set_many.assert_called_once()
+        self.assertEqual(results, [[assertion] for assertion in assertions])
+        with patch('cachemodel.tags.cache', wraps=cache) as memcached:
+            with self.assertNumQueries(0):
+                self.assertEqual(cached_method_many(badgeclasses, 'cached_assertions'), results)
+            memcached.get_many.assert_called_once()
+
+    def test_cached_method_many_acquires_leases_in_bulk(self):
+        teacher1 = self.setup_teacher()
+        issuer = self.setup_issuer(created_by=teacher1)
+        badgeclasses = [self.setup_badgeclass(issuer=issuer) for _ in range(3)]
+        for badgeclass in badgeclasses:
+            cache.delete(generate_cache_key([BadgeClass.__name__, 'cached_staff', badgeclass.pk]))
+        # another worker is recomputing the first one
+        other_key = generate_cache_key([BadgeClass.__name__, 'cached_staff', badgeclasses[0].pk])
+        self.assertIsNotNone(acquire_lease(other_key))
+        with patch('cachemodel.lease.cache', wraps=cache) as memcached:
+            cached_method_many(badgeclasses, 'cached_staff')
+        # one get_many skips the held lease, the free ones are taken with an atomic add each
+        memcached.get_many.assert_called_once()
+        self.assertEqual(memcached.add.call_count, 2)
+        memcached.set_many.assert_not_called()
+        memcached.delete_many.assert_called_once()
+        self.assertEqual(len(memcached.delete_many.call_args[0][0]), 2)
+        memcached.get.assert_not_called()
+        # the lease of the other worker is left alone
+        self.assertIsNotNone(cache.get(lease_key(other_key)))
+        cache.delete(lease_key(other_key))
+
+    def test_stale_entry_served_while_other_worker_holds_lease(self):
+        teacher1 = self.setup_teacher()
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(faculty=faculty, created_by=teacher1)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        self.assertEqual(issuer.cached_badgeclasses(), [badgeclass])
+        other_badgeclass = self.setup_badgeclass(issuer=issuer)
+        key = generate_cache_key([Issuer.__name__, 'cached_badgeclasses', issuer.pk])
+        self.assertIsNotNone(acquire_lease(key))  # another worker is recomputing
+        local.activate()
+        try:
+            self.assertEqual(issuer.cached_badgeclasses(), [badgeclass])
+        finally:
+            local.deactivate()
+        cache.delete(lease_key(key))
+        self.assertEqual(len(issuer.cached_badgeclasses()), 2)
+        self.assertIn(other_badgeclass, issuer.cached_badgeclasses())
+
+    def test_local_cache_serves_copies_within_a_request(self):
+        teacher1 = self.setup_teacher()
+        issuer = self.setup_issuer(created_by=teacher1)
+        Issuer.cached.get(pk=issuer.pk)  # published in memcached
+        local.activate()
+        try:
+            first = Issuer.cached.get(pk=issuer.pk)
+            with patch('cachemodel.managers.cache') as memcached:
+                second = Issuer.cached.get(pk=issuer.pk)
+            memcached.get.assert_not_called()
+            self.assertEqual(second, issuer)
+            self.assertIsNot(second, first)
+            # a change that is never saved does not leak into the other lookups of the request
+            first.name_english = 'changed before a failed save'
+            self.assertNotEqual(Issuer.cached.get(pk=issuer.pk).name_english, first.name_english)
+        finally:
+            local.deactivate()
+
+    def test_decorated_methods_registered_when_class_prepared(self):
+        registry = BadgeClass.__dict__['_cachemodel_registry']
+        self.assertIn(BadgeClass.cached_assertions, registry['_cached_method'])
+        self.assertEqual(registry['_cached_method'], scan_fields_decorated_with(BadgeClass, '_cached_method'))
+        self.assertIsNot(Issuer.__dict__['_cachemodel_registry'], registry)
+
+    def test_publishes_coalesced_until_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            teacher1 = self.setup_teacher()
+            faculty = self.setup_faculty(institution=teacher1.institution)
+            issuer = self.setup_issuer(faculty=faculty, created_by=teacher1)
+            badgeclass = self.setup_badgeclass(issuer=issuer)
+            students = [self.setup_student(affiliated_institutions=[teacher1.institution]) for _ in range(3)]
+        with patch.object(BadgeClass, 'publish_methods') as publish_methods:
+            with self.captureOnCommitCallbacks(execute=True):
+                for student in students:
+                    self.setup_assertion(student, badgeclass, teacher1)
+                publish_methods.assert_not_called()
+            publish_methods.assert_called_once_with()
+        self.assertEqual(len(badgeclass.cached_assertions()), 3)
+
     def test_badgeinstance_get_json(self):
         teacher1 = self.setup_teacher()
         student = self.setup_student(affiliated_institutions=[teacher1.institution])
@@ -604,6 +781,43 @@ class IssuerModelsTest(BadgrTestCase):
         badgeclass, student = self._create_badge_and_student(self_enrollment_disabled=False, formal=False, same_institution=False, schac_home_match_in_allowed_institutions=True)
         self.assertTrue(badgeclass.user_may_enroll(student))
 
+    def test_assertion_counts_follow_assertions(self):
+        teacher1 = self.setup_teacher(authenticate=False)
+        issuer = self.setup_issuer(created_by=teacher1)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        student = self.setup_student(affiliated_institutions=[teacher1.institution])
+        assertion = self.setup_assertion(student, badgeclass, teacher1, send_email=False)
+        self.setup_assertion(
+            student, badgeclass, teacher1, send_email=False, award_type='direct_award', acceptance='Accepted'
+        )
+        counts = BadgeClassAssertionCounts.objects.get(badgeclass=badgeclass)
+        self.assertEqual((counts.requested_count, counts.requested_accepted_count), (1, 0))
+        self.assertEqual((counts.direct_award_count, counts.direct_award_accepted_count), (1, 1))
+
+        assertion = BadgeInstance.objects.get(pk=assertion.pk)
+        assertion.acceptance = 'Accepted'
+        assertion.save()
+        self.assertEqual(badgeclass.self_requested_assertions_count, 1)
+        self.assertEqual(badgeclass.assertions_count, 2)
+
+        assertion.revoked = True
+        assertion.save()
+        self.assertEqual(badgeclass.self_requested_assertions_count, 0)
+        self.assertEqual(badgeclass.direct_awarded_assertions_count, 1)
+
+        BadgeInstance.objects.get(pk=assertion.pk).delete()
+        counts.refresh_from_db()
+        self.assertEqual((counts.requested_count, counts.requested_accepted_count), (0, 0))
+        self.assertEqual((counts.direct_award_count, counts.direct_award_accepted_count), (1, 1))
+
+        # the maintained counters agree with counting the assertions
+        BadgeClassAssertionCounts.objects.recount([badgeclass.pk])
+        recounted = BadgeClassAssertionCounts.objects.get(badgeclass=badgeclass)
+        self.assertEqual(
+            (recounted.requested_count, recounted.direct_award_count, recounted.direct_award_accepted_count),
+            (counts.requested_count, counts.direct_award_count, counts.direct_award_accepted_count),
+        )
+
 
 class IssuerSchemaTest(BadgrTestCase):
     def test_issuer_schema(self):
@@ -1,5 +1,4 @@
-import threading
-
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema, inline_serializer, OpenApiExample
@@ -11,10 +10,10 @@ from entity.api import BaseEntityListView, BaseEntityDetailView
 from issuer.models import BadgeClass
 from lti_edu.models import StudentsEnrolled
 from lti_edu.serializers import StudentsEnrolledSerializerWithRelations
+from lti_edu.tasks import send_enrollment_notifications
 from mainsite.exceptions import BadgrApiException400, BadgrValidationError
 from mainsite.permissions import AuthenticatedWithVerifiedEmail
-from mainsite.utils import EmailMessageMaker, send_mail
-from notifications.models import BadgeClassUserNotification
+from mainsite.utils import EmailMessageMaker
 from staff.permissions import HasObjectPermission
 
 
@@ -99,29 +98,11 @@ class StudentsEnrolledList(BaseEntityListView):
                 evidence_url=request.data.get("evidence_url"),
                 date_consent_given=timezone.now()
             )
-            # Clear cache for the enrollments of this badgeclass
-            badge_class.remove_cached_data(['cached_pending_enrollments'])
-            badge_class.remove_cached_data(['cached_pending_enrollments_including_denied'])
             message = EmailMessageMaker.create_student_badge_request_email(request.user, badge_class)
             request.user.email_user(subject='You have successfully requested an edubadge', html_message=message)
 
             # Send notifications to all users who have indicated they want to get notified
-            def send_notifications(badge_class, created_enrollment):
-                user_notifications = BadgeClassUserNotification.objects.filter(badgeclass=badge_class).all()
-                for user_notification in user_notifications:
-                    perms = badge_class.get_permissions(user_notification.user)
-                    if perms['may_sign']:
-                        html_message = EmailMessageMaker.create_enrolment_notification_mail(badge_class,
-                                                                                            request.user,
-                                                                                            created_enrollment)
-                        send_mail(subject='Een edubadge is aangevraagd! An edubadge is requested!',
-                                  message=None, html_message=html_message,
-                                  recipient_list=[user_notification.user.email])
-                    else:
-                        user_notification.delete()
-
-            thread = threading.Thread(target=send_notifications, args=(badge_class, enrollment))
-            thread.start()
+            transaction.on_commit(lambda: send_enrollment_notifications.delay(enrollment.pk))
             return Response(data={'status': 'enrolled', 'entity_id': enrollment.entity_id}, status=201)
         raise BadgrApiException400('Cannot enroll', 209)
 
@@ -150,7 +131,4 @@ class EnrollmentDetail(BaseEntityDetailView):
         subject = 'Your request for the badgeclass {} has been denied by the issuer.'.format(
             enrollment.badge_class.name)
         enrollment.user.email_user(subject=subject, html_message=html_message)
-        # Clear cache for the enrollments of this badgeclass
-        enrollment.badge_class.remove_cached_data(['cached_pending_enrollments'])
-        enrollment.badge_class.remove_cached_data(['cached_pending_enrollments_including_denied'])
         return Response(data='Succesfully denied enrollment', status=HTTP_200_OK)
@@ -26,9 +26,9 @@ class StudentsEnrolled(BaseVersionedEntity, models.Model):
     def __str__(self):
         return self.email
 
-    def save(self, *args, **kwargs):
-        self.badge_class.remove_cached_data(['cached_enrollments', 'cached_pending_enrollments'])
-        return super(StudentsEnrolled, self).save(*args, **kwargs)
+    def get_dependent_cache_tags(self):
+        tags = super(StudentsEnrolled, self).get_dependent_cache_tags()
+        return tags + self.badge_class.get_dependent_cache_tags() + [self.user.cache_tag]
 
     @property
     def assertion_slug(self):
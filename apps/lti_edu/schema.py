@@ -1,6 +1,7 @@
 import graphene
 from graphene_django.types import DjangoObjectType
 
+from mainsite.graphql_loaders import load_related
 from .models import StudentsEnrolled
 
 
@@ -10,6 +11,12 @@ class StudentsEnrolledType(DjangoObjectType):
         fields = ('date_created', 'date_consent_given', 'date_awarded', 'badge_class', 'denied',
                   'user', 'badge_instance', 'entity_id', 'deny_reason', 'narrative', 'evidence_url')
 
+    def resolve_user(self, info, **kwargs):
+        return load_related(info, self, 'user')
+
+    def resolve_badge_class(self, info, **kwargs):
+        return load_related(info, self, 'badge_class')
+
 
 class Query(object):
     enrollments = graphene.List(StudentsEnrolledType)
@@ -0,0 +1,35 @@
+from mainsite.celery import IdempotentTask, app, notification_task_queue_name
+from mainsite.utils import BulkMailer, EmailMessageMaker
+
+
+@app.task(bind=True, base=IdempotentTask, queue=notification_task_queue_name)
+def send_enrollment_notifications(self, enrollment_id, recipients=None):
+    """
+    Mails the users who want to be notified of enrollments in the badgeclass, if they may still sign it.
+    :param recipients: the emails to mail, on a retry; all users with a notification when None
+    """
+    from lti_edu.models import StudentsEnrolled
+    from notifications.models import BadgeClassUserNotification
+
+    enrollment = StudentsEnrolled.objects.select_related('badge_class', 'user').filter(pk=enrollment_id).first()
+    if enrollment is None:
+        return
+    badge_class = enrollment.badge_class
+    user_notifications = BadgeClassUserNotification.objects.filter(badgeclass=badge_class).select_related('user')
+    if recipients is not None:
+        user_notifications = user_notifications.filter(user__email__in=recipients)
+    with BulkMailer() as mailer:
+        for user_notification in user_notifications:
+            perms = badge_class.get_permissions(user_notification.user)
+            if perms['may_sign']:
+                html_message = EmailMessageMaker.create_enrolment_notification_mail(badge_class,
+                                                                                    enrollment.user,
+                                                                                    enrollment)
+                mailer.send_mail(subject='Een edubadge is aangevraagd! An edubadge is requested!',
+                                 message=None, html_message=html_message,
+                                 recipient_list=[user_notification.user.email])
+            else:
+                user_notification.delete()
+    if mailer.failed_recipients:
+        # only the recipients of the failed batches, the others already got their mail
+        raise self.retry(args=(enrollment_id,), kwargs={'recipients': mailer.failed_recipients})
@@ -8,3 +8,29 @@ app = Celery('mainsite')
 
 app.config_from_object('django.conf:settings')
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
+
+# queue of the tasks that mail and push notifications
+notification_task_queue_name = getattr(settings, 'NOTIFICATION_TASK_QUEUE_NAME', 'notifications')
+
+
+class IdempotentTask(app.Task):
+    """
+    Base for tasks that must not run twice for the same message. Tasks are acknowledged after they ran, so the broker
+    redelivers the message of a worker that died halfway; a message that already completed is skipped then.
+    Retries keep the id of the message, so they run until one of them completes.
+    """
+    acks_late = True
+    max_retries = 3
+    default_retry_delay = 60
+    done_timeout = 60 * 60 * 24 * 7
+
+    def __call__(self, *args, **kwargs):
+        from django.core.cache import cache
+
+        done_key = 'celery_task_done__{}'.format(self.request.id) if self.request.id else None
+        if done_key and cache.get(done_key):
+            return None
+        result = super(IdempotentTask, self).__call__(*args, **kwargs)
+        if done_key:
+            cache.set(done_key, True, self.done_timeout)
+        return result
@@ -0,0 +1,166 @@
+import hashlib
+import io
+import os
+
+import cairosvg
+from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from cachemodel import CACHE_FOREVER_TIMEOUT
+from cachemodel.lease import acquire_lease, release_lease, wait_for
+
+# the formats of ImagePropertyDetailView as aspect ratios, the original image is served for the square original
+DERIVATIVE_FORMATS = {'square': (1, 1), 'wide': (1.91, 1)}
+DERIVATIVE_HEIGHT = 400
+
+
+def derivative_version():
+    return str(getattr(settings, 'CAIROSVG_VERSION_SUFFIX', '1'))
+
+
+def derivative_cache_key(source_name, fmt):
+    return 'imagederivative__{}__{}__{}'.format(
+        derivative_version(), fmt, hashlib.sha1(source_name.encode('utf-8')).hexdigest()
+    )
+
+
+def render_derivative(source, is_svg, fmt, height=DERIVATIVE_HEIGHT):
+    """
+    Renders an image as png, fitted to height and centered on a transparent canvas of the aspect ratio of fmt
+    :param source: the bytes of the image
+    :return: the bytes of the png
+    """
+    if is_svg:
+        source = cairosvg.svg2png(bytestring=source)
+    img = Image.open(io.BytesIO(source)).convert('RGBA')
+    img.thumbnail((height, height))
+    ratio = DERIVATIVE_FORMATS[fmt]
+    canvas = Image.new('RGBA', (int(ratio[0] * height), int(ratio[1] * height)))
+    canvas.paste(img, ((canvas.width - img.width) // 2, (canvas.height - img.height) // 2))
+    out = io.BytesIO()
+    canvas.save(out, format='png')
+    return out.getvalue()
+
+
+def generate_derivatives(source_name, storage=default_storage):
+    """
+    Renders the derivatives of an image that are not in the manifest yet, reusing those of an image with the same
+    content, and records them in the manifest.
+    :param source_name: the storage name of the image
+    :return: dictionary of format -> storage name of the derivative
+    """
+    from mainsite.models import ImageDerivative
+
+    version = derivative_version()
+    derivatives = dict(
+        ImageDerivative.objects.filter(source_name=source_name, version=version).values_list('fmt', 'name')
+    )
+    missing = [fmt for fmt in DERIVATIVE_FORMATS if fmt not in derivatives]
+    if missing:
+        with storage.open(source_name, 'rb') as source_file:
+            source = source_file.read()
+        source_hash = hashlib.sha256(source).hexdigest()
+        known = dict(
+            ImageDerivative.objects.filter(source_hash=source_hash, version=version, fmt__in=missing).values_list(
+                'fmt', 'name'
+            )
+        )
+        dirname = os.path.dirname(source_name)
+        is_svg = os.path.splitext(source_name)[1].lower() == '.svg'
+        rows = []
+        for fmt in missing:
+            name = known.get(fmt)
+            if name is None:
+                name = storage.save(
+                    '{dirname}/converted{version}/{hash}{fmt_suffix}.png'.format(
+                        dirname=dirname,
+                        version=version,
+                        hash=source_hash,
+                        fmt_suffix='-{}'.format(fmt) if fmt != 'square' else '',
+                    ),
+                    ContentFile(render_derivative(source, is_svg, fmt)),
+                )
+            derivatives[fmt] = name
+            rows.append(
+                ImageDerivative(source_name=source_name, source_hash=source_hash, version=version, fmt=fmt, name=name)
+            )
+        ImageDerivative.objects.bulk_create(rows, ignore_conflicts=True)
+    cache.set_many(
+        {derivative_cache_key(source_name, fmt): name for fmt, name in derivatives.items()}, CACHE_FOREVER_TIMEOUT
+    )
+    return derivatives
+
+
+def get_derivative(source_name, fmt):
+    """:return: the storage name of the derivative from the manifest, None when it has not been rendered"""
+    from mainsite.models import ImageDerivative
+
+    key = derivative_cache_key(source_name, fmt)
+    name = cache.get(key)
+    if name is None:
+        name = (
+            ImageDerivative.objects.filter(source_name=source_name, version=derivative_version(), fmt=fmt)
+            .values_list('name', flat=True)
+            .first()
+        )
+        if name is not None:
+            cache.set(key, name, CACHE_FOREVER_TIMEOUT)
+    return name
+
+
+def get_or_render_derivative(field_file, fmt):
+    """
+    The derivative of an image, rendered by this request when the task did not render it yet. Concurrent requests
+    for the same derivative wait for it instead of rendering it again.
+    :return: the storage name of the derivative, None when waiting for another request timed out
+    """
+    name = get_derivative(field_file.name, fmt)
+    if name is not None:
+        return name
+    key = derivative_cache_key(field_file.name, fmt)
+    lease = acquire_lease(key)
+    if lease is None:
+        return wait_for(key, lambda: cache.get(key))
+    try:
+        return generate_derivatives(field_file.name, field_file.storage)[fmt]
+    finally:
+        release_lease(key, lease)
+
+
+class ImageDerivativesMixin(object):
+    """
+    For the models with images served by ImagePropertyDetailView: the derivatives of a new or changed image are
+    rendered by a task once the transaction commits, instead of by the first requests for them. Only for the few
+    images that are shown everywhere; the images of assertions, one per issued badge and rarely viewed, are rendered
+    on demand by get_or_render_derivative().
+    """
+
+    derivative_image_fields = ('image',)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(ImageDerivativesMixin, cls).from_db(db, field_names, values)
+        instance._derivative_sources = instance._image_names()
+        return instance
+
+    def _image_names(self):
+        return {
+            field: getattr(self, field).name for field in self.derivative_image_fields if field in self.__dict__
+        }
+
+    def save(self, *args, **kwargs):
+        super(ImageDerivativesMixin, self).save(*args, **kwargs)
+        sources = getattr(self, '_derivative_sources', {})
+        names = self._image_names()
+        changed = [field for field, name in names.items() if name and name != sources.get(field)]
+        self._derivative_sources = names
+        if changed:
+            from mainsite.tasks import generate_image_derivatives
+
+            transaction.on_commit(
+                lambda: generate_image_derivatives.delay(self._meta.label, self.pk, changed)
+            )
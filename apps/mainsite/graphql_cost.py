@@ -0,0 +1,150 @@
+import logging
+
+from django.conf import settings
+from graphql import GraphQLError, get_named_type, get_nullable_type, is_list_type
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode, IntValueNode, OperationDefinitionNode
+from graphql.validation import ValidationRule
+from prometheus_client import Counter
+
+logger = logging.getLogger('Badgr.Debug')
+
+rejected_operations = Counter(
+    'graphql_rejected_operations_total',
+    'GraphQL operations rejected before execution for exceeding the depth or cost limits',
+    ['reason'],
+)
+
+PAGE_SIZE_ARGUMENTS = ('first', 'last')
+
+
+def get_limits():
+    """:return: the maximum depth, the maximum cost and the estimated size of a list without a page size"""
+    return (
+        getattr(settings, 'GRAPHQL_MAX_DEPTH', 10),
+        getattr(settings, 'GRAPHQL_MAX_COST', 100000),
+        getattr(settings, 'GRAPHQL_LIST_MULTIPLIER', 10),
+    )
+
+
+def page_size(node):
+    """the literal first / last argument of a connection field, None when absent or given as a variable"""
+    for argument in node.arguments or ():
+        if argument.name.value in PAGE_SIZE_ARGUMENTS and isinstance(argument.value, IntValueNode):
+            return int(argument.value.value)
+    return None
+
+
+class CostEstimator(object):
+    """
+    Estimates the work of a GraphQL operation before it is executed. Every field costs one resolve for each time
+    its parent is resolved: a field below a list is resolved GRAPHQL_LIST_MULTIPLIER times per parent, or the page
+    size for a connection with a literal first / last argument. So the cost grows with the product of the lists
+    a query nests, which is what makes nested queries expensive. The depth is the number of nested selection sets.
+    """
+
+    def __init__(self, schema, fragments, list_multiplier):
+        self.schema = schema
+        self.fragments = fragments
+        self.list_multiplier = list_multiplier
+
+    def estimate(self, operation):
+        """:return: the depth and the cost of the OperationDefinitionNode operation"""
+        root_type = self.schema.get_root_type(operation.operation)
+        if root_type is None:
+            return 0, 0
+        return self.selection_set(root_type, operation.selection_set, 1, False, frozenset())
+
+    def selection_set(self, parent_type, selection_set, multiplier, paginated, visited):
+        depth, cost = 0, 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field_depth, field_cost = self.field(parent_type, selection, multiplier, paginated, visited)
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = parent_type
+                if selection.type_condition is not None:
+                    fragment_type = self.schema.get_type(selection.type_condition.name.value) or parent_type
+                field_depth, field_cost = self.selection_set(
+                    fragment_type, selection.selection_set, multiplier, paginated, visited
+                )
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in visited:
+                    # unknown and cyclic fragments are reported by the standard validation rules
+                    continue
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value) or parent_type
+                field_depth, field_cost = self.selection_set(
+                    fragment_type, fragment.selection_set, multiplier, paginated, visited | {name}
+                )
+            else:
+                continue
+            depth = max(depth, field_depth)
+            cost += field_cost
+        return depth, cost
+
+    def field(self, parent_type, node, multiplier, paginated, visited):
+        if node.name.value.startswith('__'):
+            return 0, 0
+        field = getattr(parent_type, 'fields', {}).get(node.name.value)
+        if field is None:
+            # unknown fields are reported by the standard validation rules
+            return 0, 0
+        if node.selection_set is None:
+            return 0, multiplier
+        size = page_size(node)
+        if size is not None:
+            # a connection, the edges list below it holds size nodes
+            child_multiplier, child_paginated = multiplier * size, True
+        elif is_list_type(get_nullable_type(field.type)) and not paginated:
+            child_multiplier, child_paginated = multiplier * self.list_multiplier, False
+        else:
+            child_multiplier, child_paginated = multiplier, False
+        depth, cost = self.selection_set(
+            get_named_type(field.type), node.selection_set, child_multiplier, child_paginated, visited
+        )
+        return depth + 1, cost + multiplier
+
+
+def estimate_cost(schema, document, list_multiplier=None):
+    """
+    :param schema: GraphQLSchema
+    :param document: the parsed DocumentNode
+    :return: dictionary of operation name -> (depth, cost) of the operations in document
+    """
+    if list_multiplier is None:
+        list_multiplier = get_limits()[2]
+    fragments = {
+        definition.name.value: definition for definition in document.definitions
+        if not isinstance(definition, OperationDefinitionNode)
+    }
+    estimator = CostEstimator(schema, fragments, list_multiplier)
+    return {
+        definition.name.value if definition.name else 'anonymous': estimator.estimate(definition)
+        for definition in document.definitions
+        if isinstance(definition, OperationDefinitionNode)
+    }
+
+
+class QueryCostValidationRule(ValidationRule):
+    """
+    Validation rule rejecting operations that nest deeper than GRAPHQL_MAX_DEPTH selections or whose estimated cost
+    exceeds GRAPHQL_MAX_COST, before any resolver runs. See CostEstimator for the cost.
+    """
+
+    def __init__(self, context):
+        super(QueryCostValidationRule, self).__init__(context)
+        max_depth, max_cost, list_multiplier = get_limits()
+        costs = estimate_cost(context.schema, context.document, list_multiplier)
+        for name, (depth, cost) in costs.items():
+            if depth > max_depth:
+                rejected_operations.labels(reason='depth').inc()
+                logger.warning('GraphQL operation %s rejected, depth %s', name, depth)
+                context.report_error(GraphQLError(
+                    "'{}' exceeds the maximum operation depth of {}.".format(name, max_depth)
+                ))
+            elif cost > max_cost:
+                rejected_operations.labels(reason='cost').inc()
+                logger.warning('GraphQL operation %s rejected, estimated cost %s', name, cost)
+                context.report_error(GraphQLError(
+                    "'{}' has an estimated cost of {}, the maximum is {}.".format(name, cost, max_cost)
+                ))
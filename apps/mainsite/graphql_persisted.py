@@ -0,0 +1,128 @@
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import GraphQLError
+
+PERSISTED_QUERY_NOT_FOUND = 'PersistedQueryNotFound'
+PERSISTED_QUERY_MISMATCH = 'provided sha does not match query'
+PERSISTED_QUERY_REQUIRED = 'Only persisted queries are allowed'
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def persisted_query_cache_key(sha):
+    return 'graphql_persisted_query__{}'.format(sha)
+
+
+@functools.lru_cache(maxsize=None)
+def load_manifest(path):
+    """
+    The known operations of the frontend, from a JSON file mapping their sha256 hash to the document, or an Apollo
+    persisted query manifest with a list of operations.
+    :return: dictionary of hash -> query
+    """
+    with open(path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if 'operations' in manifest:
+        return {operation['id']: operation['body'] for operation in manifest['operations']}
+    return manifest
+
+
+def get_manifest():
+    path = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_MANIFEST', None)
+    return load_manifest(path) if path else {}
+
+
+def get_extensions(request, data):
+    """the extensions of a GraphQL request, sent as a JSON string in the query string of a GET"""
+    extensions = request.GET.get('extensions') or data.get('extensions') or {}
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return {}
+    return extensions if isinstance(extensions, dict) else {}
+
+
+def resolve_persisted_query(request, data, query):
+    """
+    Automatic persisted queries, compatible with the Apollo APQ protocol: a client sends only the sha256 hash of a
+    query in the persistedQuery extension, and the query itself along with the hash when the server answers
+    PersistedQueryNotFound, after which register_persisted_query() registers it. Queries of the manifest are always
+    known. With GRAPHQL_PERSISTED_QUERIES_ONLY only the queries of the manifest are allowed.
+    :return: the query and None, or None and the GraphQLError to answer with
+    """
+    persisted = get_extensions(request, data).get('persistedQuery')
+    sha = persisted.get('sha256Hash') if isinstance(persisted, dict) else None
+    manifest = get_manifest()
+    only_persisted = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_ONLY', False)
+    if not sha:
+        if query and only_persisted and query_hash(query) not in manifest:
+            return None, GraphQLError(PERSISTED_QUERY_REQUIRED)
+        return query, None
+    if not query:
+        query = manifest.get(sha)
+        if query is None and not only_persisted:
+            query = cache.get(persisted_query_cache_key(sha))
+        if query is None:
+            return None, GraphQLError(PERSISTED_QUERY_NOT_FOUND)
+        return query, None
+    if query_hash(query) != sha:
+        return None, GraphQLError(PERSISTED_QUERY_MISMATCH)
+    if sha not in manifest and only_persisted:
+        return None, GraphQLError(PERSISTED_QUERY_REQUIRED)
+    return query, None
+
+
+def register_persisted_query(request, data, query):
+    """
+    Registers a query sent along with its hash for GRAPHQL_PERSISTED_QUERIES_TIMEOUT seconds. Called only once the
+    query parsed and passed the validation, so clients cannot fill the cache with invalid or too expensive queries.
+    """
+    persisted = get_extensions(request, data).get('persistedQuery')
+    sha = persisted.get('sha256Hash') if isinstance(persisted, dict) else None
+    if not sha or getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_ONLY', False) or sha in get_manifest():
+        return
+    key = persisted_query_cache_key(sha)
+    if cache.get(key) is None:
+        cache.set(key, query, getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_TIMEOUT', 60 * 60 * 24))
+
+
+class DocumentCache(object):
+    """
+    A bounded LRU of parsed and validated GraphQL documents by the hash of their query, shared by the requests of a
+    process. The frontend sends the same few documents over and over, so they are parsed and validated only once.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, sha):
+        with self.lock:
+            document = self.entries.get(sha)
+            if document is not None:
+                self.entries.move_to_end(sha)
+            return document
+
+    def set(self, sha, document):
+        with self.lock:
+            self.entries[sha] = document
+            self.entries.move_to_end(sha)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+document_cache = DocumentCache(getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 500))
@@ -5,6 +5,7 @@ from graphene_django.types import DjangoObjectType
 
 from badgeuser.models import UserProvisionment
 from mainsite.exceptions import GraphQLException
+from mainsite.graphql_loaders import load_cached
 from staff.schema import PermissionType
 
 
@@ -80,7 +81,7 @@ class UserProvisionmentResolverMixin(object):
     userprovisionments = graphene.List(UserProvisionmentType)
 
     def resolve_userprovisionments(self, info):
-        return self.cached_userprovisionments()
+        return load_cached(info, self, 'cached_userprovisionments')
 
 
 class ContentTypeIdResolverMixin(object):
@@ -128,6 +129,6 @@ class StaffResolverMixin(object):
     @resolver_blocker_for_students
     def resolve_staff(self, info):
         if self.has_permissions(info.context.user, ['may_read']):
-            return self.staff_items
+            return load_cached(info, self, 'cached_staff')
         else:
             return []
@@ -1,9 +1,74 @@
 import logging
+import re
+import time
 
+from django.conf import settings
+from django.db import connection
+from graphene_django.settings import graphene_settings
 from graphene_django.views import GraphQLView
+from graphql import (
+    ExecutionResult,
+    OperationType,
+    execute,
+    get_operation_ast,
+    parse,
+    specified_rules,
+    validate,
+    validate_schema,
+)
+from prometheus_client import Histogram
+
+from mainsite.graphql_cost import QueryCostValidationRule
+from mainsite.graphql_persisted import document_cache, query_hash, register_persisted_query, resolve_persisted_query
 
 logger = logging.getLogger('Badgr.Debug')
 
+operation_duration_seconds = Histogram(
+    'graphql_operation_duration_seconds',
+    'Time spent executing a GraphQL operation, per operation name',
+    ['operation'],
+)
+operation_db_queries = Histogram(
+    'graphql_operation_db_queries',
+    'Number of database queries of a GraphQL operation, per operation name',
+    ['operation'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float('inf')),
+)
+
+_OPERATION_NAME = re.compile(r'^[_A-Za-z][_0-9A-Za-z]{0,63}$')
+_seen_operations = set()
+
+
+def operation_label(document, operation_name):
+    """
+    The metrics label of an operation: its name, 'anonymous' for an operation without one. The names are chosen by the
+    clients, so after GRAPHQL_METRICS_MAX_OPERATIONS distinct names the new ones are counted as 'other'.
+    """
+    if document is None:
+        return 'invalid'
+    operation = get_operation_ast(document, operation_name)
+    if operation is None or operation.name is None:
+        return 'anonymous'
+    operation_name = operation.name.value
+    if not _OPERATION_NAME.match(operation_name):
+        return 'other'
+    if operation_name not in _seen_operations:
+        if len(_seen_operations) >= getattr(settings, 'GRAPHQL_METRICS_MAX_OPERATIONS', 200):
+            return 'other'
+        _seen_operations.add(operation_name)
+    return operation_name
+
+
+class QueryCounter(object):
+    """Database execute wrapper counting the queries"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
 
 class IntrospectionDisabledException(Exception):
     pass
@@ -17,10 +82,71 @@ class DisableIntrospectionMiddleware(object):
 
 
 class ExtendedGraphQLView(GraphQLView):
+    # validate() runs only the rules it is given, so the rules of the spec are passed along with the cost rule
+    validation_rules = tuple(specified_rules) + (QueryCostValidationRule,)
 
     def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
-        res = super().execute_graphql_request(request, data, query, variables, operation_name,
-                                              show_graphiql=show_graphiql)
-        if res.errors:
+        query, error = resolve_persisted_query(request, data, query)
+        if error is not None:
+            return ExecutionResult(data=None, errors=[error])
+        if not query:
+            return super().execute_graphql_request(request, data, query, variables, operation_name,
+                                                   show_graphiql=show_graphiql)
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            document, res = self.get_document(query)
+            if res is None:
+                register_persisted_query(request, data, query)
+                operation_ast = get_operation_ast(document, operation_name)
+                if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+                    # mutations take the path of graphene-django, with its method check and atomic mutations
+                    res = super().execute_graphql_request(request, data, query, variables, operation_name,
+                                                          show_graphiql=show_graphiql)
+                else:
+                    res = self.execute_document(request, document, variables, operation_name)
+        label = operation_label(document, operation_name)
+        operation_duration_seconds.labels(operation=label).observe(time.perf_counter() - start)
+        operation_db_queries.labels(operation=label).observe(queries.count)
+        if res is not None and res.errors:
             logger.exception(str(res.errors))
         return res
+
+    def get_document(self, query):
+        """
+        The parsed and validated document of query, from the document cache after the first time.
+        :return: the document and None, or None and the ExecutionResult with the errors
+        """
+        sha = query_hash(query)
+        document = document_cache.get(sha)
+        if document is not None:
+            return document, None
+        schema = self.schema.graphql_schema
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return None, ExecutionResult(data=None, errors=schema_validation_errors)
+        try:
+            document = parse(query)
+        except Exception as e:
+            return None, ExecutionResult(errors=[e])
+        validation_errors = validate(schema, document, self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS)
+        if validation_errors:
+            return None, ExecutionResult(data=None, errors=validation_errors)
+        document_cache.set(sha, document)
+        return document, None
+
+    def execute_document(self, request, document, variables, operation_name):
+        """executes an already validated query document, as GraphQLView.execute_graphql_request() does"""
+        execute_options = {
+            'root_value': self.get_root_value(request),
+            'context_value': self.get_context(request),
+            'variable_values': variables,
+            'operation_name': operation_name,
+            'middleware': self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options['execution_context_class'] = self.execution_context_class
+        try:
+            return execute(self.schema.graphql_schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
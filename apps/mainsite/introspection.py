@@ -0,0 +1,56 @@
+import hashlib
+import logging
+import time
+import urllib.parse
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from prometheus_client import Counter
+
+logger = logging.getLogger('Badgr.Debug')
+
+introspection_lookups = Counter(
+    'eduid_introspection_lookups_total',
+    'Introspections of eduID bearer tokens, by whether the cached result of the token was used',
+    ['result'],
+)
+
+
+def introspection_cache_key(bearer_token):
+    # never the token itself, it would end up in the cache
+    return 'eduid_introspection__{}'.format(hashlib.sha256(bearer_token.encode('utf-8')).hexdigest())
+
+
+def introspect_token(bearer_token):
+    """
+    Introspects bearer_token at eduID. The result is cached for EDUID_INTROSPECTION_CACHE_TIMEOUT seconds, but never
+    beyond the expiry of the token, so the app does not wait for eduID on every API call. Inactive tokens are cached
+    for EDUID_INTROSPECTION_NEGATIVE_CACHE_TIMEOUT seconds. Failed introspections are not cached.
+    :return: the introspection json, or None when eduID does not answer with 200
+    """
+    key = introspection_cache_key(bearer_token)
+    introspect_json = cache.get(key)
+    if introspect_json is not None:
+        introspection_lookups.labels(result='hit' if introspect_json.get('active') else 'negative_hit').inc()
+        return introspect_json
+    introspection_lookups.labels(result='miss').inc()
+    headers = {'Accept': 'application/json', 'Content-Type': 'application/x-www-form-urlencoded'}
+    url = f'{settings.EDUID_PROVIDER_URL}/introspect'
+    auth = (settings.OIDC_RS_ENTITY_ID, settings.OIDC_RS_SECRET)
+    response = requests.post(
+        url, data=urllib.parse.urlencode({'token': bearer_token}), auth=auth, headers=headers, timeout=60
+    )
+    if response.status_code != 200:
+        logger.info(f'Token introspection bad response {response.status_code} {response.text}')
+        return None
+    introspect_json = response.json()
+    if introspect_json.get('active'):
+        timeout = getattr(settings, 'EDUID_INTROSPECTION_CACHE_TIMEOUT', 60)
+        if introspect_json.get('exp'):
+            timeout = min(timeout, int(introspect_json['exp'] - time.time()))
+    else:
+        timeout = getattr(settings, 'EDUID_INTROSPECTION_NEGATIVE_CACHE_TIMEOUT', 10)
+    if timeout > 0:
+        cache.set(key, introspect_json, timeout)
+    return introspect_json
@@ -1,15 +1,27 @@
 import logging
+import time
+from collections import defaultdict
 
 from django.core.management.base import BaseCommand
-from django.db import IntegrityError
-from django.db import connections
+from django.db import connections, transaction
+from django.db.models import Case, Value, When
 from django.utils import timezone
 
 
 class Command(BaseCommand):
+    """
+    Awards the scheduled direct award bundles that are due, set based: per batch of bundles one UPDATE for their
+    direct awards and one for the bundles, one cache invalidation for all of them and the notifications queued in
+    chunks. Direct awards whose recipient already has an unaccepted direct award for the badgeclass stay scheduled.
+    """
+    help = 'Award the scheduled direct award bundles that are due'
 
-    def handle(self, *args, **kwargs):
-        from directaward.models import DirectAwardBundle, DirectAward
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of bundles awarded per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be awarded, without changes')
+
+    def handle(self, *args, **options):
+        from directaward.models import DirectAwardBundle
 
         # Prevent MySQLdb._exceptions.OperationalError: (2006, 'MySQL server has gone away')
         connections.close_all()
@@ -17,25 +29,95 @@ class Command(BaseCommand):
         logger = logging.getLogger('Badgr.Debug')
         logger.info("Running award_scheduled_direct_awards")
 
-        direct_award_bundles = DirectAwardBundle.objects.filter(scheduled_at__lt=timezone.now(),
-                                                                status=DirectAwardBundle.STATUS_SCHEDULED).all()
+        start = time.monotonic()
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        bundle_ids = list(DirectAwardBundle.objects.filter(scheduled_at__lt=timezone.now(),
+                                                           status=DirectAwardBundle.STATUS_SCHEDULED)
+                          .order_by('pk').values_list('pk', flat=True))
+        total_awarded = total_skipped = 0
+        for offset in range(0, len(bundle_ids), batch_size):
+            batch_start = time.monotonic()
+            batch = bundle_ids[offset:offset + batch_size]
+            awarded, skipped = self.award_bundles(batch, dry_run)
+            total_awarded += awarded
+            total_skipped += skipped
+            self.stdout.write(f"{'Would award' if dry_run else 'Awarded'} {awarded} direct awards of {len(batch)} "
+                              f"bundles, skipped {skipped} duplicates in {time.monotonic() - batch_start:.2f}s\n")
+
+        self.stdout.write(f"{'Would award' if dry_run else 'Awarded'} {total_awarded} direct awards of "
+                          f"{len(bundle_ids)} bundles, skipped {total_skipped} duplicates in "
+                          f"{time.monotonic() - start:.2f}s\n")
+        logger.info(f"Finished {len(bundle_ids)} award_scheduled_direct_awards")
+
+    def award_bundles(self, bundle_ids, dry_run=False):
+        """
+        :return: a tuple of the number of direct awards awarded and the number left scheduled as duplicates
+        """
+        from cachemodel.tags import invalidate_tags
+        from directaward.models import DirectAward, DirectAwardBundle
+        from directaward.tasks import notify_bundle_recipients
+
+        bundles = list(DirectAwardBundle.objects.filter(pk__in=bundle_ids, status=DirectAwardBundle.STATUS_SCHEDULED)
+                       .select_related('badgeclass__issuer__faculty__institution', 'created_by').order_by('pk'))
+        scheduled = defaultdict(list)
+        for row in (DirectAward.objects.filter(bundle__in=bundles, status=DirectAward.STATUS_SCHEDULED)
+                    .order_by('pk').values_list('pk', 'bundle_id', 'eppn', 'recipient_email')):
+            scheduled[row[1]].append(row)
+        bundles_by_badgeclass = defaultdict(list)
+        for bundle in bundles:
+            bundles_by_badgeclass[bundle.badgeclass].append(bundle)
+
+        awarded_ids = defaultdict(list)
+        duplicate_ids = []
+        for badgeclass, badgeclass_bundles in bundles_by_badgeclass.items():
+            rows = [row for bundle in badgeclass_bundles for row in scheduled[bundle.pk]]
+            # one query per badgeclass instead of validate_unique per direct award
+            duplicate_eppns, duplicate_emails = DirectAward.unaccepted_duplicates(
+                badgeclass, [row[2] for row in rows], [row[3] for row in rows]
+            )
+            for bundle in badgeclass_bundles:
+                for pk, bundle_id, eppn, recipient_email in scheduled[bundle.pk]:
+                    eppn = eppn.lower() if eppn else None
+                    recipient_email = recipient_email.lower()
+                    if (eppn and eppn in duplicate_eppns) or recipient_email in duplicate_emails:
+                        duplicate_ids.append(pk)
+                        continue
+                    # an awarded direct award makes the later ones for the same recipient duplicates
+                    if bundle.identifier_type == DirectAwardBundle.IDENTIFIER_EPPN:
+                        duplicate_eppns.add(eppn)
+                    else:
+                        duplicate_emails.add(recipient_email)
+                    awarded_ids[bundle.pk].append(pk)
 
-        for bundle in direct_award_bundles:
-            for da in bundle.directaward_set.all():
-                da.status = DirectAward.STATUS_UNACCEPTED
-                da.badgeclass.remove_cached_data(['cached_direct_awards'])
-                da.badgeclass.remove_cached_data(['cached_direct_award_bundles'])
-                try:
-                    da.save()
-                    da.notify_recipient()
-                except IntegrityError:
-                    pass
+        awarded = sum(len(ids) for ids in awarded_ids.values())
+        if dry_run or not bundles:
+            return awarded, len(duplicate_ids)
 
+        now = timezone.now()
+        bundle_pks = [bundle.pk for bundle in bundles]
+        with transaction.atomic():
+            DirectAward.objects.filter(
+                pk__in=[pk for ids in awarded_ids.values() for pk in ids], status=DirectAward.STATUS_SCHEDULED
+            ).update(status=DirectAward.STATUS_UNACCEPTED, updated_at=now)
+            DirectAwardBundle.objects.filter(pk__in=bundle_pks).update(
+                status=DirectAwardBundle.STATUS_ACTIVE, scheduled_at=None, updated_at=now,
+                notification_total=Case(
+                    *[When(pk=pk, then=Value(len(ids))) for pk, ids in awarded_ids.items()], default=Value(0)
+                ),
+            )
+
+        # the rows changed without save(), drop the published objects and invalidate the collections once
+        DirectAward.cached.unpublish_in_bulk([pk for ids in awarded_ids.values() for pk in ids])
+        DirectAwardBundle.cached.unpublish_in_bulk(bundle_pks)
+        tags = [DirectAwardBundle.cache_tag_for(pk) for pk in bundle_pks]
+        for badgeclass in bundles_by_badgeclass:
+            tags += badgeclass.get_dependent_cache_tags()
+        invalidate_tags(tags)
+
+        for bundle in bundles:
             bundle.status = DirectAwardBundle.STATUS_ACTIVE
             bundle.scheduled_at = None
-            bundle.save()
+            notify_bundle_recipients(bundle, awarded_ids[bundle.pk])
             bundle.notify_awarder()
-
-            bundle.remove_cached_data(['cached_direct_awards'])
-
-        logger.info(f"Finished {len(direct_award_bundles)} award_scheduled_direct_awards")
+        return awarded, len(duplicate_ids)
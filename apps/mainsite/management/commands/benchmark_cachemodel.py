@@ -0,0 +1,42 @@
+import timeit
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from cachemodel.decorators import DECORATOR_PROPERTIES, find_fields_decorated_with, scan_fields_decorated_with
+from cachemodel.models import CacheModel
+
+
+class Command(BaseCommand):
+    """
+    Micro-benchmark of finding the @cached_method and @denormalized_field methods, which happens on every save
+    of a CacheModel: scanning all class attributes (as it used to) versus the registry built when the class is prepared.
+    """
+    help = 'Compare the per save overhead of scanning for decorated methods with the decorator registry.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=1000, help='Number of simulated saves per model')
+
+    def handle(self, *args, **options):
+        number = options['number']
+        total_scan = total_registry = 0
+        for model in apps.get_models():
+            if not issubclass(model, CacheModel):
+                continue
+            instance = model()
+            scan = timeit.timeit(
+                lambda: [scan_fields_decorated_with(model, name) for name in DECORATOR_PROPERTIES], number=number
+            )
+            registry = timeit.timeit(
+                lambda: [find_fields_decorated_with(instance, name) for name in DECORATOR_PROPERTIES], number=number
+            )
+            total_scan += scan
+            total_registry += registry
+            self.stdout.write(self._line(model.__name__, scan / number, registry / number))
+        self.stdout.write(self._line('all models', total_scan / number, total_registry / number))
+
+    @staticmethod
+    def _line(name, scan, registry):
+        return '{:<40} scan {:9.1f} us/save   registry {:6.2f} us/save   {:7.0f}x\n'.format(
+            name, scan * 1e6, registry * 1e6, scan / registry if registry else 0
+        )
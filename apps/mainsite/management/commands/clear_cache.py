@@ -2,12 +2,27 @@ from django.conf import settings
 from django.core.cache import cache
 from django.core.management.base import BaseCommand
 
+from cachemodel.tags import invalidate_tags
+
 
 class Command(BaseCommand):
     """A simple management command which clears the site-wide cache."""
-    help = 'Fully clear your site-wide cache.'
+    help = 'Fully clear your site-wide cache, or only the entries carrying the given cache tags.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tag',
+            action='append',
+            dest='tags',
+            default=[],
+            help='Only invalidate the entries carrying this tag, e.g. badgeclass:42. May be repeated.',
+        )
 
     def handle(self, *args, **kwargs):
         assert settings.CACHES, 'The CACHES setting is not configured!'
+        if kwargs['tags']:
+            invalidate_tags(kwargs['tags'])
+            self.stdout.write('Invalidated cache tags: {}\n'.format(', '.join(kwargs['tags'])))
+            return
         cache.clear()
-        self.stdout.write('Your cache has been cleared!\n')
\ No newline at end of file
+        self.stdout.write('Your cache has been cleared!\n')
@@ -5,12 +5,6 @@ from django.core.management.base import BaseCommand
 from django.db import connections
 
 
-def _remove_cached_direct_awards(direct_award):
-    direct_award.badgeclass.remove_cached_data(
-        ['cached_direct_awards', 'cached_pending_direct_awards', 'cached_direct_award_bundles'])
-    direct_award.bundle.remove_cached_data(['cached_direct_awards'])
-
-
 class Command(BaseCommand):
     """A command to delete direct awards with the status Deleted."""
 
@@ -28,7 +22,6 @@ class Command(BaseCommand):
                                                    status='Deleted').all()
 
         for direct_award in direct_awards:
-            _remove_cached_direct_awards(direct_award)
             bundle = direct_award.bundle
             bundle.direct_award_removed_count = bundle.direct_award_removed_count + 1
             bundle.save()
@@ -0,0 +1,118 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+
+
+def _setup_worker():
+    import django
+
+    django.setup()
+
+
+def _render(source_name):
+    """
+    Runs in a worker process
+    :return: a tuple of the source name, the seconds it took and the error, None when rendered
+    """
+    from mainsite.derivatives import generate_derivatives
+
+    start = time.monotonic()
+    try:
+        generate_derivatives(source_name)
+    except Exception as e:
+        return source_name, time.monotonic() - start, '{}: {}'.format(e.__class__.__name__, e)
+    return source_name, time.monotonic() - start, None
+
+
+class Command(BaseCommand):
+    """
+    Renders the missing image derivatives of all models with an ImageDerivativesMixin, for the current
+    CAIROSVG_VERSION_SUFFIX, in a pool of worker processes. The manifest is the checkpoint: images with all their
+    derivatives recorded are skipped, so an interrupted run continues where it stopped.
+    """
+    help = 'Render the missing image derivatives in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of objects read per query')
+        parser.add_argument('--model', action='append', dest='models', default=None,
+                            help='Only this model, as app_label.ModelName, may be repeated')
+
+    def handle(self, *args, **options):
+        from mainsite.derivatives import ImageDerivativesMixin
+
+        # Prevent MySQLdb._exceptions.OperationalError: (2006, 'MySQL server has gone away')
+        connections.close_all()
+
+        logger = logging.getLogger('Badgr.Debug')
+        logger.info("Running generate_image_derivatives")
+
+        models = [model for model in apps.get_models() if issubclass(model, ImageDerivativesMixin)]
+        if options['models']:
+            models = [model for model in models if model._meta.label in options['models']]
+
+        self.rendered = self.failed = 0
+        self.timings = []
+        start = time.monotonic()
+        # spawned workers, forked ones would share the database and cache connections of this process
+        with ProcessPoolExecutor(max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_setup_worker) as executor:
+            for model in models:
+                for field in model.derivative_image_fields:
+                    for source_names in self.missing_derivatives(model, field, options['batch_size']):
+                        self.render(executor, source_names)
+
+        elapsed = time.monotonic() - start
+        message = f"Rendered the derivatives of {self.rendered} images in {elapsed:.2f}s, {self.failed} failed"
+        if self.timings:
+            slowest, source_name = max(self.timings)
+            message += (f", {sum(seconds for seconds, _ in self.timings) / len(self.timings):.2f}s per image, "
+                        f"slowest {slowest:.2f}s for {source_name}")
+        self.stdout.write(message + '\n')
+        logger.info(message)
+
+    def missing_derivatives(self, model, field, batch_size):
+        """
+        Yields the image names of batches of objects of model whose derivatives are not all in the manifest
+        """
+        from mainsite.derivatives import DERIVATIVE_FORMATS, derivative_version
+        from mainsite.models import ImageDerivative
+
+        objects = model.objects.exclude(**{field: ''}).exclude(**{field + '__isnull': True}).order_by('pk')
+        last_pk = None
+        while True:
+            batch = objects if last_pk is None else objects.filter(pk__gt=last_pk)
+            rows = list(batch.values_list('pk', field)[:batch_size])
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+            source_names = {source_name for _, source_name in rows}
+            complete = set(
+                ImageDerivative.objects.filter(source_name__in=source_names, version=derivative_version())
+                .values('source_name')
+                .annotate(formats=Count('fmt'))
+                .filter(formats=len(DERIVATIVE_FORMATS))
+                .values_list('source_name', flat=True)
+            )
+            missing = sorted(source_names - complete)
+            self.stdout.write(f"{model._meta.label}.{field}: {len(missing)} of {len(rows)} images to render\n")
+            if missing:
+                yield missing
+
+    def render(self, executor, source_names):
+        for source_name, seconds, error in executor.map(_render, source_names):
+            if error:
+                self.failed += 1
+                self.stderr.write(f"Failed {source_name} after {seconds:.2f}s: {error}\n")
+                continue
+            self.rendered += 1
+            self.timings.append((seconds, source_name))
+            if self.verbosity > 1:
+                self.stdout.write(f"Rendered {source_name} in {seconds:.2f}s\n")
@@ -0,0 +1,26 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the cached snapshots of the public catalog. Scheduled more often than SNAPSHOT_MAX_AGE, anonymous
+    catalog requests never wait for a rebuild.
+    """
+    help = 'Rebuild the cached snapshots of the public catalog'
+
+    def handle(self, *args, **options):
+        # importing the views registers their snapshots
+        import mobile_api.api  # noqa: F401
+        import queries.api  # noqa: F401
+        from mainsite.snapshots import snapshots
+
+        logger = logging.getLogger('Badgr.Debug')
+        for name, snapshot in snapshots.items():
+            start = time.monotonic()
+            header, rows = snapshot.rebuild()
+            message = f"Rebuilt snapshot {name} with {header['count']} rows in {time.monotonic() - start:.2f}s"
+            self.stdout.write(message + '\n')
+            logger.info(message)
@@ -1,26 +1,86 @@
 import logging
+from collections import Counter
 from datetime import timedelta
 
 from django.core.management.base import BaseCommand
-from django.db import connections, IntegrityError
+from django.db import connections, transaction
+from django.db.models import Case, F, Value, When
 from django.utils import timezone
 
 from mainsite import settings
 
-
-def _remove_cached_direct_awards(direct_award):
-    direct_award.badgeclass.remove_cached_data(
-        ['cached_direct_awards', 'cached_pending_direct_awards', 'cached_direct_award_bundles'])
-    direct_award.bundle.remove_cached_data(['cached_direct_awards'])
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _stream(queryset, chunk_size):
+    """
+    Yields the rows of queryset in chunks ordered by pk, one query per chunk. Paginates on the pk instead of a
+    server side cursor, which MySQL does not offer, so the rows of a chunk may be changed before the next is read.
+    """
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def _invalidate_cached_direct_awards(direct_awards, deleted=False):
+    """Invalidates the cached direct awards, bundles and badgeclass collections of a chunk at once"""
+    from cachemodel.tags import invalidate_tags
+    from directaward.models import DirectAward, DirectAwardBundle
+
+    tags = set()
+    for direct_award in direct_awards:
+        tags.add(DirectAward.cache_tag_for(direct_award.pk))
+        tags.update(direct_award.badgeclass.get_dependent_cache_tags())
+        if direct_award.bundle_id:
+            tags.add(DirectAwardBundle.cache_tag_for(direct_award.bundle_id))
+    DirectAward.cached.unpublish_in_bulk([direct_award.pk for direct_award in direct_awards])
+    if deleted:
+        DirectAwardBundle.cached.unpublish_in_bulk(
+            {direct_award.bundle_id for direct_award in direct_awards if direct_award.bundle_id}
+        )
+    invalidate_tags(list(tags))
+
+
+def _send_in_batches(mailer, direct_awards, subject, html_message):
+    """
+    Mails the recipients of direct_awards one mail batch at a time, outside of any transaction.
+    :param html_message: function of a direct award to the body of its mail
+    :return: generator of the direct awards of each batch whose mail went out or was refused for good, only the
+    ones whose mail failed otherwise are left out to be mailed again on the next run
+    """
+    for start in range(0, len(direct_awards), mailer.batch_size):
+        batch = direct_awards[start:start + mailer.batch_size]
+        failed = len(mailer.failed_recipients)
+        for direct_award in batch:
+            mailer.send_mail(subject=subject, message=None, html_message=html_message(direct_award),
+                             recipient_list=[direct_award.recipient_email])
+        mailer.flush()
+        failed_recipients = set(mailer.failed_recipients[failed:])
+        yield [direct_award for direct_award in batch if direct_award.recipient_email not in failed_recipients]
 
 
 class Command(BaseCommand):
-    """A command to send reminders for unclaimed and open direct awards."""
+    """
+    A command to send reminders for unclaimed and open direct awards.
+
+    The direct awards are streamed in chunks and mailed in batches. After each mail batch the direct awards whose
+    mail went out are moved to the next reminder or deleted right away, so the database is the checkpoint: the
+    direct awards whose mail failed, or those of a run that crashed halfway, are reminded or deleted on the next run
+    while the others are not mailed again. Addresses the mail server refuses for good are not retried, so their
+    direct awards still move on and expire. No transaction is held open while mailing.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Number of direct awards read per query')
 
     def handle(self, *args, **kwargs):
         from directaward.models import DirectAward
-        from mainsite.utils import EmailMessageMaker
-        from mainsite.utils import send_mail
+        from mainsite.utils import BulkMailer
 
         # Prevent MySQLdb._exceptions.OperationalError: (2006, 'MySQL server has gone away')
         connections.close_all()
@@ -29,60 +89,85 @@ class Command(BaseCommand):
         logger.info("Running reminders_direct_awards")
 
         now = timezone.now()
+        chunk_size = kwargs.get('chunk_size') or DEFAULT_CHUNK_SIZE
+        unaccepted = DirectAward.STATUS_UNACCEPTED
+        direct_awards = DirectAward.objects.select_related('badgeclass__issuer__faculty__institution')
+
+        # one mail connection for all reminders, sent in rate limited batches
+        with BulkMailer() as mailer:
+            # We store the reminder number (first reminders sent = 1) to ensure we don't spam the user
+            threshold_days = settings.EXPIRY_DIRECT_AWARDS_REMINDER_THRESHOLD_DAYS.split(",")
+            threshold_days = [int(days.strip()) for days in threshold_days]
+            # We need to process them in reverse order
+            threshold_days.sort(reverse=True)
+            for index, days in enumerate(threshold_days):
+                reminder_cutoff = now + timedelta(days=days)
+                self.stdout.write(
+                    f"Query for direct_awards with reminders={index} and expiration_date__lt {reminder_cutoff}\n")
+                reminders = direct_awards.filter(expiration_date__lt=reminder_cutoff,
+                                                 reminders=index,
+                                                 status=unaccepted)
+                count = reminders.count()
+                # When run as standalone job the logger messages are not outputted
+                self.stdout.write(f"Sending {count} reminder emails for reminder: {index}, threshold: {days}\n")
+                logger.info(f"Sending {count} reminder emails for reminder: {index}, threshold: {days}")
+
+                for chunk in _stream(reminders, chunk_size):
+                    self.send_reminders(chunk, index, mailer)
+
+            expired = direct_awards.filter(expiration_date__lt=now, status=unaccepted)
+            count = expired.count()
+            self.stdout.write(f"Deleting {count} expired direct_awards")
+            logger.info(f"Deleting {count} expired direct_awards")
+
+            deleted = 0
+            for chunk in _stream(expired, chunk_size):
+                deleted += self.delete_expired(chunk, mailer)
+
+        self.stdout.write(f"Direct awards {deleted} deleted!\n")
+        self.stdout.write(f"Sent {mailer.sent} mails in {len(mailer.batches)} batches, {mailer.failed} failed, "
+                          f"{len(mailer.refused_recipients)} refused\n")
+
+    def send_reminders(self, direct_awards, index, mailer):
+        """
+        Sends the reminders of a chunk and moves the direct awards that were mailed in a batch to the next reminder
+        with a single UPDATE per batch
+        """
+        from directaward.models import DirectAward
+        from mainsite.utils import EmailMessageMaker
+
+        for sent in _send_in_batches(mailer, direct_awards, 'Reminder: your edubadge will expire',
+                                     EmailMessageMaker.direct_award_reminder_student_mail):
+            # the direct awards whose mail failed are reminded again on the next run
+            if not sent:
+                continue
+            DirectAward.objects.filter(pk__in=[direct_award.pk for direct_award in sent],
+                                       reminders=index).update(reminders=index + 1)
+            _invalidate_cached_direct_awards(sent)
+
+    def delete_expired(self, direct_awards, mailer):
+        """
+        Tells the recipients of a chunk, then deletes the direct awards that were mailed in a batch with a single
+        DELETE and counts them on their bundles with one UPDATE per batch.
+        :return: the number of direct awards deleted
+        """
+        from directaward.models import DirectAward, DirectAwardBundle
+        from mainsite.utils import EmailMessageMaker
 
-        # We store the reminder number (first reminders sent = 1) to ensure we don't spam the user
-        threshold_days = settings.EXPIRY_DIRECT_AWARDS_REMINDER_THRESHOLD_DAYS.split(",")
-        threshold_days = [int(days.strip()) for days in threshold_days]
-        # We need to process them in reverse order
-        threshold_days.sort(reverse=True)
-        index = 0
-        unaccepted = 'Unaccepted'
-        for days in threshold_days:
-            reminder_cutoff = now + timedelta(days=days)
-            self.stdout.write(
-                f"Query for direct_awards with reminders={index} and expiration_date__lt {reminder_cutoff}\n")
-            direct_awards = DirectAward.objects.filter(expiration_date__lt=reminder_cutoff,
-                                                       reminders=index,
-                                                       status=unaccepted).all()
-            # When run as standalone job the logger messages are not outputted
-            self.stdout.write(
-                f"Sending {len(direct_awards)} reminder emails for reminder: {index}, threshold: {days}\n")
-            logger.info(f"Sending {len(direct_awards)} reminder emails for reminder: {index}, threshold: {days}")
-
-            for direct_award in direct_awards:
-                html_message = EmailMessageMaker.direct_award_reminder_student_mail(direct_award)
-                direct_award.reminders = index + 1
-                _remove_cached_direct_awards(direct_award)
-                try:
-                    direct_award.save()
-                    send_mail(
-                        subject='Reminder: your edubadge will expire',
-                        message=None,
-                        html_message=html_message,
-                        recipient_list=[direct_award.recipient_email]
+        deleted = 0
+        for sent in _send_in_batches(mailer, direct_awards, 'Your edubadge has been deleted',
+                                     EmailMessageMaker.direct_award_expired_student_mail):
+            # the direct awards whose mail failed are deleted on the next run, when the recipients can be told
+            if not sent:
+                continue
+            expired_counts = Counter(direct_award.bundle_id for direct_award in sent if direct_award.bundle_id)
+            with transaction.atomic():
+                DirectAwardBundle.objects.filter(pk__in=list(expired_counts)).update(
+                    direct_award_expired_count=F('direct_award_expired_count') + Case(
+                        *[When(pk=pk, then=Value(count)) for pk, count in expired_counts.items()], default=Value(0)
                     )
-                except IntegrityError:
-                    # Already exists, just skip it
-                    print(f"Skipped duplicate direct award: {direct_award}")
-
-            index += 1
-
-        direct_awards = DirectAward.objects.filter(expiration_date__lt=now,
-                                                   status=unaccepted).all()
-
-        self.stdout.write(f"Deleting {len(direct_awards)} expired direct_awards")
-        logger.info(f"Deleting {len(direct_awards)} expired direct_awards")
-
-        for direct_award in direct_awards:
-            html_message = EmailMessageMaker.direct_award_expired_student_mail(direct_award)
-            _remove_cached_direct_awards(direct_award)
-            bundle = direct_award.bundle
-            bundle.direct_award_expired_count = bundle.direct_award_expired_count + 1
-            bundle.save()
-            direct_award.delete()
-            send_mail(subject='Your edubadge has been deleted',
-                      message=None,
-                      html_message=html_message,
-                      recipient_list=[direct_award.recipient_email])
-
-        self.stdout.write(f"Direct awards {len(direct_awards)} deleted!\n")
+                )
+                DirectAward.objects.filter(pk__in=[direct_award.pk for direct_award in sent]).delete()
+            _invalidate_cached_direct_awards(sent, deleted=True)
+            deleted += len(sent)
+        return deleted
@@ -0,0 +1,37 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from directaward.models import DirectAward, DirectAwardBundle
+from mainsite.tests import BadgrTestCase
+
+
+class TestAwardScheduledDirectAwards(BadgrTestCase):
+
+    def test_award_scheduled_bundles(self):
+        teacher1 = self.setup_teacher()
+        issuer = self.setup_issuer(teacher1)
+        badgeclass = self.setup_badgeclass(issuer)
+        bundle = self.setup_direct_award_bundle(badgeclass=badgeclass, created_by=teacher1,
+                                                status=DirectAwardBundle.STATUS_SCHEDULED,
+                                                scheduled_at=timezone.now() - timedelta(hours=1))
+        for eppn in ['eppn_1', 'eppn_2', 'duplicate_eppn']:
+            self.setup_direct_award(badgeclass, bundle=bundle, eppn=eppn, status=DirectAward.STATUS_SCHEDULED)
+        self.setup_direct_award(badgeclass, eppn='duplicate_eppn')
+        # fill the cache, the command must invalidate it
+        self.assertEqual(len([da for da in badgeclass.cached_direct_awards() if da.status == 'Scheduled']), 3)
+
+        out = StringIO()
+        call_command('award_scheduled_direct_awards', '--dry-run', stdout=out)
+        self.assertIn('Would award 2 direct awards of 1 bundles, skipped 1 duplicates', out.getvalue())
+        self.assertEqual(DirectAwardBundle.objects.get(pk=bundle.pk).status, DirectAwardBundle.STATUS_SCHEDULED)
+
+        call_command('award_scheduled_direct_awards', '--batch-size', '10', stdout=out)
+        bundle = DirectAwardBundle.objects.get(pk=bundle.pk)
+        self.assertEqual(bundle.status, DirectAwardBundle.STATUS_ACTIVE)
+        self.assertIsNone(bundle.scheduled_at)
+        statuses = {da.eppn: da.status for da in badgeclass.cached_direct_awards() if da.bundle_id == bundle.pk}
+        self.assertEqual(statuses, {'eppn_1': 'Unaccepted', 'eppn_2': 'Unaccepted', 'duplicate_eppn': 'Scheduled'})
+        self.assertEqual(bundle.notification_sent_count, 2)
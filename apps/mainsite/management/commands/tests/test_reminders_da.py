@@ -1,11 +1,13 @@
 from datetime import timedelta
 from io import StringIO
+from smtplib import SMTPRecipientsRefused
 from unittest.mock import Mock, patch
 
 from django.core import mail
 from django.core.management import call_command
 from django.core.management.base import OutputWrapper
 from django.utils import timezone
+from directaward.models import DirectAward, DirectAwardBundle
 from mainsite.tests import BadgrTestCase
 
 
@@ -141,6 +143,101 @@ class TestDirectAwardsReminderHandler(BadgrTestCase):
         email = mail.outbox[0]
         self.assertEqual(email.subject, 'Reminder: your edubadge will expire')
 
+    @patch('apps.mainsite.management.commands.reminders_direct_awards.connections')
+    @patch('apps.mainsite.management.commands.reminders_direct_awards.settings')
+    def test_rerun_does_not_resend_reminders(self, mock_settings, mock_connections):
+        mail.outbox = []
+        mock_settings.EXPIRY_DIRECT_AWARDS_REMINDER_THRESHOLD_DAYS = '14, 42'
+
+        now = timezone.now()
+        teacher1 = self.setup_teacher(authenticate=False)
+        issuer = self.setup_issuer(teacher1)
+        badgeclass = self.setup_badgeclass(issuer)
+        for i in range(3):
+            self.setup_direct_award(
+                badgeclass=badgeclass, created_by=teacher1, eppn=f'eppn_{i}', expiration_date=now + timedelta(days=30)
+            )
+        expired = self.setup_direct_award(
+            badgeclass=badgeclass, created_by=teacher1, eppn='eppn_expired',
+            expiration_date=now + timedelta(days=-1), reminders=2,
+        )
+
+        self.command_instance.handle(chunk_size=2)
+        self.assertEqual(len(mail.outbox), 4)
+        bundle = DirectAwardBundle.objects.get(pk=expired.bundle_id)
+        self.assertEqual(bundle.direct_award_expired_count, 1)
+        self.assertFalse(DirectAward.objects.filter(pk=expired.pk).exists())
+
+        # the reminders and deletes are committed after their mails, a second run has nothing left to do
+        self.command_instance.handle(chunk_size=2)
+        self.assertEqual(len(mail.outbox), 4)
+
+    @patch('apps.mainsite.management.commands.reminders_direct_awards.connections')
+    @patch('apps.mainsite.management.commands.reminders_direct_awards.settings')
+    def test_failed_mail_reminded_again(self, mock_settings, mock_connections):
+        from django.core.mail.backends.locmem import EmailBackend
+
+        mail.outbox = []
+        mock_settings.EXPIRY_DIRECT_AWARDS_REMINDER_THRESHOLD_DAYS = '42'
+
+        now = timezone.now()
+        teacher1 = self.setup_teacher(authenticate=False)
+        issuer = self.setup_issuer(teacher1)
+        badgeclass = self.setup_badgeclass(issuer)
+        direct_awards = [
+            self.setup_direct_award(badgeclass=badgeclass, created_by=teacher1, recipient_email=f'{i}@example.com',
+                                    expiration_date=now + timedelta(days=30))
+            for i in range(3)
+        ]
+        send_messages = EmailBackend.send_messages
+
+        def failing_send_messages(backend, messages):
+            if any('1@example.com' in message.to for message in messages):
+                raise ConnectionError('SMTP down')
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, 'send_messages', failing_send_messages):
+            self.command_instance.handle()
+        self.assertEqual(len(mail.outbox), 2)
+        # only the direct award whose mail failed is reminded again, its batch mates move on
+        reminders = {direct_award.pk: direct_award.reminders for direct_award in DirectAward.objects.all()}
+        self.assertEqual([reminders[direct_award.pk] for direct_award in direct_awards], [1, 0, 1])
+        self.command_instance.handle()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[2].to, ['1@example.com'])
+
+    @patch('apps.mainsite.management.commands.reminders_direct_awards.connections')
+    @patch('apps.mainsite.management.commands.reminders_direct_awards.settings')
+    def test_expired_deleted_when_address_refused(self, mock_settings, mock_connections):
+        from django.core.mail.backends.locmem import EmailBackend
+
+        mail.outbox = []
+        mock_settings.EXPIRY_DIRECT_AWARDS_REMINDER_THRESHOLD_DAYS = '42'
+
+        now = timezone.now()
+        teacher1 = self.setup_teacher(authenticate=False)
+        issuer = self.setup_issuer(teacher1)
+        badgeclass = self.setup_badgeclass(issuer)
+        direct_awards = [
+            self.setup_direct_award(badgeclass=badgeclass, created_by=teacher1, recipient_email=email,
+                                    expiration_date=now + timedelta(days=-1), reminders=1)
+            for email in ('gone@example.com', 'here@example.com')
+        ]
+        send_messages = EmailBackend.send_messages
+
+        def refusing_send_messages(backend, messages):
+            if any('gone@example.com' in message.to for message in messages):
+                raise SMTPRecipientsRefused({'gone@example.com': (550, b'No such user')})
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, 'send_messages', refusing_send_messages):
+            self.command_instance.handle()
+        self.assertEqual([message.to for message in mail.outbox], [['here@example.com']])
+        # the refused address is not retried, so its direct award is deleted along with its batch mate
+        self.assertFalse(
+            DirectAward.objects.filter(pk__in=[direct_award.pk for direct_award in direct_awards]).exists()
+        )
+
     @classmethod
     def tearDownClass(cls):
         call_command('flush', interactive=False)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.13 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainsite', '0022_auto_20240719_1627'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_name', models.CharField(max_length=255)),
+                ('source_hash', models.CharField(max_length=64)),
+                ('version', models.CharField(max_length=16)),
+                ('fmt', models.CharField(max_length=16)),
+                ('name', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('source_name', 'version', 'fmt')},
+                'indexes': [models.Index(fields=['source_hash', 'version', 'fmt'], name='mainsite_derivative_hash_idx')],
+            },
+        ),
+    ]
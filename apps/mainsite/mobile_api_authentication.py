@@ -1,15 +1,12 @@
 import logging
-import urllib.error
-import urllib.parse
-import urllib.request
 
-import requests
 from allauth.socialaccount.models import SocialAccount
 from django.conf import settings
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
 from mainsite.exceptions import TermsNotAcceptedException
+from mainsite.introspection import introspect_token
 
 GENERAL_TERMS_PATH = '/mobile/api/accept-general-terms'
 PROFILE_PATH = '/mobile/api/profile'
@@ -51,17 +48,11 @@ class MobileAPIAuthentication(BaseAuthentication):
             logger.info('MobileAPIAuthentication: return None as no bearer_token in authorization')
             return None
 
-        headers = {'Accept': 'application/json', 'Content-Type': 'application/x-www-form-urlencoded'}
-        url = f'{settings.EDUID_PROVIDER_URL}/introspect'
-        auth = (settings.OIDC_RS_ENTITY_ID, settings.OIDC_RS_SECRET)
-        response = requests.post(
-            url, data=urllib.parse.urlencode({'token': bearer_token}), auth=auth, headers=headers, timeout=60
-        )
-        if response.status_code != 200:
-            logger.info(f'MobileAPIAuthentication bad response from oidcng: {response.status_code} {response.json()}')
+        introspect_json = introspect_token(bearer_token)
+        if introspect_json is None:
+            logger.info('MobileAPIAuthentication bad response from oidcng')
             raise AuthenticationFailed('Invalid authentication credentials.')
 
-        introspect_json = response.json()
         logger.info(f'MobileAPIAuthentication introspect {introspect_json}')
 
         if not introspect_json['active']:
@@ -73,18 +64,6 @@ class MobileAPIAuthentication(BaseAuthentication):
             )
             raise AuthenticationFailed('Invalid authentication credentials.')
 
-        introspect_json = response.json()
-        logger.info(f'MobileAPIAuthentication introspect {introspect_json}')
-
-        if not introspect_json['active']:
-            logger.info(f'MobileAPIAuthentication inactive introspect_json {introspect_json}')
-            return None
-        if settings.EDUID_IDENTIFIER not in introspect_json:
-            logger.info(
-                f'MobileAPIAuthentication return None as no {settings.EDUID_IDENTIFIER} in introspect_json {introspect_json}'
-            )
-            return None
-
         identifier_ = introspect_json[settings.EDUID_IDENTIFIER]
         social_account = SocialAccount.objects.filter(uid=identifier_).first()
         login_endpoint = request.path == API_LOGIN_PATH
@@ -233,7 +233,7 @@ class ArchiveMixin(CacheModel):
         self.save()
         if publish_parent:
             try:
-                self.parent.publish()
+                self.parent.republish()
             except AttributeError:  # no parent
                 pass
 
@@ -254,3 +254,20 @@ class SystemNotification(models.Model):
     notification_type = models.CharField(
         max_length=254, choices=NOTIFICATION_TYPE_CHOICES, blank=False, null=False, default=NOTIFICATION_TYPE_INFO
     )
+
+
+class ImageDerivative(models.Model):
+    """
+    The manifest of the png renderings of uploaded images served by ImagePropertyDetailView, one row per source
+    image, CAIROSVG_VERSION_SUFFIX and format. Images with the same content share their derivatives.
+    """
+    source_name = models.CharField(max_length=255)
+    source_hash = models.CharField(max_length=64)
+    version = models.CharField(max_length=16)
+    fmt = models.CharField(max_length=16)
+    name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('source_name', 'version', 'fmt')
+        indexes = [models.Index(fields=['source_hash', 'version', 'fmt'], name='mainsite_derivative_hash_idx')]
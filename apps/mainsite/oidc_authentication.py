@@ -1,15 +1,11 @@
 import logging
-import urllib.error
-import urllib.parse
-import urllib.request
 
-import requests
-from django.conf import settings
 from django.core.exceptions import BadRequest
 from rest_framework.authentication import BaseAuthentication
 
 from badgeuser.models import BadgeUser
 from institution.models import Institution
+from mainsite.introspection import introspect_token
 
 
 class OIDCAuthentication(BaseAuthentication):
@@ -35,16 +31,11 @@ class OIDCAuthentication(BaseAuthentication):
             logger.info('OIDCAuthentication no bearer_token')
             return None
 
-        payload = {'token': bearer_token}
-        headers = {'Accept': 'application/json', 'Content-Type': 'application/x-www-form-urlencoded'}
-        url = f'{settings.EDUID_PROVIDER_URL}/introspect'
-        auth = (settings.OIDC_RS_ENTITY_ID, settings.OIDC_RS_SECRET)
-        response = requests.post(url, data=urllib.parse.urlencode(payload), auth=auth, headers=headers, timeout=60)
-        if response.status_code != 200:
-            logger.info(f'OIDCAuthentication bad response {response.status_code} {response.json()}')
+        introspect_json = introspect_token(bearer_token)
+        if introspect_json is None:
+            logger.info('OIDCAuthentication bad response from introspection')
             return None
 
-        introspect_json = response.json()
         logger.info(f'OIDCAuthentication introspect {introspect_json}')
 
         if not introspect_json['active']:
@@ -0,0 +1,60 @@
+import hashlib
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from cachemodel.tags import get_tagged, set_tagged
+
+# bump when the rendering of the public Open Badges documents changes, the cached documents are stored forever
+PUBLIC_JSON_CACHE_VERSION = 1
+
+
+class PublicJsonMixin(object):
+    """
+    For the models rendered by the public Open Badges endpoints. The rendered documents carry the public json tag
+    of every object they contain data of. That tag is only invalidated when the object itself (or one of the
+    extensions, alignments, evidence or endorsements in its document) changes, not when an object below it changes,
+    so issuing an assertion does not invalidate the documents of its badgeclass, issuer and institution.
+    """
+
+    @classmethod
+    def public_json_tag_for(cls, pk):
+        return 'publicjson__{}'.format(cls.cache_tag_for(pk))
+
+    @property
+    def public_json_tag(self):
+        return self.public_json_tag_for(self.pk)
+
+    def get_public_json_objects(self):
+        """:return: the objects whose data is in the public document of this object, override to add the parents"""
+        return [self]
+
+    def get_changed_cache_tags(self):
+        return super(PublicJsonMixin, self).get_changed_cache_tags() + [self.public_json_tag]
+
+
+def public_json_tag(obj):
+    return obj.public_json_tag if isinstance(obj, PublicJsonMixin) else obj.cache_tag
+
+
+def cached_public_json(key, objects, render):
+    """
+    The public document of key, rendered once until one of the objects changes.
+    :param objects: the objects whose data is in the document
+    :param render: callable returning the document
+    :return: dictionary with the json, its etag and its last_modified timestamp
+    """
+    key = 'publicjson__{}__{}'.format(PUBLIC_JSON_CACHE_VERSION, key)
+    tags = sorted({public_json_tag(obj) for obj in objects})
+    entry, versions = get_tagged(key, tags)
+    if entry is not None:
+        return entry.data
+    document = render()
+    content = json.dumps(document, cls=JSONEncoder, sort_keys=True)
+    updated = [obj.updated_at for obj in objects if getattr(obj, 'updated_at', None) is not None]
+    data = {
+        'json': document,
+        'etag': hashlib.sha256(content.encode('utf-8')).hexdigest()[:32],
+        'last_modified': max(updated).timestamp() if updated else None,
+    }
+    return set_tagged(key, data, tags, versions)
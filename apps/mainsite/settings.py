@@ -87,6 +87,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django_prometheus.middleware.PrometheusBeforeMiddleware',
+    'cachemodel.middleware.LocalCacheMiddleware',
+    'staff.middleware.PermissionResolverMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'lti13.middleware.SameSiteMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -209,6 +211,10 @@ SURFCONEXT_DOMAIN_URL = os.environ.get('SURFCONEXT_DOMAIN_URL', 'https://connect
 EDUID_PROVIDER_URL = os.environ['EDUID_PROVIDER_URL']
 # EDUID_REGISTRATION_URL = os.environ['EDUID_REGISTRATION_URL']
 EDUID_API_BASE_URL = os.environ.get('EDUID_API_BASE_URL', 'https://login.test.eduid.nl')
+# seconds an introspected eduID token is trusted without asking eduID again (never beyond its expiry), revoking a
+# token takes effect after at most this long. Inactive tokens are remembered for the negative timeout
+EDUID_INTROSPECTION_CACHE_TIMEOUT = int(os.environ.get('EDUID_INTROSPECTION_CACHE_TIMEOUT', 60))
+EDUID_INTROSPECTION_NEGATIVE_CACHE_TIMEOUT = int(os.environ.get('EDUID_INTROSPECTION_NEGATIVE_CACHE_TIMEOUT', 10))
 EDUID_IDENTIFIER = os.environ.get('EDUID_IDENTIFIER', 'eduid')
 
 EXPIRY_DIRECT_AWARDS_REMINDER_THRESHOLD_DAYS = str(
@@ -216,6 +222,9 @@ EXPIRY_DIRECT_AWARDS_REMINDER_THRESHOLD_DAYS = str(
 )
 EXPIRY_DIRECT_AWARDS_DELETION_THRESHOLD_DAYS = int(os.environ.get('EXPIRY_DIRECT_AWARDS_DELETION_THRESHOLD_DAYS', 82))
 DIRECT_AWARDS_DELETION_THRESHOLD_DAYS = int(os.environ.get('DIRECT_AWARDS_DELETION_THRESHOLD_DAYS', 30))
+DIRECT_AWARD_BULK_BATCH_SIZE = int(os.environ.get('DIRECT_AWARD_BULK_BATCH_SIZE', 500))
+# recipients of a new direct award bundle notified per notification task
+DIRECT_AWARD_NOTIFICATION_CHUNK_SIZE = int(os.environ.get('DIRECT_AWARD_NOTIFICATION_CHUNK_SIZE', 100))
 
 OB3_AGENT_URL_SPHEREON = os.environ.get('OB3_AGENT_URL_SPHEREON', '')
 OB3_AGENT_AUTHZ_TOKEN_SPHEREON = os.environ.get('OB3_AGENT_AUTHZ_TOKEN_SPHEREON', '')
@@ -397,6 +406,14 @@ CACHES = {
         'LOCATION': os.environ.get('MEMCACHED', '0.0.0.0:11211'),
     }
 }
+# Max number of entries in the request scoped in-process cache in front of memcached
+CACHEMODEL_LOCAL_CACHE_SIZE = int(os.environ.get('CACHEMODEL_LOCAL_CACHE_SIZE', 1000))
+# Seconds a worker may hold the lease to recompute a cache entry, and seconds other workers wait for it at most
+CACHEMODEL_LEASE_TIMEOUT = int(os.environ.get('CACHEMODEL_LEASE_TIMEOUT', 30))
+CACHEMODEL_LEASE_WAIT = float(os.environ.get('CACHEMODEL_LEASE_WAIT', 1.0))
+# Seconds after which the cached snapshots of the public catalog are rebuilt, and the number of rows per cache entry
+SNAPSHOT_MAX_AGE = int(os.environ.get('SNAPSHOT_MAX_AGE', 300))
+SNAPSHOT_CHUNK_SIZE = int(os.environ.get('SNAPSHOT_CHUNK_SIZE', 200))
 
 ##
 #
@@ -553,9 +570,15 @@ import certifi
 
 os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
 
-# default celery to always_eager
-CELERY_ALWAYS_EAGER = True
-BROKER_URL = 'amqp://localhost:5672/'
+# The notification and image tasks run on Celery workers, see "Celery workers" in the README. Set
+# CELERY_ALWAYS_EAGER=1 only where no broker and workers run, e.g. local development: the tasks then run inside the
+# request that queues them.
+CELERY_ALWAYS_EAGER = legacy_boolean_parsing('CELERY_ALWAYS_EAGER', '0')
+BROKER_URL = os.environ.get('BROKER_URL', 'amqp://localhost:5672/')
+# queue of the tasks that mail and push notifications, run a worker with -Q notifications
+NOTIFICATION_TASK_QUEUE_NAME = os.environ.get('NOTIFICATION_TASK_QUEUE_NAME', 'notifications')
+# queue of the tasks that render the image derivatives, run a worker with -Q images
+IMAGE_TASK_QUEUE_NAME = os.environ.get('IMAGE_TASK_QUEUE_NAME', 'images')
 CELERY_RESULT_BACKEND = None
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULTS_SERIALIZER = 'json'
@@ -572,6 +595,19 @@ SESSION_COOKIE_SAMESITE = None
 
 GRAPHENE = {'SCHEMA': 'apps.mainsite.schema.schema'}
 
+# GraphQL operations nesting deeper, or whose estimated number of resolved fields is higher, are rejected
+GRAPHQL_MAX_DEPTH = int(os.environ.get('GRAPHQL_MAX_DEPTH', 10))
+GRAPHQL_MAX_COST = int(os.environ.get('GRAPHQL_MAX_COST', 100000))
+# the estimated length of a list field in the cost of an operation
+GRAPHQL_LIST_MULTIPLIER = 10
+# Automatic persisted queries: a JSON manifest with the known queries of the frontend by their sha256 hash, and
+# whether only those are allowed. Valid queries registered by clients are kept in the cache for the timeout in seconds
+GRAPHQL_PERSISTED_QUERIES_MANIFEST = os.environ.get('GRAPHQL_PERSISTED_QUERIES_MANIFEST', None)
+GRAPHQL_PERSISTED_QUERIES_ONLY = legacy_boolean_parsing('GRAPHQL_PERSISTED_QUERIES_ONLY', '0')
+GRAPHQL_PERSISTED_QUERIES_TIMEOUT = int(os.environ.get('GRAPHQL_PERSISTED_QUERIES_TIMEOUT', 60 * 60 * 24))
+# the number of parsed and validated GraphQL documents kept in memory per process
+GRAPHQL_DOCUMENT_CACHE_SIZE = 500
+
 # Database
 DATABASES = {
     'default': {
@@ -595,6 +631,9 @@ EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.conso
 EMAIL_HOST = os.environ['EMAIL_HOST']
 EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
 DEFAULT_FROM_EMAIL = os.environ['DEFAULT_FROM_EMAIL']
+# BulkMailer: messages per SMTP batch and the maximum messages per second, 0 for no limit
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 100))
+EMAIL_RATE_LIMIT = float(os.environ.get('EMAIL_RATE_LIMIT', 0))
 
 # Seeds
 ALLOW_SEEDS = legacy_boolean_parsing('ALLOW_SEEDS', '0')
@@ -656,3 +695,5 @@ API_PROXY = {'HOST': OB3_AGENT_URL_UNIME}
 
 # FCM Django (Tell Firebase Admin SDK where the service account JSON is)
 FIREBASE_JSON_FILE = os.environ.get("FIREBASE_JSON_FILE")
+# the client sending the push notifications, anything with the send_each of firebase_admin.messaging
+PUSH_NOTIFICATION_CLIENT = os.environ.get('PUSH_NOTIFICATION_CLIENT', 'firebase_admin.messaging')
@@ -7,3 +7,10 @@ from .settings import *
 LOGGING = {}
 DISABLE_AUTH_SIGNALS = True
 ENABLE_EXTENSION_VALIDATION = False
+
+# run the notification tasks synchronously
+CELERY_ALWAYS_EAGER = True
+CELERY_EAGER_PROPAGATES_EXCEPTIONS = True
+
+# keep the push notifications in memory
+PUSH_NOTIFICATION_CLIENT = 'mobile_api.push_notifications.local_messaging_client'
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from cachemodel import CACHE_FOREVER_TIMEOUT
+from cachemodel.lease import acquire_lease, record_stale_served, release_lease, wait_for
+from cachemodel.tags import get_tagged, invalidate_tags, set_tagged
+
+# the cache tag of the public catalog, invalidated by every change of a model shown in it
+CATALOG_CACHE_TAG = 'catalog'
+
+# name -> Snapshot, for the rebuild_snapshots command
+snapshots = {}
+
+
+class Snapshot(object):
+    """
+    A serialized listing stored in the cache in chunks of settings.SNAPSHOT_CHUNK_SIZE rows, so that anonymous
+    requests are served without queries and a page only fetches the chunks it shows.
+    The header of a snapshot carries the ETag of its content and is rebuilt when one of the tags of the snapshot
+    is invalidated or when it is older than settings.SNAPSHOT_MAX_AGE seconds.
+
+        catalog_snapshot = Snapshot('catalog', build=lambda: list(BadgeClass.objects.values('name')))
+        header = catalog_snapshot.get()
+        rows = catalog_snapshot.rows(header, 0, 20)
+    """
+
+    def __init__(self, name, build, tags=(CATALOG_CACHE_TAG,)):
+        """
+        :param build: callable returning the rows of the listing
+        """
+        self.name = name
+        self.build = build
+        self.tags = list(tags)
+        snapshots[name] = self
+
+    @property
+    def key(self):
+        return 'snapshot__{}'.format(self.name)
+
+    def chunk_key(self, etag, index):
+        return '{}__{}__{}'.format(self.key, etag, index)
+
+    def rebuild(self, versions=None):
+        """
+        Builds the rows, stores them in chunks keyed by their ETag and then the header pointing to them
+        :return: a tuple of the header and the rows
+        """
+        # the rows as the API renders them, so a snapshot read from the cache renders identically
+        content = json.dumps(self.build(), cls=JSONEncoder, sort_keys=True)
+        rows = json.loads(content)
+        etag = hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]
+        chunk_size = settings.SNAPSHOT_CHUNK_SIZE
+        cache.set_many(
+            {
+                self.chunk_key(etag, offset // chunk_size): rows[offset:offset + chunk_size]
+                for offset in range(0, len(rows), chunk_size)
+            },
+            CACHE_FOREVER_TIMEOUT,
+        )
+        header = {'etag': etag, 'count': len(rows), 'chunk_size': chunk_size, 'built_at': time.time()}
+        set_tagged(self.key, header, self.tags, versions)
+        return header, rows
+
+    def get(self):
+        """
+        :return: the header of the current snapshot: etag, count, chunk_size and built_at. Only one worker rebuilds
+        a missing or outdated snapshot, the others keep serving the outdated one or wait for it.
+        """
+        stale = {}
+        entry, versions = get_tagged(self.key, self.tags, stale)
+        if entry is not None and time.time() - entry.data['built_at'] < settings.SNAPSHOT_MAX_AGE:
+            return entry.data
+        outdated = entry or stale.get(self.key)
+        lease = acquire_lease(self.key)
+        if lease is None:
+            if outdated is not None:
+                record_stale_served(self.key)
+                return outdated.data
+            header = wait_for(self.key, lambda: get_tagged(self.key, self.tags)[0])
+            if header is not None:
+                return header.data
+        try:
+            return self.rebuild(versions)[0]
+        finally:
+            release_lease(self.key, lease)
+
+    def rows(self, header, start=0, stop=None):
+        """
+        :return: the rows start:stop of the snapshot of header, with one get_many for the chunks they are in
+        """
+        stop = header['count'] if stop is None else min(stop, header['count'])
+        if start >= stop:
+            return []
+        chunk_size = header['chunk_size']
+        first = start // chunk_size
+        keys = [self.chunk_key(header['etag'], index) for index in range(first, (stop - 1) // chunk_size + 1)]
+        chunks = cache.get_many(keys)
+        if len(chunks) < len(keys):
+            # a chunk has been evicted
+            return self.rebuild()[1][start:stop]
+        rows = [row for key in keys for row in chunks[key]]
+        return rows[start - first * chunk_size:stop - first * chunk_size]
+
+    def invalidate(self):
+        invalidate_tags(self.tags)
+
+
+class SnapshotRows(object):
+    """The rows of a snapshot as a sequence, so that a paginator only fetches the chunks of the requested page"""
+
+    def __init__(self, snapshot, header):
+        self.snapshot = snapshot
+        self.header = header
+
+    def __len__(self):
+        return self.header['count']
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return self.snapshot.rows(self.header, start, stop)[::step]
+        return self.snapshot.rows(self.header, index, index + 1)[0]
+
+
+class CatalogMixin(object):
+    """For the models shown in the public catalog: saving or deleting them invalidates the catalog snapshots"""
+
+    def get_changed_cache_tags(self):
+        return super(CatalogMixin, self).get_changed_cache_tags() + [CATALOG_CACHE_TAG]
+
+
+def etag_matches(request, etag):
+    """If-None-Match uses the weak comparison, W/ prefixes are ignored"""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(if_none_match)]
+    return '*' in etags or quote_etag(etag) in etags
+
+
+def not_modified_since(request, last_modified):
+    """If-Modified-Since is only used when the request has no If-None-Match"""
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if last_modified is None or not if_modified_since or request.META.get('HTTP_IF_NONE_MATCH'):
+        return False
+    if_modified_since = parse_http_date_safe(if_modified_since)
+    return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+
+def conditional_response(request, etag, data, last_modified=None):
+    """
+    A response with a strong ETag, or a 304 without body when the client already has this representation.
+    :param data: callable returning the data of the response, only called when the response has a body
+    :param last_modified: optional timestamp of the last change of the data, sent as Last-Modified
+    """
+    if etag_matches(request, etag) or not_modified_since(request, last_modified):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data(), status=status.HTTP_200_OK)
+    response['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,32 @@
+import logging
+
+from django.apps import apps
+from django.conf import settings
+
+from mainsite.celery import IdempotentTask, app
+from mainsite.derivatives import generate_derivatives
+
+logger = logging.getLogger('Badgr.Debug')
+
+image_task_queue_name = getattr(settings, 'IMAGE_TASK_QUEUE_NAME', 'images')
+
+
+@app.task(bind=True, base=IdempotentTask, queue=image_task_queue_name)
+def generate_image_derivatives(self, model_label, pk, fields):
+    """
+    Renders the derivatives of the images of an object
+    :param model_label: app_label.ModelName of the object
+    :param fields: names of its image fields
+    """
+    obj = apps.get_model(model_label).objects.filter(pk=pk).first()
+    if obj is None:
+        return
+    for field in fields:
+        image = getattr(obj, field)
+        if not image:
+            continue
+        try:
+            generate_derivatives(image.name, image.storage)
+        except Exception:
+            # left to the first request for the image, which renders it or falls back to the original
+            logger.exception('Failed to render the derivatives of {}'.format(image.name))
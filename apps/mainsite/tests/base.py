@@ -13,6 +13,7 @@ from graphene.test import Client as GrapheneClient
 from institution.models import Faculty, Institution
 from issuer.models import BadgeClass, Issuer
 from mainsite import TOP_DIR
+from mainsite.graphql_loaders import SiblingLoaderMiddleware
 from mainsite.models import BadgrApp
 from mainsite.schema import schema
 from mainsite.utils import resize_image
@@ -36,7 +37,7 @@ def string_randomiser(name, prefix=False):
 class SetupHelper(object):
     def graphene_post(self, user, query):
         client = GrapheneClient(schema)
-        return client.execute(query, context_value=GrapheneMockContext(user))
+        return client.execute(query, context_value=GrapheneMockContext(user), middleware=[SiblingLoaderMiddleware()])
 
     def get_testfiles_path(self, *args):
         return os.path.join(TOP_DIR, 'apps', 'issuer', 'testfiles', *args)
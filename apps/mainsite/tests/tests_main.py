@@ -1,4 +1,27 @@
+import hashlib
+import json
+import tempfile
+import time
+from smtplib import SMTPRecipientsRefused
+from unittest.mock import Mock, patch
+
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
+from django.urls import reverse
+from graphql import parse, validate
+
+from mainsite.derivatives import generate_derivatives
+from mainsite.graphql_cost import QueryCostValidationRule, estimate_cost
+from mainsite.graphql_persisted import document_cache, persisted_query_cache_key
+from mainsite.introspection import introspect_token
+from mainsite.models import ImageDerivative
+from mainsite.schema import schema
 from mainsite.tests import BadgrTestCase
+from mainsite.utils import BulkMailer
+from staff import resolver
 
 
 class MainGrapheneTest(BadgrTestCase):
@@ -47,3 +70,239 @@ class MainGrapheneTest(BadgrTestCase):
                                    response['data']['badgeClass']['assertionsPaginated']['edges']]
         self.assertEqual(assertions_entity_ids_2.__len__(), 3)
         self.assertFalse(all(entity_id in assertions_entity_ids_1 for entity_id in assertions_entity_ids_2))
+
+    def test_dashboard_query_count_independent_of_badgeclasses(self):
+        teacher1 = self.setup_teacher(authenticate=True)
+        self.setup_staff_membership(teacher1, teacher1.institution, may_read=True, may_award=True)
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(faculty=faculty, created_by=teacher1)
+        student = self.setup_student(affiliated_institutions=[teacher1.institution])
+        query = 'query foo{' \
+                    'badgeClasses { '\
+                        'entityId ' \
+                        'name ' \
+                        'assertionsCount ' \
+                        'issuer { entityId } ' \
+                        'badgeAssertions { entityId } ' \
+                        'enrollments { entityId } ' \
+                        'directAwards { entityId } ' \
+                        'pendingEnrollmentCount ' \
+                        'permissions { mayAward } ' \
+                        'staff { mayRead }}}'
+
+        def count_queries():
+            cache.clear()
+            resolver.activate()
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.graphene_post(teacher1, query)
+            finally:
+                resolver.deactivate()
+            self.assertIsNone(response.get('errors'))
+            return len(queries), response['data']['badgeClasses']
+
+        for _ in range(2):
+            badgeclass = self.setup_badgeclass(issuer=issuer)
+            self.setup_assertion(recipient=student, badgeclass=badgeclass, created_by=teacher1)
+            self.setup_direct_award(badgeclass)
+        few, badgeclasses = count_queries()
+        self.assertEqual(len(badgeclasses), 2)
+        for _ in range(8):
+            badgeclass = self.setup_badgeclass(issuer=issuer)
+            self.setup_assertion(recipient=student, badgeclass=badgeclass, created_by=teacher1)
+            self.setup_direct_award(badgeclass)
+        many, badgeclasses = count_queries()
+        self.assertEqual(len(badgeclasses), 10)
+        self.assertTrue(all(len(badgeclass['badgeAssertions']) == 1 for badgeclass in badgeclasses))
+        self.assertEqual(many, few)
+
+    @override_settings(GRAPHQL_MAX_DEPTH=5, GRAPHQL_MAX_COST=1000, GRAPHQL_LIST_MULTIPLIER=10)
+    def test_query_cost_limits(self):
+        def errors(query):
+            return [error.message for error in validate(schema.graphql_schema, parse(query), [QueryCostValidationRule])]
+
+        dashboard = 'query dashboard { badgeClasses { entityId name badgeAssertions { entityId } } }'
+        # one list of 10 badgeclasses with 2 fields, each with a list of 10 assertions
+        self.assertEqual(estimate_cost(schema.graphql_schema, parse(dashboard)), {'dashboard': (2, 131)})
+        self.assertEqual(errors(dashboard), [])
+        paginated = 'query page { badgeClass(id: "1") { assertionsPaginated(first: 2) { edges { node { entityId }}}}}'
+        self.assertEqual(estimate_cost(schema.graphql_schema, parse(paginated)), {'page': (4, 8)})
+        nested = 'query nested { badgeClasses { issuer { badgeclasses { badgeAssertions { entityId } } } } }'
+        self.assertEqual(errors(nested), ["'nested' has an estimated cost of 1121, the maximum is 1000."])
+        deep = 'query deep { badgeClass(id: "1") { ' + 'issuer { faculty { institution { faculties { ' \
+               'issuers { entityId }}}}}}}'
+        self.assertEqual(errors(deep), ["'deep' exceeds the maximum operation depth of 5."])
+
+    def test_invalid_query_rejected(self):
+        # the rules of the spec run along with the cost rule
+        response = self.client.post('/graphql', json.dumps({'query': 'query invalid { noSuchField }'}),
+                                    content_type='application/json').json()
+        self.assertIsNone(response.get('data'))
+        self.assertEqual(response['errors'][0]['message'], "Cannot query field 'noSuchField' on type 'Query'.")
+
+    def test_persisted_queries(self):
+        query = 'query institutions { publicInstitutions { entityId } }'
+        sha = hashlib.sha256(query.encode('utf-8')).hexdigest()
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': sha}}
+
+        def post(data):
+            return self.client.post('/graphql', json.dumps(data), content_type='application/json').json()
+
+        cache.clear()
+        document_cache.clear()
+        self.assertEqual(post({'extensions': extensions})['errors'][0]['message'], 'PersistedQueryNotFound')
+        self.assertEqual(post({'query': 'query other { publicInstitutions { name } }', 'extensions': extensions})
+                         ['errors'][0]['message'], 'provided sha does not match query')
+        # queries that fail the validation are not registered
+        invalid = 'query invalid { noSuchField }'
+        invalid_sha = hashlib.sha256(invalid.encode('utf-8')).hexdigest()
+        invalid_extensions = {'persistedQuery': {'version': 1, 'sha256Hash': invalid_sha}}
+        self.assertEqual(post({'query': invalid, 'extensions': invalid_extensions})['errors'][0]['message'],
+                         "Cannot query field 'noSuchField' on type 'Query'.")
+        self.assertIsNone(cache.get(persisted_query_cache_key(invalid_sha)))
+        self.assertIsNone(document_cache.get(invalid_sha))
+        data = post({'query': query, 'extensions': extensions})['data']
+        self.assertIn('publicInstitutions', data)
+        # the registered query is executed from its hash, without parsing and validating it again
+        with patch('mainsite.graphql_view.parse') as parse_query:
+            self.assertEqual(post({'extensions': extensions})['data'], data)
+        parse_query.assert_not_called()
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as manifest:
+            json.dump({sha: query}, manifest)
+            manifest.flush()
+            with override_settings(GRAPHQL_PERSISTED_QUERIES_ONLY=True,
+                                   GRAPHQL_PERSISTED_QUERIES_MANIFEST=manifest.name):
+                self.assertEqual(post({'query': query})['data'], data)
+                self.assertEqual(post({'query': '{ publicInstitutions { name } }'})['errors'][0]['message'],
+                                 'Only persisted queries are allowed')
+
+
+class IntrospectionCacheTest(BadgrTestCase):
+
+    def introspection_response(self, status_code=200, **introspect_json):
+        return Mock(status_code=status_code, json=Mock(return_value=introspect_json), text='')
+
+    def test_introspection_cached_until_expiry(self):
+        cache.clear()
+        active = self.introspection_response(active=True, email='student@example.com', exp=time.time() + 3600)
+        with patch('mainsite.introspection.requests.post', return_value=active) as post:
+            for _ in range(3):
+                self.assertEqual(introspect_token('token')['email'], 'student@example.com')
+            self.assertEqual(post.call_count, 1)
+            # a token that is about to expire is not cached beyond its expiry
+            expired = self.introspection_response(active=True, email='student@example.com', exp=time.time() - 1)
+            post.return_value = expired
+            introspect_token('expiring token')
+            introspect_token('expiring token')
+            self.assertEqual(post.call_count, 3)
+
+    def test_inactive_cached_and_failures_not_cached(self):
+        cache.clear()
+        with patch('mainsite.introspection.requests.post') as post:
+            post.return_value = self.introspection_response(status_code=500)
+            self.assertIsNone(introspect_token('token'))
+            post.return_value = self.introspection_response(active=False)
+            self.assertFalse(introspect_token('token')['active'])
+            self.assertFalse(introspect_token('token')['active'])
+            self.assertEqual(post.call_count, 2)
+
+
+class BulkMailerTest(BadgrTestCase):
+
+    def test_mails_sent_in_rate_limited_batches(self):
+        mail.outbox = []
+        with patch('mainsite.utils.time.sleep') as sleep:
+            with BulkMailer(batch_size=2, rate_limit=1) as mailer:
+                for i in range(5):
+                    mailer.send_mail('Subject', None, recipient_list=['{}@example.com'.format(i)],
+                                     html_message='<p>Hello</p>')
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mailer.sent, 5)
+        self.assertEqual([sent for sent, _ in mailer.batches], [2, 2, 1])
+        # two mails at one per second, so the second and third batch wait
+        self.assertEqual(sleep.call_count, 2)
+        # the identical bodies are inlined once
+        self.assertEqual(mailer.inline_css.cache_info().misses, 1)
+
+    def test_only_refused_recipients_recorded(self):
+        mail.outbox = []
+        with BulkMailer(batch_size=2, rate_limit=0) as mailer:
+            send_messages = mailer.connection.send_messages
+
+            def refusing_send_messages(messages):
+                if any('2@example.com' in message.to for message in messages):
+                    raise SMTPRecipientsRefused({'2@example.com': (550, b'No such user')})
+                return send_messages(messages)
+
+            with patch.object(mailer.connection, 'send_messages', side_effect=refusing_send_messages):
+                for i in range(5):
+                    mailer.send_mail('Subject', None, recipient_list=['{}@example.com'.format(i)],
+                                     html_message='<p>Hello</p>')
+                mailer.flush()
+        # the batch mate of the refused address got its mail
+        self.assertEqual([message.to for message in mail.outbox],
+                         [['0@example.com'], ['1@example.com'], ['3@example.com'], ['4@example.com']])
+        self.assertEqual(mailer.failed, 1)
+        self.assertEqual(mailer.failed_recipients, ['2@example.com'])
+
+
+class CatalogSnapshotTest(BadgrTestCase):
+    def test_catalog_served_with_etag(self):
+        teacher1 = self.setup_teacher(authenticate=False)
+        issuer = self.setup_issuer(created_by=teacher1)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        url = reverse('api_queries_cat')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(badgeclass.entity_id, [row['entityId'] for row in response.data])
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # changing a badgeclass invalidates the snapshot
+        badgeclass.name = 'Renamed badgeclass'
+        badgeclass.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Renamed badgeclass', [row['name'] for row in response.data])
+
+    def test_anonymous_mobile_catalog_pages_from_snapshot(self):
+        teacher1 = self.setup_teacher(authenticate=False)
+        issuer = self.setup_issuer(created_by=teacher1)
+        for name in ('Catalog A', 'Catalog B', 'Catalog C'):
+            self.setup_badgeclass(issuer=issuer, name=name)
+        url = reverse('mobile_api_catalog_badge_class')
+
+        response = self.client.get(url, {'name': 'catalog ', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([row['name'] for row in response.data['results']], ['Catalog A', 'Catalog B'])
+        self.assertFalse(response.data['results'][0]['user_may_enroll'])
+
+        response = self.client.get(url, {'name': 'catalog ', 'page_size': 2}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+
+class ImageDerivativeTest(BadgrTestCase):
+    def test_derivatives_rendered_once_and_served_from_manifest(self):
+        teacher1 = self.setup_teacher(authenticate=False)
+        issuer = self.setup_issuer(created_by=teacher1)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+
+        derivatives = generate_derivatives(badgeclass.image.name, badgeclass.image.storage)
+        self.assertEqual(set(derivatives), {'square', 'wide'})
+        self.assertEqual(ImageDerivative.objects.filter(source_name=badgeclass.image.name).count(), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(generate_derivatives(badgeclass.image.name), derivatives)
+
+        response = self.client.get(
+            reverse('badgeclass_image', kwargs={'entity_id': badgeclass.entity_id}), {'type': 'png', 'fmt': 'wide'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].endswith(derivatives['wide']))
+        self.assertEqual(ImageDerivative.objects.count(), 2)
@@ -11,6 +11,7 @@ from drf_spectacular.views import (
 from graphene_django.debug.middleware import DjangoDebugMiddleware
 
 from mainsite.admin import badgr_admin
+from mainsite.graphql_loaders import SiblingLoaderMiddleware
 from mainsite.graphql_view import ExtendedGraphQLView, DisableIntrospectionMiddleware
 from mainsite.views import serve_protected_document
 
@@ -27,7 +28,8 @@ urlpatterns = [
         'graphql',
         csrf_exempt(
             ExtendedGraphQLView.as_view(
-                graphiql=True, middleware=[DisableIntrospectionMiddleware(), DjangoDebugMiddleware()]
+                graphiql=True,
+                middleware=[DisableIntrospectionMiddleware(), SiblingLoaderMiddleware(), DjangoDebugMiddleware()],
             )
         ),
     ),
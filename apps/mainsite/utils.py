@@ -4,17 +4,21 @@ Utility functions and constants that might be used across the project.
 
 import base64
 import datetime
+import functools
 import hashlib
+import logging
 import io
 import math
 import os
 import pathlib
 import re
 import tempfile
+import time
 import urllib.parse
 import uuid
 import webbrowser
 from io import BytesIO
+from smtplib import SMTPRecipientsRefused
 from xml.etree import cElementTree as ET
 
 import cairosvg
@@ -34,6 +38,8 @@ from resizeimage.resizeimage import resize_contain
 
 from institution.testfiles.helper import institution_image
 
+logger = logging.getLogger('Badgr.Debug')
+
 slugify_function_path = getattr(settings, 'AUTOSLUG_SLUGIFY_FUNCTION', 'autoslug.utils.slugify')
 
 slugify = get_callable(slugify_function_path)
@@ -151,13 +157,19 @@ class EmailMessageMaker:
     @staticmethod
     def _create_example_image(badgeclass):
         path = badgeclass.image.path
+        return EmailMessageMaker._example_image(path, os.path.getmtime(path))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _example_image(path, modified_at):
+        """the example image of a badgeclass image file, computed once per version of the file"""
         if path.endswith('.svg'):
             with open(path, 'rb') as input_svg:
                 svg = input_svg.read()
                 encoded = base64.b64encode(svg).decode()
                 return 'data:image/svg+xml;base64,{}'.format(encoded)
         else:
-            background = Image.open(badgeclass.image.path).convert('RGBA')
+            background = Image.open(path).convert('RGBA')
 
         overlay = Image.open(finders.find('images/example_overlay.png')).convert('RGBA')
         if overlay.width != background.width:
@@ -425,16 +437,111 @@ class EmailMessageMaker:
         return render_to_string(template, email_vars)
 
 
-def send_mail(subject, message, recipient_list=None, html_message=None, bcc=None):
+def build_mail_message(subject, message, recipient_list=None, html_message=None, bcc=None, inline_css=transform):
     if settings.LOCAL_DEVELOPMENT_MODE:
         open_mail_in_browser(html_message)
     if html_message:
-        html_with_inline_css = transform(html_message)
-        msg = mail.EmailMessage(subject=subject, body=html_with_inline_css, from_email=None, to=recipient_list, bcc=bcc)
+        msg = mail.EmailMessage(
+            subject=subject, body=inline_css(html_message), from_email=None, to=recipient_list, bcc=bcc
+        )
         msg.content_subtype = 'html'
-        msg.send()
     else:
-        mail.send_mail(subject, message, from_email=None, recipient_list=recipient_list, html_message=html_message)
+        msg = mail.EmailMultiAlternatives(subject, message, from_email=None, to=recipient_list)
+    return msg
+
+
+def send_mail(subject, message, recipient_list=None, html_message=None, bcc=None):
+    build_mail_message(subject, message, recipient_list=recipient_list, html_message=html_message, bcc=bcc).send()
+
+
+class BulkMailer(object):
+    """
+    Sends many mails over a single mail connection, in batches of settings.EMAIL_BATCH_SIZE messages and at most
+    settings.EMAIL_RATE_LIMIT messages per second. The CSS of identical bodies, e.g. the mails to the recipients
+    of one bundle, is inlined once. The messages of a batch are handed to the connection one by one, so a refused
+    address fails only its own message, see failed_recipients and refused_recipients.
+
+        with BulkMailer() as mailer:
+            for direct_award in direct_awards:
+                direct_award.notify_recipient(mailer=mailer)
+    """
+
+    def __init__(self, batch_size=None, rate_limit=None, connection=None):
+        self.batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+        self.rate_limit = settings.EMAIL_RATE_LIMIT if rate_limit is None else rate_limit
+        self.connection = connection or mail.get_connection()
+        self.inline_css = functools.lru_cache(maxsize=16)(transform)
+        self.messages = []
+        self.sent = 0
+        self.failed = 0
+        # the recipients of the messages that could not be sent, for a retry of just those
+        self.failed_recipients = []
+        # the recipients the mail server refused for good, retrying them is pointless
+        self.refused_recipients = []
+        self.batches = []
+        self._next_batch_at = 0
+
+    def __enter__(self):
+        self.connection.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.flush()
+        finally:
+            self.connection.close()
+
+    def send_mail(self, subject, message, recipient_list=None, html_message=None, bcc=None):
+        """queues a mail, same arguments as send_mail"""
+        self.messages.append(build_mail_message(
+            subject, message, recipient_list=recipient_list, html_message=html_message, bcc=bcc,
+            inline_css=self.inline_css,
+        ))
+        if len(self.messages) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """sends the queued mails, waiting as long as the rate limit requires"""
+        messages, self.messages = self.messages, []
+        if not messages:
+            return
+        delay = self._next_batch_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        start = time.monotonic()
+        if self.rate_limit:
+            self._next_batch_at = start + len(messages) / self.rate_limit
+        sent = 0
+        for message in messages:
+            # one message at a time over the open connection: an SMTP backend raises at the first refused message,
+            # after the ones before it were delivered, so only the message that raised has failed
+            try:
+                sent += self.connection.send_messages([message]) or 0
+            except SMTPRecipientsRefused as e:
+                logger.warning('Mail to {} refused: {}'.format(', '.join(message.to), e.recipients))
+                if all(code >= 500 for code, _ in e.recipients.values()):
+                    self.refused_recipients.extend(message.to)
+                else:
+                    self.failed_recipients.extend(message.to)
+            except Exception:
+                logger.exception('Failed to send a mail to {}'.format(', '.join(message.to)))
+                self.failed_recipients.extend(message.to)
+                self._reconnect()
+        elapsed = time.monotonic() - start
+        self.sent += sent
+        self.failed += len(messages) - sent
+        self.batches.append((sent, elapsed))
+        logger.info('Sent {} of {} mails in {:.2f}s ({:.1f} mails/s)'.format(
+            sent, len(messages), elapsed, sent / elapsed if elapsed else sent))
+
+    def _reconnect(self):
+        """the connection may be broken after a failure, start a new one for the next messages"""
+        self.connection.close()
+        try:
+            self.connection.open()
+        except Exception:
+            # send_messages() opens a connection of its own while there is none
+            logger.exception('Failed to reconnect to the mail server')
 
 
 def admin_list_linkify(field_name, label_param=None):
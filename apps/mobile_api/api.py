@@ -1,6 +1,9 @@
+import hashlib
 import logging
+from urllib.parse import urljoin
 
 import requests
+from django_filters import utils as filter_utils
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.generics import ListAPIView
@@ -8,7 +11,8 @@ from fcm_django.api.rest_framework import FCMDeviceAuthorizedViewSet, FCMDeviceS
 
 from badgeuser.models import StudentAffiliation, TermsAgreement
 from directaward.models import DirectAward, DirectAwardBundle
-from django.db.models import Q, Subquery, Count
+from django.db.models import Q, Subquery
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import (
     OpenApiExample,
@@ -25,6 +29,8 @@ from lti_edu.models import StudentsEnrolled
 from mainsite.exceptions import BadgrApiException400
 from mainsite.mobile_api_authentication import TemporaryUser
 from mainsite.permissions import MobileAPIPermission
+from mainsite.snapshots import Snapshot, SnapshotRows, conditional_response
+from mainsite.utils import OriginSetting
 from mobile_api.eduid import EduIDClient
 from mobile_api.filters import CatalogBadgeClassFilter
 from mobile_api.helper import provision_user_from_temporary, extract_bearer_token, sync_user_with_eduid
@@ -1229,33 +1235,74 @@ class CatalogBadgeClassListView(generics.ListAPIView):
         },
     )
     def get_queryset(self):
-        return (
-            BadgeClass.objects.select_related(
-                'issuer',
-                'issuer__faculty',
-                'issuer__faculty__institution',
-            )
-            .prefetch_related(
-                'issuer__faculty__institution__terms',
-                'issuer__faculty__institution__terms__terms_urls',
-            )
-            .filter(
-                is_private=False,
-                issuer__archived=False,
-                issuer__faculty__archived=False,
-            )
-            .exclude(issuer__faculty__visibility_type='TEST')
-            .annotate(
-                selfRequestedAssertionsCount=Count(
-                    'badgeinstances',
-                    filter=Q(badgeinstances__award_type='requested'),
-                ),
-                directAwardedAssertionsCount=Count(
-                    'badgeinstances',
-                    filter=Q(badgeinstances__award_type='direct_award'),
-                ),
-            ).order_by('name')
+        return catalog_badgeclasses()
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super(CatalogBadgeClassListView, self).list(request, *args, **kwargs)
+        # anonymous visitors get the user dependent fields as False, the same for all, so served from the snapshot
+        filterset = self.filterset_class(request.query_params, queryset=BadgeClass.objects.none(), request=request)
+        if not filterset.is_valid():
+            raise filter_utils.translate_validation(filterset.errors)
+        header = catalog_snapshot.get()
+        etag = hashlib.sha256(
+            '{}?{}'.format(header['etag'], request.query_params.urlencode()).encode('utf-8')
+        ).hexdigest()[:32]
+        return conditional_response(request, etag, lambda: self.snapshot_page(header, filterset.form.cleaned_data))
+
+    def snapshot_page(self, header, filters):
+        if any(filters.values()):
+            rows = [row for row in catalog_snapshot.rows(header) if catalog_row_matches(row, **filters)]
+        else:
+            # only the chunks of the requested page are fetched
+            rows = SnapshotRows(catalog_snapshot, header)
+        page = self.paginate_queryset(rows)
+        return self.get_paginated_response(page).data
+
+
+def catalog_badgeclasses():
+    return (
+        BadgeClass.objects.select_related(
+            'issuer',
+            'issuer__faculty',
+            'issuer__faculty__institution',
         )
+        .prefetch_related(
+            'issuer__faculty__institution__terms',
+            'issuer__faculty__institution__terms__terms_urls',
+        )
+        .filter(
+            is_private=False,
+            issuer__archived=False,
+            issuer__faculty__archived=False,
+        )
+        .exclude(issuer__faculty__visibility_type='TEST')
+        .annotate(
+            selfRequestedAssertionsCount=Coalesce('assertion_counts__requested_accepted_count', 0),
+            directAwardedAssertionsCount=Coalesce('assertion_counts__direct_award_accepted_count', 0),
+        ).order_by('name')
+    )
+
+
+def catalog_snapshot_rows():
+    """The catalog as an anonymous visitor sees it, with the image urls made absolute as with a request"""
+    rows = CatalogBadgeClassSerializer(catalog_badgeclasses(), many=True, context={}).data
+    for row in rows:
+        if row['image']:
+            row['image'] = urljoin(OriginSetting.HTTP, row['image'])
+    return rows
+
+
+def catalog_row_matches(row, name=None, institution=None, institution_type=None):
+    """CatalogBadgeClassFilter applied to a row of the snapshot"""
+    return (
+        (not name or name.casefold() in (row['name'] or '').casefold())
+        and (not institution or row['institution_entity_id'] == institution)
+        and (not institution_type or row['institution_type'] == institution_type)
+    )
+
+
+catalog_snapshot = Snapshot('mobile_catalog', catalog_snapshot_rows)
 
 
 class UserProfileView(APIView):
@@ -1,5 +1,9 @@
 import logging
+from collections import defaultdict
+from types import SimpleNamespace
 
+from django.conf import settings
+from django.utils.module_loading import import_string
 from fcm_django.models import FCMDevice
 from firebase_admin import messaging
 from firebase_admin.messaging import APNSConfig, APNSPayload, Aps, AndroidConfig, AndroidNotification
@@ -8,21 +12,29 @@ from google.auth.exceptions import DefaultCredentialsError
 
 logger = logging.getLogger('Badgr.Debug')
 
-def send_push_notification(user, title, body, data, badge_count):
-    if not user:
-        logger.info(f"No user found, skipping push notification.")
-        return None
-    devices = FCMDevice.objects.filter(user=user, active=True)
-    if not devices:
-        logger.info(f"No FCM devices found for user {user.id} ({user.entity_id})")
-        return None
+# the maximum number of messages of one messaging.send_each call
+FCM_BATCH_SIZE = 500
 
-    # Make sure only str data is added to the Message
-    data = {k: str(v) for k, v in data.items()}
 
-    message = messaging.Message(
+def badge_received_payload(badge_name):
+    """the push payload telling a user an edubadge is waiting to be claimed"""
+    return {
+        "title": "Edubadge received",
+        "body": "You earned an edubadge, claim it now!",
+        "data": {
+            "title_key": "push.badge_received_title",
+            "body_key": "push.badge_received_body",
+            "badge": badge_name,
+        },
+    }
+
+
+def _build_message(token, title, body, data, badge_count):
+    return messaging.Message(
+        token=token,
         notification=messaging.Notification(title=title, body=body),
-        data=data,
+        # Make sure only str data is added to the Message
+        data={k: str(v) for k, v in data.items()},
         # Apple Specific Badge Setup
         apns=APNSConfig(
             payload=APNSPayload(
@@ -40,23 +52,83 @@ def send_push_notification(user, title, body, data, badge_count):
         ),
     )
 
-    logger.info(f"Sending push to {devices.count()} devices for user {user.id} ({user.entity_id})")
-    try:
-        firebase_response = devices.send_message(message=message)
-    except DefaultCredentialsError as e:
-        logger.error(f"Cannot send FCM push: credentials file missing or unreadable. {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Failed to send push: {e}")
-        return None
-    else:
-        batch_response = firebase_response.response
+
+def send_push_notifications(notifications):
+    """
+    Sends push notifications to many users at once. The active devices and the unclaimed direct award counts of all
+    users are fetched in bulk, and the messages are sent with messaging.send_each in batches of FCM_BATCH_SIZE.
+    Devices that are no longer registered are deactivated.
+    :param notifications: list of (user, payload) pairs, a payload being a dictionary with title, body, data and
+    optionally the badge_count, which defaults to the number of unclaimed direct awards of the user
+    :return: the number of messages delivered
+    """
+    from directaward.models import DirectAward
+
+    notifications = [(user, payload) for user, payload in notifications if user]
+    if not notifications:
+        logger.info("No users found, skipping push notifications.")
+        return 0
+    tokens = defaultdict(list)
+    devices = FCMDevice.objects.filter(user_id__in={user.pk for user, _ in notifications}, active=True)
+    for user_id, registration_id in devices.values_list('user_id', 'registration_id'):
+        tokens[user_id].append(registration_id)
+    if not tokens:
+        logger.info(f"No FCM devices found for {len(notifications)} users")
+        return 0
+
+    users_to_count = {
+        user.pk: user for user, payload in notifications if user.pk in tokens and 'badge_count' not in payload
+    }
+    badge_counts = DirectAward.unaccepted_counts(list(users_to_count.values())) if users_to_count else {}
+    messages = []
+    for user, payload in notifications:
+        badge_count = payload.get('badge_count', badge_counts.get(user.pk, 0))
+        for token in tokens.get(user.pk, []):
+            messages.append(_build_message(token, payload['title'], payload['body'], payload['data'], badge_count))
+
+    client = import_string(settings.PUSH_NOTIFICATION_CLIENT)
+    delivered = 0
+    unregistered = []
+    logger.info(f"Sending {len(messages)} pushes to the devices of {len(tokens)} users")
+    for start in range(0, len(messages), FCM_BATCH_SIZE):
+        batch = messages[start:start + FCM_BATCH_SIZE]
+        try:
+            batch_response = client.send_each(batch)
+        except DefaultCredentialsError as e:
+            logger.error(f"Cannot send FCM push: credentials file missing or unreadable. {e}")
+            return delivered
+        except Exception as e:
+            logger.error(f"Failed to send {len(batch)} pushes: {e}")
+            continue
+        delivered += batch_response.success_count
+        for message, response in zip(batch, batch_response.responses):
+            if not response.success and isinstance(
+                    response.exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+                unregistered.append(message.token)
         if batch_response.failure_count > 0:
-            logger.warning(
-                f"{batch_response.failure_count} push notifications failed. "
-                f"Deactivated devices: {firebase_response.deactivated_registration_ids}"
-            )
-        else:
-            logger.info(f"All {batch_response.success_count} push notifications sent successfully")
-
-        return firebase_response
+            logger.warning(f"{batch_response.failure_count} of {len(batch)} push notifications failed.")
+    if unregistered:
+        FCMDevice.objects.filter(registration_id__in=unregistered).update(active=False)
+        logger.warning(f"Deactivated {len(unregistered)} unregistered devices")
+    return delivered
+
+
+class LocalMessagingClient(object):
+    """
+    Stand-in for firebase_admin.messaging that keeps the sent messages in its outbox, like the locmem mail backend.
+    Select it with settings.PUSH_NOTIFICATION_CLIENT = 'mobile_api.push_notifications.local_messaging_client'.
+    """
+
+    def __init__(self):
+        self.outbox = []
+        self.batches = 0
+
+    def send_each(self, messages, dry_run=False):
+        self.outbox.extend(messages)
+        self.batches += 1
+        responses = [SimpleNamespace(success=True, exception=None, message_id=str(index))
+                     for index, _ in enumerate(messages)]
+        return SimpleNamespace(responses=responses, success_count=len(responses), failure_count=0)
+
+
+local_messaging_client = LocalMessagingClient()
@@ -567,8 +567,8 @@ class CatalogBadgeClassSerializer(serializers.ModelSerializer):
     institution_type = serializers.CharField(source='issuer.faculty.institution.institution_type', read_only=True)
 
     # Annotated counts
-    self_requested_assertions_count = serializers.IntegerField(read_only=True)
-    direct_awarded_assertions_count = serializers.IntegerField(read_only=True)
+    self_requested_assertions_count = serializers.IntegerField(source='selfRequestedAssertionsCount', read_only=True)
+    direct_awarded_assertions_count = serializers.IntegerField(source='directAwardedAssertionsCount', read_only=True)
 
     class Meta:
         model = BadgeClass
@@ -1,13 +1,8 @@
-import io
-import os
 import re
 from urllib.parse import urljoin
 
-import cairosvg
 import requests
-from PIL import Image
 from django.conf import settings
-from django.core.files.storage import DefaultStorage
 from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import redirect, render
 from django.urls import resolve, reverse, Resolver404, NoReverseMatch
@@ -20,12 +15,16 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 import badgrlog
+from badgeuser.models import BadgeUser
 from entity.api import VersionedObjectMixin, BaseEntityDetailView
 from institution.models import Institution, Faculty
 from issuer import utils
 from issuer.models import Issuer, BadgeClass, BadgeInstance
 from mainsite.exceptions import BadgrApiException400
+from mainsite.derivatives import DERIVATIVE_FORMATS, get_or_render_derivative
 from mainsite.models import BadgrApp
+from mainsite.public_json import cached_public_json
+from mainsite.snapshots import conditional_response
 from mainsite.utils import OriginSetting
 from signing.models import PublicKeyIssuer
 
@@ -101,6 +100,8 @@ class JSONComponentView(VersionedObjectMixin, APIView, SlugToEntityIdRedirectMix
     authentication_classes = ()
     html_renderer_class = None
     template_name = 'public/bot_openbadge.html'
+    # serve the rendered document from the cache, with conditional GET
+    cache_json = False
 
     def log(self, obj):
         pass
@@ -109,6 +110,19 @@ class JSONComponentView(VersionedObjectMixin, APIView, SlugToEntityIdRedirectMix
         json = self.current_object.get_json(obi_version=self._get_request_obi_version(request), **kwargs)
         return json
 
+    def get_json_cache_key(self, request):
+        """The document depends on the object, the requested obi version and the expansions"""
+        return '{}__{}__{}__{}'.format(
+            self.model._meta.label,
+            self.current_object.entity_id,
+            self._get_request_obi_version(request),
+            ','.join(sorted(set(request.GET.getlist('expand', [])))),
+        )
+
+    def get_json_objects(self, request):
+        """:return: the objects whose data is in the document, a change of one of them renders it again"""
+        return self.current_object.get_public_json_objects()
+
     def get(self, request, **kwargs):
         try:
             self.current_object = self.get_object(request, **kwargs)
@@ -133,8 +147,12 @@ class JSONComponentView(VersionedObjectMixin, APIView, SlugToEntityIdRedirectMix
         if self.is_requesting_html():
             return HttpResponseRedirect(redirect_to=self.get_badgrapp_redirect())
 
-        json = self.get_json(request=request)
-        return Response(json)
+        if not self.cache_json:
+            return Response(self.get_json(request=request))
+        document = cached_public_json(
+            self.get_json_cache_key(request), self.get_json_objects(request), lambda: self.get_json(request=request)
+        )
+        return conditional_response(request, document['etag'], lambda: document['json'], document['last_modified'])
 
     def is_bot(self):
         """
@@ -228,64 +246,22 @@ class ImagePropertyDetailView(APIView, SlugToEntityIdRedirectMixin):
         if image_type not in ['original', 'png']:
             raise ValidationError('invalid image type: {}'.format(image_type))
 
-        supported_fmts = {'square': (1, 1), 'wide': (1.91, 1)}
         image_fmt = request.query_params.get('fmt', 'square').lower()
-        if image_fmt not in list(supported_fmts.keys()):
+        if image_fmt not in DERIVATIVE_FORMATS:
             raise ValidationError('invalid image format: {}'.format(image_fmt))
 
-        image_url = image_prop.url
-        filename, ext = os.path.splitext(image_prop.name)
-        basename = os.path.basename(filename)
-        dirname = os.path.dirname(filename)
-        version_suffix = getattr(settings, 'CAIROSVG_VERSION_SUFFIX', '1')
-        new_name = '{dirname}/converted{version}/{basename}{fmt_suffix}.png'.format(
-            dirname=dirname,
-            basename=basename,
-            version=version_suffix,
-            fmt_suffix='-{}'.format(image_fmt) if image_fmt != 'square' else '',
-        )
-        storage = DefaultStorage()
-
-        def _fit_to_height(img, ar, height=400):
-            img.thumbnail((height, height))
-            new_size = (int(ar[0] * height), int(ar[1] * height))
-            new_img = Image.new('RGBA', new_size)
-            new_img.paste(img, ((new_size[0] - height) / 2, (new_size[1] - height) / 2))
-            new_img.show()
-            return new_img
-
         if image_type == 'original' and image_fmt == 'square':
-            image_url = image_prop.url
-        elif ext == '.svg':
-            if not storage.exists(new_name):
-                with storage.open(image_prop.name, 'rb') as input_svg:
-                    svg_buf = io.StringIO()
-                    out_buf = io.StringIO()
-                    cairosvg.svg2png(file_obj=input_svg, write_to=svg_buf)
-                    img = Image.open(svg_buf)
-
-                    img = _fit_to_height(img, supported_fmts[image_fmt])
-
-                    img.save(out_buf, format='png')
-                    storage.save(new_name, out_buf)
-            image_url = storage.url(new_name)
-        else:
-            if not storage.exists(new_name):
-                with storage.open(image_prop.name, 'rb') as input_svg:
-                    out_buf = io.StringIO()
-                    img = Image.open(input_svg)
-
-                    img = _fit_to_height(img, supported_fmts[image_fmt])
-
-                    img.save(out_buf, format='png')
-                    storage.save(new_name, out_buf)
-            image_url = storage.url(new_name)
-
-        return redirect(image_url)
+            return redirect(image_prop.url)
+        # rendered by a task when the image was uploaded, only images from before are rendered here
+        derivative = get_or_render_derivative(image_prop, image_fmt)
+        if derivative is None:
+            return redirect(image_prop.url)
+        return redirect(image_prop.storage.url(derivative))
 
 
 class InstitutionJson(JSONComponentView):
     permission_classes = (permissions.AllowAny,)
+    cache_json = True
     model = Institution
 
     def get_context_data(self, **kwargs):
@@ -323,6 +299,7 @@ class FacultyImage(ImagePropertyDetailView):
 
 class IssuerJson(JSONComponentView):
     permission_classes = (permissions.AllowAny,)
+    cache_json = True
     model = Issuer
 
     def log(self, obj):
@@ -397,6 +374,7 @@ class IssuerImage(ImagePropertyDetailView):
 
 class BadgeClassJson(JSONComponentView):
     permission_classes = (permissions.AllowAny,)
+    cache_json = True
     model = BadgeClass
 
     def log(self, obj):
@@ -440,6 +418,20 @@ class BadgeClassJson(JSONComponentView):
             json['typeBadgeClass'] = badge_class.badge_class_type
         return json
 
+    def get_json_objects(self, request):
+        objects = super(BadgeClassJson, self).get_json_objects(request)
+        if 'endorsements' in request.GET.getlist('expand', []):
+            objects += self.endorser_objects(self.current_object)
+        return objects
+
+    @staticmethod
+    def endorser_objects(badge_class):
+        """:return: the objects whose data is in the endorsements of badge_class, see endorsement_to_json()"""
+        objects = []
+        for endorsement in badge_class.cached_endorsements():
+            objects += BadgeClass.cached.get(pk=endorsement.endorser_id).get_public_json_objects()
+        return objects
+
     @staticmethod
     def _image_urls(obj, name, container):
         image_url = OriginSetting.HTTP + reverse(f'{name}_image', kwargs={'entity_id': obj.entity_id})
@@ -547,6 +539,7 @@ class BadgeInstanceJson(JSONComponentView):
 
     permission_classes = (permissions.AllowAny,)
     model = BadgeInstance
+    cache_json = True
 
     def get_json(self, request):
         if self.object.signature:
@@ -561,6 +554,13 @@ class BadgeInstanceJson(JSONComponentView):
             )
         return json
 
+    def get_json_objects(self, request):
+        objects = super(BadgeInstanceJson, self).get_json_objects(request)
+        if 'badge.user' in request.GET.getlist('expand', []) and self.current_object.user_id:
+            objects.append(BadgeUser.cached.get(pk=self.current_object.user_id))
+            objects += BadgeClassJson.endorser_objects(self.current_object.cached_badgeclass)
+        return objects
+
     def get_context_data(self, **kwargs):
         image_url = '{}{}?type=png'.format(
             OriginSetting.HTTP,
@@ -5,6 +5,7 @@ from rest_framework.views import APIView
 
 from directaward.models import DirectAward
 from mainsite.permissions import TeachPermission, AuthenticatedWithVerifiedEmail
+from mainsite.snapshots import Snapshot, conditional_response
 
 
 from drf_spectacular.utils import (
@@ -16,15 +17,10 @@ from drf_spectacular.utils import (
     OpenApiTypes,
 )
 
+# staff_effectivepermission holds the permissions inherited from the institution, faculty and issuer as well
 permissions_query = """
 (
-    (exists (select 1 from staff_institutionstaff insst where insst.institution_id = ins.id and insst.user_id = %(u_id)s and insst.may_award = 1))
-    or
-    (exists (select 1 from staff_facultystaff facst where facst.faculty_id = f.id and facst.user_id = %(u_id)s and facst.may_award = 1))
-    or
-    (exists (select 1 from staff_issuerstaff issst where issst.issuer_id = i.id and issst.user_id = %(u_id)s and issst.may_award = 1))
-    or
-    (exists (select 1 from staff_badgeclassstaff bcst where bcst.badgeclass_id = bc.id and bcst.user_id = %(u_id)s and bcst.may_award = 1))
+    (exists (select 1 from staff_effectivepermission ep where ep.user_id = %(u_id)s and ep.node_type = 'badgeclass' and ep.node_id = bc.id and ep.may_award = 1))
     or
     (exists (select 1 from users us where us.id = %(u_id)s and us.is_superuser = 1))
 )
@@ -251,14 +247,15 @@ select bc.created_at as createdAt, bc.name, bc.image, bc.archived, bc.entity_id
         (SELECT GROUP_CONCAT(DISTINCT isbt.name) FROM institution_badgeclasstag isbt
         INNER JOIN issuer_badgeclass_tags ibt ON ibt.badgeclasstag_id = isbt.id
         WHERE ibt.badgeclass_id = bc.id) AS tags,
-        (select count(id) from issuer_badgeinstance WHERE badgeclass_id = bc.id AND award_type = 'requested') as selfRequestedAssertionsCount,
-        (select count(id) from issuer_badgeinstance WHERE badgeclass_id = bc.id AND award_type = 'direct_award') as directAwardedAssertionsCount,
+        coalesce(bcc.requested_count, 0) as selfRequestedAssertionsCount,
+        coalesce(bcc.direct_award_count, 0) as directAwardedAssertionsCount,
         (select count(id) from lti_edu_studentsenrolled WHERE badge_class_id = bc.id AND badge_instance_id is null AND denied = 0) as pendingEnrollmentCount,
         (select 1 from staff_institutionstaff insst where insst.institution_id = ins.id and insst.user_id = %(u_id)s and insst.may_award = 1) as ins_staff,
         (select 1 from staff_facultystaff facst where facst.faculty_id = f.id and facst.user_id = %(u_id)s and facst.may_award = 1) as fac_staff,
         (select 1 from staff_issuerstaff issst where issst.issuer_id = i.id and issst.user_id = %(u_id)s and issst.may_award = 1) as iss_staff,
         (select 1 from staff_badgeclassstaff bcst where bcst.badgeclass_id = bc.id and bcst.user_id = %(u_id)s and bcst.may_award = 1) as bc_staff
 from  issuer_badgeclass bc
+left join issuer_badgeclassassertioncounts bcc on bcc.badgeclass_id = bc.id
 inner join issuer_issuer i on i.id = bc.issuer_id
 inner join institution_faculty f on f.id = i.faculty_id
 inner join institution_institution ins on ins.id = f.institution_id
@@ -373,6 +370,39 @@ class CurrentInstitution(APIView):
             return Response(result, status=status.HTTP_200_OK)
 
 
+def catalog_badgeclasses():
+    """the rows of the public catalog, served from catalog_snapshot"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+select bc.created_at as createdAt, bc.name, bc.image, bc.archived, bc.entity_id as entityId,
+        bc.is_private as isPrivate, bc.is_micro_credentials as isMicroCredentials,
+        bc.badge_class_type as typeBadgeClass,
+        i.name_english as i_name_english, i.name_dutch as i_name_dutch, i.entity_id as i_entity_id,
+        i.image_dutch as i_image_dutch, i.image_english as i_image_english, 
+        f.name_english as f_name_english, f.name_dutch as f_name_dutch, f.entity_id as f_entity_id,
+        f.image_dutch as f_image_dutch, f.image_english as f_image_english,
+        f.on_behalf_of as onBehalfOf, f.faculty_type as facultyType,
+        ins.name_english as ins_name_english, ins.name_dutch as ins_name_dutch, ins.entity_id as ins_entity_id,
+        ins.image_dutch as ins_image_dutch, ins.image_english as ins_image_english,
+        ins.institution_type as institutionType,
+        coalesce(bcc.requested_count, 0) as selfRequestedAssertionsCount,
+        coalesce(bcc.direct_award_count, 0) as directAwardedAssertionsCount
+from  issuer_badgeclass bc
+left join issuer_badgeclassassertioncounts bcc on bcc.badgeclass_id = bc.id
+inner join issuer_issuer i on i.id = bc.issuer_id
+inner join institution_faculty f on f.id = i.faculty_id
+inner join institution_institution ins on ins.id = f.institution_id
+where  bc.is_private = 0 and f.archived = 0 and i.archived = 0 and (f.visibility_type <> 'TEST' OR f.visibility_type IS NULL);
+        """,
+            {},
+        )
+        return dict_fetch_all(cursor)
+
+
+catalog_snapshot = Snapshot('catalog', catalog_badgeclasses)
+
+
 class CatalogBadgeClasses(APIView):
     permission_classes = (permissions.AllowAny,)
 
@@ -459,31 +489,8 @@ class CatalogBadgeClasses(APIView):
         },
     )
     def get(self, request, **kwargs):
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-select bc.created_at as createdAt, bc.name, bc.image, bc.archived, bc.entity_id as entityId,
-        bc.is_private as isPrivate, bc.is_micro_credentials as isMicroCredentials,
-        bc.badge_class_type as typeBadgeClass,
-        i.name_english as i_name_english, i.name_dutch as i_name_dutch, i.entity_id as i_entity_id,
-        i.image_dutch as i_image_dutch, i.image_english as i_image_english, 
-        f.name_english as f_name_english, f.name_dutch as f_name_dutch, f.entity_id as f_entity_id,
-        f.image_dutch as f_image_dutch, f.image_english as f_image_english,
-        f.on_behalf_of as onBehalfOf, f.faculty_type as facultyType,
-        ins.name_english as ins_name_english, ins.name_dutch as ins_name_dutch, ins.entity_id as ins_entity_id,
-        ins.image_dutch as ins_image_dutch, ins.image_english as ins_image_english,
-        ins.institution_type as institutionType,
-        (select count(id) from issuer_badgeinstance WHERE badgeclass_id = bc.id AND award_type = 'requested') as selfRequestedAssertionsCount,
-        (select count(id) from issuer_badgeinstance WHERE badgeclass_id = bc.id AND award_type = 'direct_award') as directAwardedAssertionsCount
-from  issuer_badgeclass bc
-inner join issuer_issuer i on i.id = bc.issuer_id
-inner join institution_faculty f on f.id = i.faculty_id
-inner join institution_institution ins on ins.id = f.institution_id
-where  bc.is_private = 0 and f.archived = 0 and i.archived = 0 and (f.visibility_type <> 'TEST' OR f.visibility_type IS NULL);
-            """,
-                {},
-            )
-            return Response(dict_fetch_all(cursor), status=status.HTTP_200_OK)
+        header = catalog_snapshot.get()
+        return conditional_response(request, header['etag'], lambda: catalog_snapshot.rows(header))
 
 
 class IssuersOverview(APIView):
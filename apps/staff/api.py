@@ -54,7 +54,6 @@ class StaffDetailViewBase(BaseEntityDetailView):
         obj = self.get_object(request, **kwargs)  # triggers a has_object_permissions() check on the model instance
         logger.event(badgrlog.PermissionDeletedEvent(staff_instance=obj, request=request))
         obj.delete()
-        obj.object.remove_cached_data(['cached_staff'])
         return Response(status=HTTP_204_NO_CONTENT)
 
 
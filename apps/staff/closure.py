@@ -0,0 +1,51 @@
+from django.apps import apps as global_apps
+
+PERMISSION_FIELDS = (
+    'may_create',
+    'may_read',
+    'may_update',
+    'may_delete',
+    'may_award',
+    'may_sign',
+    'may_administrate_users',
+)
+
+# The levels of the permission tree, top down:
+# (node type, node model, attname of the parent, staff membership model, attname of the node on the membership)
+PERMISSION_TREE_LEVELS = (
+    ('institution', 'institution.Institution', None, 'staff.InstitutionStaff', 'institution_id'),
+    ('faculty', 'institution.Faculty', 'institution_id', 'staff.FacultyStaff', 'faculty_id'),
+    ('issuer', 'issuer.Issuer', 'faculty_id', 'staff.IssuerStaff', 'issuer_id'),
+    ('badgeclass', 'issuer.BadgeClass', 'issuer_id', 'staff.BadgeClassStaff', 'badgeclass_id'),
+)
+
+
+def merge_permissions(permissions, other):
+    """the permissions granted by either of the two permissions dictionaries"""
+    return {field: bool(permissions[field] or other[field]) for field in PERMISSION_FIELDS}
+
+
+def compute_effective_permissions(user_id, apps=global_apps):
+    """
+    Computes the permissions of a user on every node of the Institution -> Faculty -> Issuer -> BadgeClass tree
+    below one of its staff memberships, inherited from the memberships on the node and its ancestors.
+    Takes one query per level for the memberships and one per level for the children of permissioned nodes.
+    :param apps: the app registry, the historical one when called from a migration
+    :return: dictionary of (node type, node id) -> permissions dictionary
+    """
+    effective = {}
+    inherited = {}
+    for node_type, node_model, parent_attname, staff_model, staff_attname in PERMISSION_TREE_LEVELS:
+        level = {}
+        if inherited:
+            children = apps.get_model(node_model).objects.filter(**{parent_attname + '__in': list(inherited)})
+            for node_id, parent_id in children.values_list('id', parent_attname):
+                level[node_id] = dict(inherited[parent_id])
+        memberships = apps.get_model(staff_model).objects.filter(user_id=user_id)
+        for membership in memberships.values(staff_attname, *PERMISSION_FIELDS):
+            node_id = membership.pop(staff_attname)
+            level[node_id] = merge_permissions(level[node_id], membership) if node_id in level else membership
+        for node_id, permissions in level.items():
+            effective[(node_type, node_id)] = permissions
+        inherited = level
+    return effective
@@ -0,0 +1,82 @@
+from django.db import models, transaction
+
+from staff.closure import PERMISSION_FIELDS, compute_effective_permissions
+from staff.resolver import forget_permissions, get_permission_resolver
+
+
+def _parent(node):
+    """the parent of a node in the permission tree, None for an institution"""
+    return getattr(node, node.parent_field_name) if node.parent_field_name else None
+
+
+class EffectivePermissionManager(models.Manager):
+    def permissions_for(self, user, node):
+        """
+        The inherited permissions of user on a node of the permission tree, with one indexed lookup.
+        :param user: BadgeUser
+        :param node: Institution, Faculty, Issuer or BadgeClass
+        :return: a permissions dictionary
+        """
+        permissions = dict.fromkeys(PERMISSION_FIELDS, False)
+        if user is None or user.pk is None or node.pk is None:
+            return permissions
+        resolver = get_permission_resolver()
+        if resolver is not None:
+            row = resolver.effective_row(self.all(), user.pk, node._meta.model_name, node.pk)
+        else:
+            row = (
+                self.filter(user_id=user.pk, node_type=node._meta.model_name, node_id=node.pk)
+                .values(*PERMISSION_FIELDS)
+                .first()
+            )
+        if row:
+            permissions.update(row)
+        return permissions
+
+    def node_ids(self, user, node_type, permissions):
+        """
+        :return: a subquery of the ids of the nodes of node_type on which user has all the permissions
+        """
+        return self.filter(user_id=user.pk, node_type=node_type, **dict.fromkeys(permissions, True)).values('node_id')
+
+    @transaction.atomic
+    def rebuild_for_user(self, user_id):
+        """Replaces the rows of a user, after one of its staff memberships changed"""
+        effective = compute_effective_permissions(user_id)
+        self.filter(user_id=user_id).delete()
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, node_type=node_type, node_id=node_id, **permissions)
+                for (node_type, node_id), permissions in effective.items()
+            ],
+            batch_size=1000,
+        )
+        forget_permissions()
+
+    def inherit(self, node):
+        """Gives a new node of the tree the permissions of the users on its parent"""
+        parent = _parent(node)
+        if parent is None:
+            return
+        rows = self.filter(node_type=parent._meta.model_name, node_id=parent.pk).values('user_id', *PERMISSION_FIELDS)
+        self.bulk_create(
+            [self.model(node_type=node._meta.model_name, node_id=node.pk, **row) for row in rows],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        forget_permissions()
+
+    def refresh_node(self, node):
+        """Recomputes the users whose permissions on node change when it is moved to another parent"""
+        user_ids = set(self.filter(node_type=node._meta.model_name, node_id=node.pk).values_list('user_id', flat=True))
+        parent = _parent(node)
+        if parent is not None:
+            user_ids.update(
+                self.filter(node_type=parent._meta.model_name, node_id=parent.pk).values_list('user_id', flat=True)
+            )
+        for user_id in user_ids:
+            self.rebuild_for_user(user_id)
+
+    def delete_for_node(self, node):
+        self.filter(node_type=node._meta.model_name, node_id=node.pk).delete()
+        forget_permissions()
@@ -0,0 +1,15 @@
+from staff.resolver import activate, deactivate
+
+
+class PermissionResolverMiddleware(object):
+    """Scopes the memoized staff permissions to a single request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        activate()
+        try:
+            return self.get_response(request)
+        finally:
+            deactivate()
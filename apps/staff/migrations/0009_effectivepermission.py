@@ -0,0 +1,93 @@
+# Generated by Django 5.2.13 on 2026-10-18 10:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# frozen copy of staff.closure as of this migration, so later changes to the live module do not alter it
+PERMISSION_FIELDS = (
+    'may_create',
+    'may_read',
+    'may_update',
+    'may_delete',
+    'may_award',
+    'may_sign',
+    'may_administrate_users',
+)
+
+PERMISSION_TREE_LEVELS = (
+    ('institution', 'institution.Institution', None, 'staff.InstitutionStaff', 'institution_id'),
+    ('faculty', 'institution.Faculty', 'institution_id', 'staff.FacultyStaff', 'faculty_id'),
+    ('issuer', 'issuer.Issuer', 'faculty_id', 'staff.IssuerStaff', 'issuer_id'),
+    ('badgeclass', 'issuer.BadgeClass', 'issuer_id', 'staff.BadgeClassStaff', 'badgeclass_id'),
+)
+
+
+def compute_effective_permissions(user_id, apps):
+    effective = {}
+    inherited = {}
+    for node_type, node_model, parent_attname, staff_model, staff_attname in PERMISSION_TREE_LEVELS:
+        level = {}
+        if inherited:
+            children = apps.get_model(node_model).objects.filter(**{parent_attname + '__in': list(inherited)})
+            for node_id, parent_id in children.values_list('id', parent_attname):
+                level[node_id] = dict(inherited[parent_id])
+        memberships = apps.get_model(staff_model).objects.filter(user_id=user_id)
+        for membership in memberships.values(staff_attname, *PERMISSION_FIELDS):
+            node_id = membership.pop(staff_attname)
+            if node_id in level:
+                membership = {field: bool(level[node_id][field] or membership[field]) for field in PERMISSION_FIELDS}
+            level[node_id] = membership
+        for node_id, permissions in level.items():
+            effective[(node_type, node_id)] = permissions
+        inherited = level
+    return effective
+
+
+def populate_effective_permissions(apps, schema_editor):
+    EffectivePermission = apps.get_model('staff', 'EffectivePermission')
+    user_ids = set()
+    for *_, staff_model, _ in PERMISSION_TREE_LEVELS:
+        user_ids.update(apps.get_model(staff_model).objects.values_list('user_id', flat=True))
+    for user_id in user_ids:
+        EffectivePermission.objects.bulk_create(
+            [
+                EffectivePermission(user_id=user_id, node_type=node_type, node_id=node_id, **permissions)
+                for (node_type, node_id), permissions in compute_effective_permissions(user_id, apps).items()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('institution', '0069_alter_institution_staff'),
+        ('issuer', '0121_data_migration_to_update_quality_assurance_text_and_url'),
+        ('staff', '0008_auto_20200526_1536'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectivePermission',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('node_type', models.CharField(choices=[('institution', 'Institution'), ('faculty', 'Faculty'), ('issuer', 'Issuer'), ('badgeclass', 'BadgeClass')], max_length=16)),
+                ('node_id', models.PositiveIntegerField()),
+                ('may_create', models.BooleanField(default=False)),
+                ('may_read', models.BooleanField(default=False)),
+                ('may_update', models.BooleanField(default=False)),
+                ('may_delete', models.BooleanField(default=False)),
+                ('may_award', models.BooleanField(default=False)),
+                ('may_sign', models.BooleanField(default=False)),
+                ('may_administrate_users', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'node_type', 'node_id')},
+                'indexes': [models.Index(fields=['node_type', 'node_id'], name='staff_effperm_node_idx')],
+            },
+        ),
+        migrations.RunPython(populate_effective_permissions, migrations.RunPython.noop),
+    ]
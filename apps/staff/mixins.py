@@ -1,7 +1,8 @@
 from django.db import models, transaction
-from django.db.models import ProtectedError
+from django.db.models import ProtectedError, Q
 
-from staff.models import PermissionedRelationshipBase
+from staff.models import EffectivePermission, PermissionedRelationshipBase
+from staff.resolver import get_permission_resolver
 
 
 class PermissionedModelMixin(object):
@@ -10,6 +11,75 @@ class PermissionedModelMixin(object):
     Staff model. Used for retrieving permissions and staff members. And instant caching when changes happen.
     """
 
+    # name of the foreign key to the parent of this entity in the permission tree, None for the root
+    parent_field_name = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(PermissionedModelMixin, cls).from_db(db, field_names, values)
+        instance._loaded_parent_id = instance._get_parent_id()
+        return instance
+
+    def _get_parent_id(self):
+        if self.parent_field_name is None:
+            return None
+        return self.__dict__.get(self._meta.get_field(self.parent_field_name).attname)
+
+    @classmethod
+    def institution_lookup(cls):
+        """the lookup from this model to the id of the institution at the root of its branch"""
+        path, model = [], cls
+        while model.parent_field_name is not None:
+            path.append(model.parent_field_name)
+            model = model._meta.get_field(model.parent_field_name).related_model
+        return '__'.join(path + ['id'])
+
+    @classmethod
+    def permitted(cls, user, permissions, queryset=None):
+        """
+        The queryset equivalent of has_permissions(): filters the objects on which user has all the given permissions
+        in the database, with the EffectivePermission closure, instead of checking every object.
+        :param user: BadgeUser (teacher)
+        :param permissions: a list of strings
+        :param queryset: optional queryset of this model to filter, defaults to all objects
+        :return: QuerySet
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        if user is None or user.pk is None:
+            return queryset.none()
+        node_type = cls._meta.model_name
+        node_ids = EffectivePermission.objects.node_ids
+        if 'may_read' not in permissions:
+            return queryset.filter(pk__in=node_ids(user, node_type, permissions))
+        others = [permission for permission in permissions if permission != 'may_read']
+        permitted = Q(pk__in=node_ids(user, node_type, permissions))
+        if getattr(user, 'is_teacher', False) and user.institution_id is not None:
+            # everyone in institution is a reader, see _compute_permissions()
+            in_institution = Q(**{cls.institution_lookup(): user.institution_id})
+            if others:
+                in_institution &= Q(pk__in=node_ids(user, node_type, others))
+            permitted |= in_institution
+        return queryset.filter(permitted)
+
+    def get_institution_id(self):
+        """
+        the id of the institution at the root of the branch of this entity, from the parents that are already loaded
+        or else with one query along institution_lookup(), instead of fetching every parent on the way up
+        """
+        node = self
+        while node.parent_field_name is not None:
+            if not node._meta.get_field(node.parent_field_name).is_cached(node):
+                return (
+                    type(node).objects.filter(pk=node.pk)
+                    .values_list(node.institution_lookup(), flat=True)
+                    .first()
+                )
+            node = getattr(node, node.parent_field_name)
+            if node is None:
+                return None
+        return node.pk
+
     def _get_local_permissions(self, user):
         """
         :param user: BadgeUser (teacher)
@@ -74,22 +144,23 @@ class PermissionedModelMixin(object):
 
     def get_permissions(self, user):
         """
-        This method returns (inherited or local) permissions for the instance by climbing the permission tree.
+        This method returns (inherited or local) permissions for the instance, looked up in the materialized
+        EffectivePermission closure of the permission tree.
         :param user: BadgeUser (teacher)
         :return: a permissions dictionary
         """
-        try:
-            parent_perms = self.parent.get_permissions(user)
-            local_perms = self._get_local_permissions(user)
-            combined_perms = {}
-            for key in local_perms:
-                combined_perms[key] = local_perms[key] if local_perms[key] > parent_perms[key] else parent_perms[key]
-            return combined_perms
-        except AttributeError:  # recursive base case (reached root of permission tree, i.e. the Institution)
-            perms = self._get_local_permissions(user)
-            if hasattr(user, 'is_teacher') and user.is_teacher and self == user.institution:  # if at the recursive base case the institution is the same as user's institution
-                perms['may_read'] = True  # then add may_read, everyone in institution is a reader
-            return perms
+        resolver = get_permission_resolver()
+        if resolver is not None and user is not None and user.pk is not None:
+            # memoized for the rest of the request
+            return resolver.get_permissions(user, self, self._compute_permissions)
+        return self._compute_permissions(user)
+
+    def _compute_permissions(self, user):
+        perms = EffectivePermission.objects.permissions_for(user, self)
+        if not perms['may_read'] and getattr(user, 'is_teacher', False):
+            if user.institution_id == self.get_institution_id():
+                perms['may_read'] = True  # everyone in institution is a reader
+        return perms
 
     def has_permissions(self, user, permissions):
         """
@@ -143,15 +214,29 @@ class PermissionedModelMixin(object):
             if staff.user == user:
                 return staff
 
+    def get_dependent_cache_tags(self):
+        """Changes in this entity also invalidate the cached collections of all its ancestors"""
+        tags = super(PermissionedModelMixin, self).get_dependent_cache_tags()
+        parent = getattr(self, 'parent', None)
+        if parent is not None:
+            tags += parent.get_dependent_cache_tags()
+        return tags
+
     def publish(self, *args, **kwargs):
         super(PermissionedModelMixin, self).publish(*args, **kwargs)
         for member in self.cached_staff():
-            member.cached_user.publish()
+            member.cached_user.republish()
 
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         super(PermissionedModelMixin, self).save(*args, **kwargs)
+        if adding:
+            EffectivePermission.objects.inherit(self)
+        elif getattr(self, '_loaded_parent_id', None) not in (None, self._get_parent_id()):
+            EffectivePermission.objects.refresh_node(self)
+        self._loaded_parent_id = self._get_parent_id()
         try:
-            self.parent.publish()
+            self.parent.republish()
         except AttributeError:
             pass
 
@@ -175,10 +260,11 @@ class PermissionedModelMixin(object):
             pass
         for membership in self.staff_items:
             membership.delete(publish_object=False)
+        EffectivePermission.objects.delete_for_node(self)
         ret = super(PermissionedModelMixin, self).delete(*args, **kwargs)
         if publish_parent:
             try:
-                self.parent.publish()
+                self.parent.republish()
             except AttributeError:  # no parent
                 pass
         return ret
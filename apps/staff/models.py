@@ -9,11 +9,17 @@ from rest_framework import serializers
 from entity.models import BaseVersionedEntity
 from mainsite.exceptions import BadgrValidationError
 from signing.models import SymmetricKey
+from staff.closure import PERMISSION_FIELDS
+from staff.managers import EffectivePermissionManager
 
 
 class PermissionedRelationshipBase(BaseVersionedEntity):
     """
     Abstract base class used for inheritance in all the Staff Many2Many relationship models
+
+    save() and delete() rebuild the EffectivePermission rows of the user. QuerySet.update(), bulk_create() and
+    QuerySet.delete() bypass them: after such a bulk change call EffectivePermission.objects.rebuild_for_user() for
+    every user involved, or the closure goes stale.
     """
 
     user = models.ForeignKey('badgeuser.BadgeUser', on_delete=models.CASCADE)
@@ -56,18 +62,7 @@ class PermissionedRelationshipBase(BaseVersionedEntity):
 
     @property
     def permissions(self):
-        return model_to_dict(
-            self,
-            fields=[
-                'may_create',
-                'may_read',
-                'may_update',
-                'may_delete',
-                'may_award',
-                'may_sign',
-                'may_administrate_users',
-            ],
-        )
+        return model_to_dict(self, fields=PERMISSION_FIELDS)
 
     @property
     def has_a_permission(self):
@@ -97,15 +92,13 @@ class PermissionedRelationshipBase(BaseVersionedEntity):
 
     def publish(self):
         super(PermissionedRelationshipBase, self).publish()
-        self.object.publish()
-        self.user.publish()
+        self.object.republish()
+        self.user.republish()
 
-    def _empty_user_cached_staff(self):
-        object_class_name = self.object.__class__.__name__.lower()
-        if object_class_name == 'institution':
-            self.user.remove_cached_data(['cached_institution_staff'])
-        else:
-            self.user.remove_cached_data(['cached_{}_staffs'.format(object_class_name)])
+    def get_dependent_cache_tags(self):
+        """the cached staff of the object (and its parents) and the cached staff memberships of the user"""
+        tags = super(PermissionedRelationshipBase, self).get_dependent_cache_tags()
+        return tags + self.object.get_dependent_cache_tags() + [self.user.cache_tag]
 
     def _user_has_other_membership_in_branch(self, user):
         """check to see if given user already has another staff membership in the current branch"""
@@ -118,15 +111,12 @@ class PermissionedRelationshipBase(BaseVersionedEntity):
         if self._user_has_other_membership_in_branch(self.user):
             raise serializers.ValidationError('Cannot save staff membership, there is a conflicting staff membership.')
         super(PermissionedRelationshipBase, self).save()
-        self.object.remove_cached_data(['cached_staff'])
-        self._empty_user_cached_staff()
+        EffectivePermission.objects.rebuild_for_user(self.user_id)
 
     def delete(self, *args, **kwargs):
-        publish_object = kwargs.pop('publish_object', True)
+        kwargs.pop('publish_object', True)  # the dependent cache tags are invalidated regardless
         super(PermissionedRelationshipBase, self).delete()
-        if publish_object:
-            self.object.remove_cached_data(['cached_staff'])  # update permissions instantly
-        self._empty_user_cached_staff()
+        EffectivePermission.objects.rebuild_for_user(self.user_id)
 
     @property
     def cached_user(self):
@@ -226,6 +216,39 @@ class BadgeClassStaff(PermissionedRelationshipBase):
         return self.badgeclass
 
 
+class EffectivePermission(models.Model):
+    """
+    Materialized closure of the staff memberships: the permissions of a user on every node of the
+    Institution -> Faculty -> Issuer -> BadgeClass tree below one of its memberships, inherited from the memberships
+    on the node and its ancestors. Kept up to date when memberships change and when nodes are created, moved or deleted,
+    through their save() and delete() only; see PermissionedRelationshipBase for bulk changes.
+    """
+
+    NODE_TYPE_CHOICES = (
+        ('institution', 'Institution'),
+        ('faculty', 'Faculty'),
+        ('issuer', 'Issuer'),
+        ('badgeclass', 'BadgeClass'),
+    )
+
+    user = models.ForeignKey('badgeuser.BadgeUser', on_delete=models.CASCADE, related_name='+')
+    node_type = models.CharField(max_length=16, choices=NODE_TYPE_CHOICES)
+    node_id = models.PositiveIntegerField()
+    may_create = models.BooleanField(default=False)
+    may_read = models.BooleanField(default=False)
+    may_update = models.BooleanField(default=False)
+    may_delete = models.BooleanField(default=False)
+    may_award = models.BooleanField(default=False)
+    may_sign = models.BooleanField(default=False)
+    may_administrate_users = models.BooleanField(default=False)
+
+    objects = EffectivePermissionManager()
+
+    class Meta:
+        unique_together = ('user', 'node_type', 'node_id')
+        indexes = [models.Index(fields=['node_type', 'node_id'], name='staff_effperm_node_idx')]
+
+
 auditlog.register(InstitutionStaff)
 auditlog.register(FacultyStaff)
 auditlog.register(IssuerStaff)
@@ -0,0 +1,73 @@
+import threading
+
+from staff.closure import PERMISSION_FIELDS
+
+_state = threading.local()
+
+
+class PermissionResolver(object):
+    """
+    Memoizes the permissions of users on the nodes of the permission tree for the duration of a single request,
+    so views, serializers and GraphQL resolvers asking for the same (user, object) pair share one lookup.
+    A detail view costs a single row lookup; once a second node of the same type is asked for, as when rendering
+    a list, all rows of the user for that node type are loaded in one query.
+    """
+
+    def __init__(self):
+        self.permissions = {}
+        self.rows = {}
+        self.seen = {}
+
+    def get_permissions(self, user, node, compute):
+        """
+        :param compute: callable returning the permissions of user on node, called once per request
+        :return: a copy of the memoized permissions dictionary
+        """
+        key = (user.pk, node._meta.model_name, node.pk)
+        if key not in self.permissions:
+            self.permissions[key] = compute(user)
+        return dict(self.permissions[key])
+
+    def effective_row(self, queryset, user_id, node_type, node_id):
+        """
+        The EffectivePermission row of user_id on a node, as a permissions dictionary, or None
+        :param queryset: the EffectivePermission rows to look in
+        """
+        key = (user_id, node_type)
+        if key in self.rows:
+            return self.rows[key].get(node_id)
+        seen = self.seen.setdefault(key, set())
+        seen.add(node_id)
+        queryset = queryset.filter(user_id=user_id, node_type=node_type)
+        if len(seen) == 1:
+            return queryset.filter(node_id=node_id).values(*PERMISSION_FIELDS).first()
+        rows = {}
+        for row in queryset.values('node_id', *PERMISSION_FIELDS):
+            rows[row.pop('node_id')] = row
+        self.rows[key] = rows
+        return rows.get(node_id)
+
+    def clear(self):
+        self.permissions.clear()
+        self.rows.clear()
+        self.seen.clear()
+
+
+def get_permission_resolver():
+    """the PermissionResolver of the current request, or None outside of a request"""
+    return getattr(_state, 'resolver', None)
+
+
+def forget_permissions():
+    """drops the memoized permissions of the current request, after the permission tree changed"""
+    resolver = get_permission_resolver()
+    if resolver is not None:
+        resolver.clear()
+
+
+def activate():
+    _state.resolver = PermissionResolver()
+
+
+def deactivate():
+    _state.resolver = None
@@ -1,6 +1,10 @@
 import json
 import collections
+from institution.models import Faculty, Institution
+from issuer.models import BadgeClass, Issuer
 from mainsite.tests import BadgrTestCase
+from staff.models import EffectivePermission
+from staff import resolver
 
 
 class ObjectPermissionTests(BadgrTestCase):
@@ -279,3 +283,57 @@ class ObjectPermissionTests(BadgrTestCase):
         self.assertEqual(response_empty['data']['faculty'], None)
         response_empty = self.graphene_post(student, query)
         self.assertEqual(response_empty['data']['faculty'], None)
+
+    def test_effective_permissions_follow_tree_changes(self):
+        teacher1 = self.setup_teacher()
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        other_faculty = self.setup_faculty(institution=teacher1.institution)
+        self.setup_staff_membership(teacher1, faculty, may_read=True, may_award=True)
+        issuer = self.setup_issuer(faculty=faculty, created_by=teacher1)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        # new nodes inherit the permissions on their parent
+        self.assertTrue(badgeclass.get_permissions(teacher1)['may_award'])
+        self.assertFalse(badgeclass.get_permissions(teacher1)['may_update'])
+        # moving a node takes the permissions of its new parent
+        issuer.faculty = other_faculty
+        issuer.save()
+        self.assertFalse(BadgeClass.objects.get(pk=badgeclass.pk).get_permissions(teacher1)['may_award'])
+        self.assertFalse(EffectivePermission.objects.filter(user=teacher1, node_type='badgeclass').exists())
+
+    def test_permissions_memoized_per_request(self):
+        teacher1 = self.setup_teacher()
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        staff = self.setup_staff_membership(teacher1, faculty, may_read=True, may_award=True)
+        issuer = self.setup_issuer(faculty=faculty, created_by=teacher1)
+        badgeclasses = [self.setup_badgeclass(issuer=issuer) for _ in range(3)]
+        resolver.activate()
+        try:
+            # one lookup for the first badgeclass, one for all the others
+            with self.assertNumQueries(2):
+                for _ in range(2):
+                    for badgeclass in badgeclasses:
+                        self.assertTrue(badgeclass.has_permissions(teacher1, ['may_award']))
+            # changing a staff membership drops the memoized permissions
+            staff.may_update = True
+            staff.save()
+            self.assertTrue(badgeclasses[0].get_permissions(teacher1)['may_update'])
+        finally:
+            resolver.deactivate()
+
+    def test_permitted_querysets_match_has_permissions(self):
+        teacher1 = self.setup_teacher()
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        other_faculty = self.setup_faculty(institution=teacher1.institution)
+        self.setup_staff_membership(teacher1, faculty, may_award=True)
+        issuer = self.setup_issuer(faculty=faculty, created_by=teacher1)
+        other_issuer = self.setup_issuer(faculty=other_faculty, created_by=teacher1)
+        outside_teacher = self.setup_teacher()
+        outside_issuer = self.setup_issuer(created_by=outside_teacher)
+        for badgeclass_issuer in (issuer, other_issuer, outside_issuer):
+            self.setup_badgeclass(issuer=badgeclass_issuer)
+        for permissions in (['may_read'], ['may_award'], ['may_read', 'may_award'], ['may_update']):
+            for user in (teacher1, outside_teacher, self.setup_student()):
+                for model in (Institution, Faculty, Issuer, BadgeClass):
+                    expected = {obj.pk for obj in model.objects.all() if obj.has_permissions(user, permissions)}
+                    permitted = set(model.permitted(user, permissions).values_list('pk', flat=True))
+                    self.assertEqual(permitted, expected, (model, user, permissions))